@@ -1,12 +1,16 @@
 # app/advanced_retrieval.py
 import asyncio
+import functools
+import heapq
+import os
+import threading
+import time
 import numpy as np
 from typing import List, Dict, Any, Tuple, Optional
-from dataclasses import dataclass
+from dataclasses import dataclass, replace
 from enum import Enum
-import json
 import re
-from collections import defaultdict
+from collections import defaultdict, OrderedDict
 
 # Advanced retrieval imports
 try:
@@ -19,9 +23,295 @@ except ImportError:
     print("pip install sentence-transformers rank-bm25 faiss-cpu")
     ADVANCED_RETRIEVAL_AVAILABLE = False
 
+try:
+    from optimum.onnxruntime import ORTModelForFeatureExtraction, ORTModelForSequenceClassification, ORTQuantizer
+    from optimum.onnxruntime.configuration import AutoQuantizationConfig
+    from transformers import AutoTokenizer
+    ONNX_RUNTIME_AVAILABLE = True
+except ImportError:
+    ONNX_RUNTIME_AVAILABLE = False
+
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+try:
+    import ahocorasick
+    AHOCORASICK_AVAILABLE = True
+except ImportError:
+    AHOCORASICK_AVAILABLE = False
+
+try:
+    import xxhash
+    XXHASH_AVAILABLE = True
+except ImportError:
+    XXHASH_AVAILABLE = False
+
 from langchain_openai import OpenAIEmbeddings
 from qdrant_client import QdrantClient
-from qdrant_client.models import Distance, VectorParams, PointStruct, Filter, FieldCondition, MatchValue
+from qdrant_client.models import Distance, VectorParams, PointStruct, Filter, FieldCondition, MatchValue, SearchRequest
+
+from .rag_service import COMMON_SUBJECT_GRADES, SOURCE_CLASS_MAP, SOURCE_CLASS_OTHER, source_class
+
+# Trained FAISS indexes and exported ONNX models, next to the package and outside Qdrant's storage/ directory
+_INDEX_CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "index_cache")
+
+# Word tokenizer shared by BM25 indexing and querying
+_TOKEN_PATTERN = re.compile(r"\w+")
+
+def _split_payload(payload: Optional[Dict[str, Any]]) -> Tuple[str, Dict[str, Any]]:
+    """Pop the text out of a freshly deserialized point payload and reuse the rest as its metadata"""
+    if not payload:
+        return "", {}
+    return payload.pop("text", ""), payload
+
+def _content_key(content: str) -> int:
+    """Unsigned 64-bit hash of the full content, used to merge and deduplicate results"""
+    if XXHASH_AVAILABLE:
+        return xxhash.xxh3_64_intdigest(content.encode("utf-8"))
+    return hash(content) & 0xFFFFFFFFFFFFFFFF
+
+def _cacheable_embedding(embedding: List[float]) -> np.ndarray:
+    """Normalized, read-only float16 copy of an embedding for the query embedding caches"""
+    vector = np.asarray(embedding, dtype=np.float32)
+    vector /= max(np.linalg.norm(vector), 1e-12)  # Normalized once, so inner product == cosine
+    vector = vector.astype(np.float16)  # Half the cache footprint; unit vectors lose nothing that matters for ranking
+    vector.flags.writeable = False  # Cached vectors are shared between callers
+    return vector
+
+def _warmup_queries() -> List[str]:
+    """Fixed template queries that hierarchical search and query expansion issue for common subject/grade pairs"""
+    queries = []
+    for subject, grade in COMMON_SUBJECT_GRADES:
+        queries.append(f"{subject} curriculum standards")
+        queries.append(f"{subject} {grade} learning objectives")
+        queries.extend(f"{subject} {grade} {suffix}" for suffixes in _QUERY_EXPANSIONS.values() for suffix in suffixes)
+    return queries
+
+def _top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k highest scores in descending order, via O(n) partition instead of a full sort"""
+    k = min(k, scores.size)
+    if k <= 0:
+        return np.empty(0, dtype=np.intp)
+    top = np.sort(np.argpartition(-scores, k - 1)[:k])  # Index order first so ties keep input order
+    return top[np.argsort(-scores[top], kind="stable")]
+
+def _source_classes(metadatas: List[Dict[str, Any]]) -> np.ndarray:
+    """Source class column for results; points ingested before source_class existed are classified on the fly"""
+    return np.fromiter(
+        (m["source_class"] if "source_class" in m else source_class(m.get("source", "")) for m in metadatas),
+        dtype=np.intp, count=len(metadatas)
+    )
+
+def _source_boost_table(boosts: Dict[str, float]) -> np.ndarray:
+    """Lookup table of score multipliers indexed by source class (unlisted classes get 1.0)"""
+    table = np.ones(SOURCE_CLASS_OTHER + 1, dtype=np.float32)
+    for source, boost in boosts.items():
+        table[SOURCE_CLASS_MAP[source]] = boost
+    return table
+
+# External resource focused search: favour external resources, then standards
+_EXTERNAL_RESOURCE_BOOST = _source_boost_table({
+    "youtube": 1.4, "wikipedia": 1.4, "interactive": 1.4, "assessment": 1.4,
+    "common core": 1.2, "ngss": 1.2, "nasa": 1.2
+})
+
+# Temporal search: current standards and (more current) external resources
+_TEMPORAL_SOURCE_BOOST = _source_boost_table({
+    "common core": 1.2, "ngss": 1.2, "youtube": 1.3, "wikipedia": 1.3
+})
+
+def _jit(func):
+    """Compile a NumPy kernel with numba when installed; the same body runs as plain NumPy otherwise"""
+    return njit(cache=True, fastmath=True)(func) if NUMBA_AVAILABLE else func
+
+@_jit
+def _temporal_boost(scores, ages_hours, source_classes, source_boost, weight):
+    """Recency decay over a year (floored at 0.5) times the source boost, applied as a multiplicative bonus"""
+    temporal_weights = np.maximum(0.5, 1.0 - ages_hours / 8760.0) * source_boost[source_classes]
+    return scores * (1.0 + weight * temporal_weights), temporal_weights
+
+@_jit
+def _external_resource_boost(scores, source_classes, source_boost, has_url):
+    """Source class boost times the boost for resources with a real URL"""
+    return scores * source_boost[source_classes] * np.where(has_url, 1.3, 1.0)
+
+def _build_keyword_matcher(terms: List[str]):
+    """Compile terms into one multi-pattern substring matcher (Aho-Corasick, or a regex alternation)"""
+    if AHOCORASICK_AVAILABLE:
+        automaton = ahocorasick.Automaton()
+        for term in terms:
+            automaton.add_word(term, term)
+        automaton.make_automaton()
+        return lambda text: next(automaton.iter(text), None) is not None
+    
+    pattern = re.compile("|".join(map(re.escape, terms)))
+    return lambda text: pattern.search(text) is not None
+
+def _build_tagged_keyword_scanner(tagged_terms: Dict[str, frozenset]):
+    """Compile tagged terms into one scanner returning the set of tags whose terms occur in a text"""
+    term_tags = defaultdict(set)
+    for tag, terms in tagged_terms.items():
+        for term in terms:
+            term_tags[term].add(tag)
+    
+    if AHOCORASICK_AVAILABLE:
+        automaton = ahocorasick.Automaton()
+        for term, tags in term_tags.items():
+            automaton.add_word(term, frozenset(tags))
+        automaton.make_automaton()
+        return lambda text: {tag for _, tags in automaton.iter(text) for tag in tags}
+    
+    # Longest terms first so a term is not shadowed by another that prefixes it
+    pattern = re.compile("|".join(map(re.escape, sorted(term_tags, key=len, reverse=True))))
+    return lambda text: {tag for match in pattern.finditer(text) for tag in term_tags[match.group()]}
+
+@functools.lru_cache(maxsize=256)
+def _distinct_term_scanner(terms: Tuple[str, ...]):
+    """
+    Scanner returning the distinct terms that occur in a text. Memoized, so every document retrieved
+    for a query (and repeats of the query) share one compiled scanner.
+    """
+    return _build_tagged_keyword_scanner({term: frozenset({term}) for term in terms})
+
+# Content keywords that mark a document as suited to each student group
+_STUDENT_GROUP_TERMS = {
+    "esl": frozenset({"visual", "hands-on", "multimodal", "support", "accommodation"}),
+    "adhd": frozenset({"movement", "kinesthetic", "interactive", "short", "active"}),
+    "learning_disability": frozenset({"differentiated", "accommodation", "alternative", "support", "modified"}),
+    "gifted": frozenset({"advanced", "challenge", "enrichment", "extension", "complex"})
+}
+
+# Narrower keyword sets: the ones that boost a document in student group aware search, and the
+# ones that keep a sentence when compressing content
+_STUDENT_GROUP_BOOST_TERMS = {
+    "esl": frozenset({"visual", "hands-on", "multimodal", "support"}),
+    "adhd": frozenset({"movement", "kinesthetic", "interactive", "short"}),
+    "learning_disability": frozenset({"differentiated", "accommodation", "alternative", "support"}),
+    "gifted": frozenset({"advanced", "challenge", "enrichment", "extension"})
+}
+
+_STUDENT_GROUP_COMPRESSION_TERMS = {
+    "esl": frozenset({"visual", "hands-on", "support", "accommodation"}),
+    "adhd": frozenset({"movement", "interactive", "kinesthetic", "active"}),
+    "learning_disability": frozenset({"differentiated", "accommodation", "alternative", "support"}),
+    "gifted": frozenset({"advanced", "challenge", "enrichment", "extension"})
+}
+
+_STUDENT_GROUP_MATCHERS = {group: _build_keyword_matcher(sorted(terms)) for group, terms in _STUDENT_GROUP_BOOST_TERMS.items()}
+
+# Finds every student group with a keyword in a text in one linear pass
+_STUDENT_GROUP_SCANNER = _build_tagged_keyword_scanner(_STUDENT_GROUP_TERMS)
+
+_STUDENT_GROUP_RELEVANCE_FACTORS = {
+    "esl": "Visual/kinesthetic support",
+    "adhd": "Movement-based learning",
+    "learning_disability": "Differentiated instruction",
+    "gifted": "Advanced content"
+}
+
+_STUDENT_GROUP_EXPANSIONS = {
+    "esl": ("visual supports", "hands-on activities", "multimodal learning"),
+    "adhd": ("movement activities", "interactive learning", "kinesthetic approaches"),
+    "learning_disability": ("differentiated instruction", "accommodations", "alternative methods"),
+    "gifted": ("enrichment activities", "advanced challenges", "extension projects")
+}
+
+# Query topics that trigger subject/grade expansions, with their trigger keywords and expansion suffixes
+_EXPANSION_TOPIC_TRIGGERS = {
+    "objectives": frozenset({"objectives"}),
+    "assessment": frozenset({"assessment"}),
+    "materials": frozenset({"materials", "resources"})
+}
+
+_EXPANSION_TOPIC_SCANNER = _build_tagged_keyword_scanner(_EXPANSION_TOPIC_TRIGGERS)
+
+_QUERY_EXPANSIONS = {
+    "objectives": ("learning goals", "educational outcomes", "student expectations"),
+    "assessment": ("evaluation methods", "testing strategies", "student assessment"),
+    "materials": ("teaching materials", "educational resources", "classroom supplies")
+}
+
+# (marker in student_group_info, student group), in priority order
+_STUDENT_GROUP_DETECTORS = (
+    ("ESL", "esl"),
+    ("English language", "esl"),
+    ("ADHD", "adhd"),
+    ("learning disability", "learning_disability"),
+    ("gifted", "gifted")
+)
+
+def _detect_student_groups(student_group_info: str) -> List[str]:
+    """Every student group mentioned in student_group_info, in priority order"""
+    return list(dict.fromkeys(group for marker, group in _STUDENT_GROUP_DETECTORS if marker in student_group_info))
+
+def _detect_student_group(student_group_info: str) -> Optional[str]:
+    """The highest priority student group mentioned in student_group_info"""
+    return next((group for marker, group in _STUDENT_GROUP_DETECTORS if marker in student_group_info), None)
+
+@functools.lru_cache(maxsize=4096)
+def _assess_student_group_relevance_cached(content: str, student_group_info: str) -> Optional[str]:
+    """
+    Memoized body of AdvancedRetriever._assess_student_group_relevance. Strategies assess the same
+    documents while boosting and again when building results, and str caches its own hash.
+    """
+    groups = _detect_student_groups(student_group_info)
+    if not groups:
+        return None
+    
+    groups_hit = _STUDENT_GROUP_SCANNER(content.lower())
+    relevance_factors = [_STUDENT_GROUP_RELEVANCE_FACTORS[group] for group in groups if group in groups_hit]
+    
+    return "; ".join(relevance_factors) if relevance_factors else None
+
+@functools.lru_cache(maxsize=256)
+def _subject_grade_filter(subject: str, grade: str) -> Optional[Filter]:
+    """Shared subject/grade Filter per (subject, grade) pair; callers must not mutate it"""
+    conditions = []
+    
+    if subject:
+        conditions.append(FieldCondition(key="subject", match=MatchValue(value=subject)))
+    if grade:
+        conditions.append(FieldCondition(key="grade", match=MatchValue(value=grade)))
+    
+    if conditions:
+        return Filter(must=conditions)
+    return None
+
+# (query keywords, domain) pairs, checked in order, for narrowing metadata filtered search
+_QUERY_DOMAINS = (
+    (("fractions", "decimals"), "Number and Operations"),
+    (("geometry", "area"), "Geometry")
+)
+
+@functools.lru_cache(maxsize=2048)
+def _advanced_metadata_filter(subject: str, grade: str, domain: Optional[str], student_group: Optional[str]) -> Optional[Filter]:
+    """Shared advanced Filter per (subject, grade, domain, student group); callers must not mutate it"""
+    conditions = []
+    
+    # Basic filters
+    if subject:
+        conditions.append(FieldCondition(key="subject", match=MatchValue(value=subject)))
+    if grade:
+        conditions.append(FieldCondition(key="grade", match=MatchValue(value=grade)))
+    
+    # Domain-specific filtering
+    if domain:
+        conditions.append(FieldCondition(key="domain", match=MatchValue(value=domain)))
+    
+    # Student group specific filtering
+    if student_group == "esl":
+        # Prefer visual and hands-on resources
+        pass  # Could add specific filters here
+    elif student_group == "adhd":
+        # Prefer interactive and movement-based resources
+        pass  # Could add specific filters here
+    
+    if conditions:
+        return Filter(must=conditions)
+    return None
 
 class RetrievalStrategy(Enum):
     """Different retrieval strategies to test"""
@@ -37,7 +327,18 @@ class RetrievalStrategy(Enum):
     STUDENT_GROUP_AWARE = "student_group_aware"  # New strategy
     EXTERNAL_RESOURCE_FOCUSED = "external_resource_focused"  # New strategy
 
-@dataclass
+# Strategies whose result scores are plain cosine similarities. The others report RRF scores
+# (hybrid, query expansion), weighted or boosted similarities (hierarchical, temporal, student
+# group, external resource) or cross-encoder blends (reranking), which a similarity threshold
+# cannot be compared against.
+_COSINE_SCORED_STRATEGIES = frozenset({
+    RetrievalStrategy.BASIC,
+    RetrievalStrategy.MULTI_VECTOR,
+    RetrievalStrategy.METADATA_FILTERED,
+    RetrievalStrategy.CONTEXTUAL_COMPRESSION
+})
+
+@dataclass(slots=True, frozen=True)
 class RetrievalResult:
     """Structured result from advanced retrieval"""
     content: str
@@ -48,6 +349,64 @@ class RetrievalResult:
     student_group_relevance: Optional[str] = None  # New field
     external_resource_type: Optional[str] = None  # New field
 
+def _object_array(values) -> np.ndarray:
+    """1-D object array holding values as-is (np.array would try to broadcast nested sequences)"""
+    values = list(values)
+    array = np.empty(len(values), dtype=object)
+    array[:] = values
+    return array
+
+@dataclass
+class ResultBatch:
+    """
+    Search hits as a structure of arrays: parallel content/metadata object arrays and a float64
+    score array, so boosts, sorts and deduplication run as vectorized NumPy operations.
+    Iterating (or indexing with an int) still yields (content, metadata, score) tuples.
+    """
+    contents: np.ndarray
+    metadatas: np.ndarray
+    scores: np.ndarray
+    
+    @classmethod
+    def from_hits(cls, hits: List[Tuple[str, Dict[str, Any], float]]) -> "ResultBatch":
+        return cls(
+            contents=_object_array(hit[0] for hit in hits),
+            metadatas=_object_array(hit[1] for hit in hits),
+            scores=np.fromiter((hit[2] for hit in hits), dtype=np.float64, count=len(hits))
+        )
+    
+    @classmethod
+    def concat(cls, batches: List["ResultBatch"]) -> "ResultBatch":
+        if not batches:
+            return cls.from_hits([])
+        return cls(
+            contents=np.concatenate([batch.contents for batch in batches]),
+            metadatas=np.concatenate([batch.metadatas for batch in batches]),
+            scores=np.concatenate([batch.scores for batch in batches])
+        )
+    
+    def __len__(self) -> int:
+        return self.scores.size
+    
+    def __iter__(self):
+        return zip(self.contents, self.metadatas, self.scores.tolist())
+    
+    def __getitem__(self, index):
+        if isinstance(index, (int, np.integer)):
+            return self.contents[index], self.metadatas[index], float(self.scores[index])
+        return self.take(index)
+    
+    def take(self, index) -> "ResultBatch":
+        """Gather rows by index array, mask or slice"""
+        return ResultBatch(self.contents[index], self.metadatas[index], self.scores[index])
+    
+    def with_scores(self, scores: np.ndarray) -> "ResultBatch":
+        return replace(self, scores=np.asarray(scores, dtype=np.float64))
+    
+    def top_k(self, k: int) -> "ResultBatch":
+        """The k highest scoring rows in descending score order"""
+        return self.take(_top_k_indices(self.scores, k))
+
 class AdvancedRetriever:
     """
     Advanced retrieval system implementing multiple strategies
@@ -60,24 +419,79 @@ class AdvancedRetriever:
         self.qdrant_client = rag_service.qdrant_client
         self.collection_name = rag_service.collection_name
         
-        # Initialize advanced models
-        if ADVANCED_RETRIEVAL_AVAILABLE:
-            self.sentence_transformer = SentenceTransformer('all-MiniLM-L6-v2')
-            self.cross_encoder = CrossEncoder('cross-encoder/ms-marco-MiniLM-L-6-v2')
-            self.bm25_index = None
-            self.faiss_index = None
-        
         # Retrieval configuration
         self.retrieval_config = {
-            "hybrid_alpha": 0.7,  # Weight for semantic vs keyword search
+            "rrf_k": 60,  # Reciprocal rank fusion constant for combining semantic and keyword rankings
             "expansion_queries": 3,  # Number of query expansions
             "rerank_top_k": 20,  # Top K results to rerank
+            "rerank_prefilter_std": 0.5,  # Rerank only scores >= mean + this many std devs
             "final_top_k": 5,  # Final number of results
             "temporal_weight": 0.1,  # Weight for recency
             "metadata_boost": 0.2,  # Boost for metadata matches
             "student_group_weight": 0.3,  # Weight for student group relevance
-            "external_resource_weight": 0.4  # Weight for external resource relevance
+            "external_resource_weight": 0.4,  # Weight for external resource relevance
+            # Full corpus: "OPQ64_128,IVF4194304_HNSW32,PQ64"
+            "faiss_index_factory": "OPQ32_256,IVF4096,PQ32",
+            "faiss_index_path": os.path.join(_INDEX_CACHE_DIR, "faiss", f"{self.collection_name}.index"),
+            "faiss_nprobe": 16,  # IVF lists probed per query (speed/recall knob)
+            "faiss_min_train_size": 4096 * 39,  # ~39 training points per IVF list
+            "use_gpu_faiss": True,  # Move the FAISS index to GPU 0 when a CUDA device is present
+            "embedding_cache_size": 1024,  # Query embeddings kept in the LRU cache
+            "use_onnx_models": True,  # Run transformer models as int8 ONNX Runtime sessions when optimum is installed
+            "onnx_cache_dir": os.path.join(_INDEX_CACHE_DIR, "onnx")
+        }
+        
+        # Strategy routing table used by advanced_retrieve
+        self._strategy_dispatch = {
+            RetrievalStrategy.HYBRID_SEARCH: self._hybrid_search,
+            RetrievalStrategy.MULTI_VECTOR: self._multi_vector_search,
+            RetrievalStrategy.QUERY_EXPANSION: self._query_expansion_search,
+            RetrievalStrategy.RERANKING: self._reranking_search,
+            RetrievalStrategy.HIERARCHICAL: self._hierarchical_search,
+            RetrievalStrategy.TEMPORAL: self._temporal_search,
+            RetrievalStrategy.METADATA_FILTERED: self._metadata_filtered_search,
+            RetrievalStrategy.CONTEXTUAL_COMPRESSION: self._contextual_compression_search,
+            RetrievalStrategy.STUDENT_GROUP_AWARE: self._student_group_aware_search,
+            RetrievalStrategy.EXTERNAL_RESOURCE_FOCUSED: self._external_resource_focused_search
         }
+        
+        # Query text -> read-only float16 embedding, shared by every strategy
+        self._query_embedding_cache: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._pinned_query_embeddings: Dict[str, np.ndarray] = {}  # Warmed template queries, never evicted
+        self._query_embedding_cache_lock = threading.Lock()  # Searches run in worker threads
+        self._encode_sentence = functools.lru_cache(maxsize=self.retrieval_config["embedding_cache_size"])(self._encode_sentence)
+        
+        # Initialize advanced models
+        self.faiss_index = None
+        self.bm25_index = None
+        self._corpus_ids: List[Any] = []
+        self._corpus_rows: Dict[Any, int] = {}  # Point id -> row in the corpus lists and FAISS index
+        self._corpus_texts: List[str] = []
+        self._corpus_metadata: List[Dict[str, Any]] = []
+        self._corpus_version = rag_service.collection_version
+        self._corpus_lock = threading.Lock()  # Serializes refresh_corpus across worker threads
+        self._faiss_selectors: Dict[Tuple[str, str], Tuple[Any, int]] = {}  # (subject, grade) -> (IDSelectorBatch, row count)
+        if ADVANCED_RETRIEVAL_AVAILABLE:
+            self.sentence_transformer = None
+            self.cross_encoder = None
+            self.onnx_sentence_transformer = None
+            self.onnx_cross_encoder = None
+            if ONNX_RUNTIME_AVAILABLE and self.retrieval_config["use_onnx_models"]:
+                try:
+                    self.onnx_sentence_transformer = self._load_onnx_model(
+                        ORTModelForFeatureExtraction, 'sentence-transformers/all-MiniLM-L6-v2'
+                    )
+                    self.onnx_cross_encoder = self._load_onnx_model(
+                        ORTModelForSequenceClassification, 'cross-encoder/ms-marco-MiniLM-L-6-v2'
+                    )
+                except Exception as e:
+                    print(f"⚠️  ONNX models unavailable, using PyTorch: {e}")
+            if self.onnx_sentence_transformer is None:
+                self.sentence_transformer = SentenceTransformer('all-MiniLM-L6-v2')
+            if self.onnx_cross_encoder is None:
+                self.cross_encoder = CrossEncoder('cross-encoder/ms-marco-MiniLM-L-6-v2')
+            self._build_faiss_index()
+            self._build_bm25_index()
     
     async def advanced_retrieve(
         self, 
@@ -97,39 +511,13 @@ class AdvancedRetriever:
         if student_group_info:
             print(f"👥 Student group context: {student_group_info}")
         
-        if strategy == RetrievalStrategy.HYBRID_SEARCH:
-            return await self._hybrid_search(query, subject, grade, student_group_info)
+        # Pick up documents ingested since the local corpus was loaded
+        if self._corpus_version != self.rag_service.collection_version:
+            await asyncio.to_thread(self.refresh_corpus)
         
-        elif strategy == RetrievalStrategy.MULTI_VECTOR:
-            return await self._multi_vector_search(query, subject, grade, student_group_info)
-        
-        elif strategy == RetrievalStrategy.QUERY_EXPANSION:
-            return await self._query_expansion_search(query, subject, grade, student_group_info)
-        
-        elif strategy == RetrievalStrategy.RERANKING:
-            return await self._reranking_search(query, subject, grade, student_group_info)
-        
-        elif strategy == RetrievalStrategy.HIERARCHICAL:
-            return await self._hierarchical_search(query, subject, grade, student_group_info)
-        
-        elif strategy == RetrievalStrategy.TEMPORAL:
-            return await self._temporal_search(query, subject, grade, student_group_info)
-        
-        elif strategy == RetrievalStrategy.METADATA_FILTERED:
-            return await self._metadata_filtered_search(query, subject, grade, student_group_info)
-        
-        elif strategy == RetrievalStrategy.CONTEXTUAL_COMPRESSION:
-            return await self._contextual_compression_search(query, subject, grade, student_group_info)
-        
-        elif strategy == RetrievalStrategy.STUDENT_GROUP_AWARE:
-            return await self._student_group_aware_search(query, subject, grade, student_group_info)
-        
-        elif strategy == RetrievalStrategy.EXTERNAL_RESOURCE_FOCUSED:
-            return await self._external_resource_focused_search(query, subject, grade, student_group_info)
-        
-        else:
-            # Fallback to basic retrieval
-            return await self._basic_retrieval(query, subject, grade, student_group_info)
+        # Unknown strategies (including BASIC) fall back to basic retrieval
+        search = self._strategy_dispatch.get(strategy, self._basic_retrieval)
+        return await search(query, subject, grade, student_group_info)
     
     async def _hybrid_search(self, query: str, subject: str, grade: str, student_group_info: str = "") -> List[RetrievalResult]:
         """
@@ -139,28 +527,28 @@ class AdvancedRetriever:
         
         print("🔄 Executing hybrid search (semantic + keyword)")
         
-        # Get semantic results
-        semantic_results = await self._semantic_search(query, subject, grade, limit=10, student_group_info=student_group_info)
-        
-        # Get keyword results using BM25
-        keyword_results = await self._bm25_search(query, subject, grade, limit=10, student_group_info=student_group_info)
+        # Get semantic results and keyword results using BM25 concurrently
+        semantic_results, keyword_results = await asyncio.gather(
+            self._semantic_search(query, subject, grade, limit=10, student_group_info=student_group_info),
+            self._bm25_search(query, subject, grade, limit=10, student_group_info=student_group_info)
+        )
         
         # Combine and deduplicate results
-        combined_results = self._combine_results(
-            semantic_results, keyword_results, 
-            alpha=self.retrieval_config["hybrid_alpha"]
+        combined_results = self._merge_results(
+            semantic_results, keyword_results,
+            top_k=self.retrieval_config["final_top_k"], rrf_k=self.retrieval_config["rrf_k"]
         )
         
         # Convert to RetrievalResult format
         results = []
-        for i, (content, metadata, score) in enumerate(combined_results[:self.retrieval_config["final_top_k"]]):
+        for i, (content, metadata, score) in enumerate(combined_results):
             student_relevance = self._assess_student_group_relevance(content, student_group_info)
             results.append(RetrievalResult(
                 content=content,
                 metadata=metadata,
                 score=score,
                 retrieval_method="hybrid_search",
-                relevance_explanation=f"Combined semantic similarity ({score:.3f}) with keyword matching",
+                relevance_explanation=f"Fused semantic and keyword rankings (RRF score: {score:.4f})",
                 student_group_relevance=student_relevance
             ))
         
@@ -177,36 +565,19 @@ class AdvancedRetriever:
         # Get initial results
         initial_results = await self._semantic_search(query, subject, grade, limit=15, student_group_info=student_group_info)
         
-        # Apply student group relevance scoring
-        student_group_results = []
-        
-        for content, metadata, score in initial_results:
-            # Assess relevance to student group
-            student_relevance = self._assess_student_group_relevance(content, student_group_info)
-            
-            # Boost score based on student group relevance
-            if student_relevance:
-                if "ESL" in student_group_info or "English language" in student_group_info:
-                    if any(term in content.lower() for term in ["visual", "hands-on", "multimodal", "support"]):
-                        score *= 1.3
-                elif "ADHD" in student_group_info:
-                    if any(term in content.lower() for term in ["movement", "kinesthetic", "interactive", "short"]):
-                        score *= 1.3
-                elif "learning disability" in student_group_info:
-                    if any(term in content.lower() for term in ["differentiated", "accommodation", "alternative", "support"]):
-                        score *= 1.3
-                elif "gifted" in student_group_info:
-                    if any(term in content.lower() for term in ["advanced", "challenge", "enrichment", "extension"]):
-                        score *= 1.3
-            
-            student_group_results.append((content, metadata, score))
+        # Pick the keywords for this student group once, not per document
+        boost_matcher = _STUDENT_GROUP_MATCHERS.get(_detect_student_group(student_group_info))
         
-        # Sort by adjusted score
-        student_group_results.sort(key=lambda x: x[2], reverse=True)
+        # Boost documents that contain the student group's keywords
+        boosted = np.fromiter(
+            (boost_matcher is not None and boost_matcher(content.lower()) for content in initial_results.contents),
+            dtype=np.bool_, count=len(initial_results)
+        )
+        student_group_results = initial_results.with_scores(np.where(boosted, initial_results.scores * 1.3, initial_results.scores))
         
-        # Convert to RetrievalResult format
+        # Convert the top results by adjusted score to RetrievalResult format
         results = []
-        for i, (content, metadata, score) in enumerate(student_group_results[:self.retrieval_config["final_top_k"]]):
+        for i, (content, metadata, score) in enumerate(student_group_results.top_k(self.retrieval_config["final_top_k"])):
             student_relevance = self._assess_student_group_relevance(content, student_group_info)
             results.append(RetrievalResult(
                 content=content,
@@ -230,29 +601,24 @@ class AdvancedRetriever:
         # Get initial results
         initial_results = await self._semantic_search(query, subject, grade, limit=15, student_group_info=student_group_info)
         
-        # Prioritize external resources
-        external_resource_results = []
+        if not initial_results:
+            return []
         
-        for content, metadata, score in initial_results:
-            # Boost external resources
-            resource_type = metadata.get("source", "").lower()
-            if resource_type in ["youtube", "wikipedia", "interactive", "assessment"]:
-                score *= 1.4
-            elif resource_type in ["common core", "ngss", "nasa"]:
-                score *= 1.2
-            
-            # Boost resources with actual URLs
-            if metadata.get("resource_url") and not metadata.get("resource_url").startswith("example"):
-                score *= 1.3
-            
-            external_resource_results.append((content, metadata, score))
+        # Prioritize external resources via the precomputed source class column,
+        # and boost resources with actual URLs, in one fused kernel
+        metadatas = initial_results.metadatas
+        has_url = np.fromiter(
+            (bool(url) and not url.startswith("example") for url in (m.get("resource_url") for m in metadatas)),
+            dtype=np.bool_, count=len(metadatas)
+        )
+        scores = _external_resource_boost(initial_results.scores, _source_classes(metadatas), _EXTERNAL_RESOURCE_BOOST, has_url)
         
-        # Sort by adjusted score
-        external_resource_results.sort(key=lambda x: x[2], reverse=True)
+        # Select and order the top results by adjusted score
+        external_resource_results = initial_results.with_scores(scores).top_k(self.retrieval_config["final_top_k"])
         
         # Convert to RetrievalResult format
         results = []
-        for i, (content, metadata, score) in enumerate(external_resource_results[:self.retrieval_config["final_top_k"]]):
+        for i, (content, metadata, score) in enumerate(external_resource_results):
             resource_type = metadata.get("source", "Unknown")
             results.append(RetrievalResult(
                 content=content,
@@ -273,54 +639,22 @@ class AdvancedRetriever:
         
         print("🔄 Executing multi-vector search")
         
-        # Use different embedding models
-        embeddings = [
-            ("openai", self.rag_service.embeddings),
-            ("sentence_transformer", self.sentence_transformer if ADVANCED_RETRIEVAL_AVAILABLE else None)
-        ]
-        
-        all_results = []
-        
-        for model_name, embedding_model in embeddings:
-            if embedding_model is None:
-                continue
-                
-            # Generate embeddings and search
-            if model_name == "openai":
-                query_embedding = embedding_model.embed_query(query)
-            else:
-                query_embedding = embedding_model.encode([query])[0]
-            
-            # Search Qdrant
-            search_result = self.qdrant_client.search(
-                collection_name=self.collection_name,
-                query_vector=query_embedding,
-                query_filter=self._build_metadata_filter(subject, grade),
-                limit=8
-            )
-            
-            # Process results
-            for point in search_result:
-                all_results.append({
-                    "content": point.payload.get("text", ""),
-                    "metadata": {k: v for k, v in point.payload.items() if k != "text"},
-                    "score": point.score,
-                    "model": model_name
-                })
+        # Embedding and search are blocking client calls; run them off the event loop
+        model_results = await asyncio.to_thread(self._multi_vector_search_batches, query, subject, grade)
         
         # Combine and deduplicate multi-model results
-        combined_results = self._deduplicate_and_rank(all_results)
+        combined_results = self._merge_results(*model_results, top_k=self.retrieval_config["final_top_k"])
         
         # Convert to RetrievalResult format
         results = []
-        for i, result in enumerate(combined_results[:self.retrieval_config["final_top_k"]]):
-            student_relevance = self._assess_student_group_relevance(result["content"], student_group_info)
+        for i, (content, metadata, score) in enumerate(combined_results):
+            student_relevance = self._assess_student_group_relevance(content, student_group_info)
             results.append(RetrievalResult(
-                content=result["content"],
-                metadata=result["metadata"],
-                score=result["score"],
+                content=content,
+                metadata=metadata,
+                score=score,
                 retrieval_method="multi_vector",
-                relevance_explanation=f"Multi-model consensus from {result.get('models', 1)} embedding models",
+                relevance_explanation=f"Multi-model consensus from {len(model_results)} embedding models",
                 student_group_relevance=student_relevance
             ))
         
@@ -337,19 +671,19 @@ class AdvancedRetriever:
         # Generate expanded queries including student group context
         expanded_queries = await self._generate_query_expansions(query, subject, grade, student_group_info)
         
-        all_results = []
-        
-        # Search with each expanded query
-        for expanded_query in expanded_queries:
-            results = await self._semantic_search(expanded_query, subject, grade, limit=5, student_group_info=student_group_info)
-            all_results.extend(results)
+        # Search with all expanded queries in one batched call
+        expansion_results = await self._semantic_search_batch(
+            expanded_queries, subject, grade, limits=[5] * len(expanded_queries), student_group_info=student_group_info
+        )
         
-        # Combine and deduplicate
-        combined_results = self._deduplicate_and_rank(all_results)
+        # Fuse the per-query rankings, so documents found by several variations rise to the top
+        combined_results = self._merge_results(
+            *expansion_results, top_k=self.retrieval_config["final_top_k"], rrf_k=self.retrieval_config["rrf_k"]
+        )
         
         # Convert to RetrievalResult format
         results = []
-        for i, (content, metadata, score) in enumerate(combined_results[:self.retrieval_config["final_top_k"]]):
+        for i, (content, metadata, score) in enumerate(combined_results):
             student_relevance = self._assess_student_group_relevance(content, student_group_info)
             results.append(RetrievalResult(
                 content=content,
@@ -376,30 +710,29 @@ class AdvancedRetriever:
         if not ADVANCED_RETRIEVAL_AVAILABLE or not initial_results:
             return await self._basic_retrieval(query, subject, grade, student_group_info)
         
+        # Only rerank candidates scoring well above the pack, unless too few of them pass
+        scores = initial_results.scores
+        candidates = scores >= scores.mean() + self.retrieval_config["rerank_prefilter_std"] * scores.std()
+        if np.count_nonzero(candidates) >= self.retrieval_config["final_top_k"]:
+            initial_results = initial_results.take(candidates)
+        
         # Prepare pairs for cross-encoder
-        query_doc_pairs = []
-        for content, metadata, score in initial_results:
-            # Enhance query with student group context for better reranking
-            enhanced_query = query
-            if student_group_info:
-                enhanced_query = f"{query} for {student_group_info}"
-            query_doc_pairs.append([enhanced_query, content])
+        # Enhance query with student group context for better reranking
+        enhanced_query = f"{query} for {student_group_info}" if student_group_info else query
+        query_doc_pairs = [[enhanced_query, content] for content in initial_results.contents]
         
-        # Rerank using cross-encoder
-        rerank_scores = self.cross_encoder.predict(query_doc_pairs)
+        # Rerank using cross-encoder, in a worker thread since it is CPU-bound and would block the event loop
+        rerank_scores = await asyncio.to_thread(self._rerank_scores, query_doc_pairs)
         
         # Combine original scores with rerank scores
-        reranked_results = []
-        for i, (content, metadata, original_score) in enumerate(initial_results):
-            combined_score = 0.7 * rerank_scores[i] + 0.3 * original_score
-            reranked_results.append((content, metadata, combined_score))
+        combined_scores = 0.7 * rerank_scores + 0.3 * initial_results.scores
         
-        # Sort by combined score
-        reranked_results.sort(key=lambda x: x[2], reverse=True)
+        # Select and order only the final top k
+        reranked_results = initial_results.with_scores(combined_scores).top_k(self.retrieval_config["final_top_k"])
         
         # Convert to RetrievalResult format
         results = []
-        for i, (content, metadata, score) in enumerate(reranked_results[:self.retrieval_config["final_top_k"]]):
+        for i, (content, metadata, score) in enumerate(reranked_results):
             student_relevance = self._assess_student_group_relevance(content, student_group_info)
             results.append(RetrievalResult(
                 content=content,
@@ -420,49 +753,32 @@ class AdvancedRetriever:
         
         print("🔄 Executing hierarchical search")
         
-        # Stage 1: Broad subject-level search
-        broad_query = f"{subject} curriculum standards"
-        broad_results = await self._semantic_search(broad_query, subject, grade, limit=15, student_group_info=student_group_info)
-        
-        # Stage 2: Grade-specific search
-        grade_query = f"{subject} {grade} learning objectives"
-        grade_results = await self._semantic_search(grade_query, subject, grade, limit=10, student_group_info=student_group_info)
-        
-        # Stage 3: Specific topic search
-        topic_query = query
-        topic_results = await self._semantic_search(topic_query, subject, grade, limit=8, student_group_info=student_group_info)
+        # (query, limit, weight) per stage: broad results weighted lowest, topic highest
+        stages = [
+            (f"{subject} curriculum standards", 15, 0.3),  # Stage 1: Broad subject-level search
+            (f"{subject} {grade} learning objectives", 10, 0.6),  # Stage 2: Grade-specific search
+            (query, 8, 1.0),  # Stage 3: Specific topic search
+        ]
         
         # Stage 4: Student group specific search (if applicable)
-        student_group_results = []
         if student_group_info:
-            student_query = f"{query} {student_group_info}"
-            student_group_results = await self._semantic_search(student_query, subject, grade, limit=5, student_group_info=student_group_info)
+            stages.append((f"{query} {student_group_info}", 5, 1.2))
         
-        # Combine with hierarchical weighting
-        all_results = []
-        
-        # Weight broad results lower
-        for content, metadata, score in broad_results:
-            all_results.append((content, metadata, score * 0.3))
-        
-        # Weight grade results medium
-        for content, metadata, score in grade_results:
-            all_results.append((content, metadata, score * 0.6))
-        
-        # Weight topic results highest
-        for content, metadata, score in topic_results:
-            all_results.append((content, metadata, score * 1.0))
-        
-        # Weight student group results highest if available
-        for content, metadata, score in student_group_results:
-            all_results.append((content, metadata, score * 1.2))
+        # Run every stage as one batched search
+        stage_results = await self._semantic_search_batch(
+            [stage_query for stage_query, _, _ in stages], subject, grade,
+            limits=[limit for _, limit, _ in stages], student_group_info=student_group_info
+        )
         
-        # Deduplicate and rank
-        combined_results = self._deduplicate_and_rank(all_results)
+        # Combine with hierarchical weighting, then deduplicate and rank
+        combined_results = self._merge_results(
+            *(results.with_scores(results.scores * weight) for (_, _, weight), results in zip(stages, stage_results)),
+            top_k=self.retrieval_config["final_top_k"]
+        )
         
         # Convert to RetrievalResult format
         results = []
-        for i, (content, metadata, score) in enumerate(combined_results[:self.retrieval_config["final_top_k"]]):
+        for i, (content, metadata, score) in enumerate(combined_results):
             student_relevance = self._assess_student_group_relevance(content, student_group_info)
             results.append(RetrievalResult(
                 content=content,
@@ -486,44 +802,33 @@ class AdvancedRetriever:
         # Get all results first
         all_results = await self._semantic_search(query, subject, grade, limit=20, student_group_info=student_group_info)
         
+        if not all_results:
+            return []
+        
         # Apply temporal weighting
-        temporal_results = []
         current_time = asyncio.get_event_loop().time()
+        metadatas = all_results.metadatas
         
-        for content, metadata, score in all_results:
-            # Extract temporal information from metadata
-            temporal_weight = 1.0
-            
-            # Boost recent standards
-            if "cached_at" in metadata:
-                age_hours = (current_time - metadata["cached_at"]) / 3600
-                temporal_weight = max(0.5, 1.0 - (age_hours / 8760))  # Decay over year
-            
-            # Boost current standards
-            if metadata.get("source") in ["Common Core", "NGSS"]:
-                temporal_weight *= 1.2
-            
-            # Boost external resources (they're more current)
-            if metadata.get("source") in ["YouTube", "Wikipedia"]:
-                temporal_weight *= 1.3
-            
-            # Apply temporal boost
-            adjusted_score = score * (1.0 + self.retrieval_config["temporal_weight"] * temporal_weight)
-            temporal_results.append((content, metadata, adjusted_score))
-        
-        # Sort by adjusted score
-        temporal_results.sort(key=lambda x: x[2], reverse=True)
+        # Age of cached standards; documents without a cache time get no decay
+        ages_hours = np.fromiter(
+            ((current_time - m["cached_at"]) / 3600 if "cached_at" in m else 0.0 for m in metadatas),
+            dtype=np.float64, count=len(metadatas)
+        )
+        adjusted_scores, temporal_weights = _temporal_boost(
+            all_results.scores, ages_hours, _source_classes(metadatas), _TEMPORAL_SOURCE_BOOST, self.retrieval_config["temporal_weight"]
+        )
         
-        # Convert to RetrievalResult format
+        # Convert the top results by adjusted score to RetrievalResult format
         results = []
-        for i, (content, metadata, score) in enumerate(temporal_results[:self.retrieval_config["final_top_k"]]):
+        for i in _top_k_indices(adjusted_scores, self.retrieval_config["final_top_k"]):
+            content, metadata, _ = all_results[i]
             student_relevance = self._assess_student_group_relevance(content, student_group_info)
             results.append(RetrievalResult(
                 content=content,
                 metadata=metadata,
-                score=score,
+                score=float(adjusted_scores[i]),
                 retrieval_method="temporal",
-                relevance_explanation=f"Temporal-weighted search (recency boost: {temporal_weight:.2f})",
+                relevance_explanation=f"Temporal-weighted search (recency boost: {temporal_weights[i]:.2f})",
                 student_group_relevance=student_relevance
             ))
         
@@ -540,26 +845,21 @@ class AdvancedRetriever:
         # Build sophisticated metadata filters including student group context
         filters = self._build_advanced_metadata_filter(query, subject, grade, student_group_info)
         
-        # Perform filtered search
-        query_embedding = self.rag_service.embeddings.embed_query(query)
-        
-        search_result = self.qdrant_client.search(
-            collection_name=self.collection_name,
-            query_vector=query_embedding,
-            query_filter=filters,
-            limit=self.retrieval_config["final_top_k"]
-        )
+        # Perform filtered search, off the event loop since embedding and search are blocking client calls
+        search_result = await asyncio.to_thread(self._filtered_vector_search, query, filters)
         
         # Convert to RetrievalResult format
         results = []
+        filter_count = len(filters.must) if filters else 0
         for point in search_result:
-            student_relevance = self._assess_student_group_relevance(point.payload.get("text", ""), student_group_info)
+            content, metadata = _split_payload(point.payload)
+            student_relevance = self._assess_student_group_relevance(content, student_group_info)
             results.append(RetrievalResult(
-                content=point.payload.get("text", ""),
-                metadata={k: v for k, v in point.payload.items() if k != "text"},
+                content=content,
+                metadata=metadata,
                 score=point.score,
                 retrieval_method="metadata_filtered",
-                relevance_explanation=f"Metadata-filtered search with {len(filters.get('must', []))} filters",
+                relevance_explanation=f"Metadata-filtered search with {filter_count} filters",
                 student_group_relevance=student_relevance
             ))
         
@@ -602,233 +902,518 @@ class AdvancedRetriever:
     
     # Helper methods
     
-    async def _semantic_search(self, query: str, subject: str, grade: str, limit: int = 5, student_group_info: str = "") -> List[Tuple[str, Dict, float]]:
+    async def _semantic_search(self, query: str, subject: str, grade: str, limit: int = 5, student_group_info: str = "") -> ResultBatch:
         """Basic semantic search with student group context"""
-        query_embedding = self.rag_service.embeddings.embed_query(query)
+        results = await self._semantic_search_batch([query], subject, grade, limits=[limit], student_group_info=student_group_info)
+        return results[0]
+    
+    async def _semantic_search_batch(self, queries: List[str], subject: str, grade: str, limits: List[int], student_group_info: str = "") -> List[ResultBatch]:
+        """Embed several queries in one request and run them as a single batched k-NN search"""
+        # Embedding and search are blocking client calls; run them off the event loop so gathered branches overlap
+        return await asyncio.to_thread(self._vector_search_batch, queries, subject, grade, limits)
+    
+    def _vector_search_batch(self, queries: List[str], subject: str, grade: str, limits: List[int]) -> List[ResultBatch]:
+        """Blocking body of _semantic_search_batch"""
+        query_embeddings = self._embed_queries(queries)
+        
+        if self.faiss_index is not None:
+            batches = self._faiss_search(query_embeddings, subject, grade, max(limits))
+            if batches is not None:
+                return [ResultBatch.from_hits(hits[:limit]) for hits, limit in zip(batches, limits)]
+        
+        query_filter = self._build_metadata_filter(subject, grade)
+        search_results = self.qdrant_client.search_batch(
+            collection_name=self.collection_name,
+            requests=[
+                SearchRequest(vector=embedding.tolist(), filter=query_filter, limit=limit, with_payload=True)
+                for embedding, limit in zip(query_embeddings, limits)
+            ]
+        )
+        
+        return [
+            ResultBatch.from_hits([(*_split_payload(point.payload), point.score) for point in search_result])
+            for search_result in search_results
+        ]
+    
+    def _multi_vector_search_batches(self, query: str, subject: str, grade: str) -> List[ResultBatch]:
+        """Blocking body of _multi_vector_search: one result batch per available embedding model"""
+        # Embed the query with each available model
+        query_embeddings = [self._embed_queries([query])[0].tolist()]
+        if ADVANCED_RETRIEVAL_AVAILABLE:
+            query_embeddings.append(self._encode_sentence(query).tolist())
+        
+        # Search Qdrant with every model's vector in one round-trip
+        query_filter = self._build_metadata_filter(subject, grade)
+        search_results = self.qdrant_client.search_batch(
+            collection_name=self.collection_name,
+            requests=[
+                SearchRequest(vector=query_embedding, filter=query_filter, limit=8, with_payload=True)
+                for query_embedding in query_embeddings
+            ]
+        )
         
-        search_result = self.qdrant_client.search(
+        return [
+            ResultBatch.from_hits([(*_split_payload(point.payload), point.score) for point in search_result])
+            for search_result in search_results
+        ]
+    
+    def _filtered_vector_search(self, query: str, filters: Optional[Filter]) -> List[Any]:
+        """Blocking body of _metadata_filtered_search: Qdrant points for the query under filters"""
+        query_embedding = self._embed_queries([query])[0].tolist()
+        
+        return self.qdrant_client.search(
             collection_name=self.collection_name,
             query_vector=query_embedding,
-            query_filter=self._build_metadata_filter(subject, grade),
-            limit=limit
+            query_filter=filters,
+            limit=self.retrieval_config["final_top_k"]
         )
+    
+    def _embed_queries(self, queries: List[str]) -> np.ndarray:
+        """Embed queries with the OpenAI model, reusing cached vectors and batching the misses into one request"""
+        cache = self._query_embedding_cache
+        pinned = self._pinned_query_embeddings
+        found = {}
+        with self._query_embedding_cache_lock:
+            for query in queries:
+                if query in pinned:
+                    found[query] = pinned[query]
+                elif query in cache:
+                    found[query] = cache[query]
+                    cache.move_to_end(query)
+        
+        # The embedding request itself runs outside the lock
+        misses = [query for query in dict.fromkeys(queries) if query not in found]
+        if misses:
+            for query, embedding in zip(misses, self.rag_service.embeddings.embed_documents(misses)):
+                found[query] = _cacheable_embedding(embedding)
+            
+            with self._query_embedding_cache_lock:
+                cache.update((query, found[query]) for query in misses)
+                while len(cache) > self.retrieval_config["embedding_cache_size"]:
+                    cache.popitem(last=False)
         
-        results = []
-        for point in search_result:
-            results.append((
-                point.payload.get("text", ""),
-                {k: v for k, v in point.payload.items() if k != "text"},
-                point.score
-            ))
+        return np.stack([found[query] for query in queries]).astype(np.float32)
+    
+    def warm_query_embeddings(self, queries: List[str], batch_size: int = 128):
+        """Embed queries ahead of time and pin them outside the LRU cache"""
+        queries = [query for query in dict.fromkeys(queries) if query not in self._pinned_query_embeddings]
+        try:
+            for start in range(0, len(queries), batch_size):
+                batch = queries[start:start + batch_size]
+                embeddings = [_cacheable_embedding(embedding) for embedding in self.rag_service.embeddings.embed_documents(batch)]
+                with self._query_embedding_cache_lock:
+                    self._pinned_query_embeddings.update(zip(batch, embeddings))
+            print(f"✅ Warmed {len(queries)} query embeddings")
+        except Exception as e:
+            print(f"⚠️  Query embedding warm-up failed: {e}")
+    
+    def _encode_sentence(self, query: str) -> np.ndarray:
+        """Sentence-transformer embedding for a query (LRU-cached per instance in __init__)"""
+        if self.onnx_sentence_transformer is None:
+            vector = np.asarray(self.sentence_transformer.encode([query])[0], dtype=np.float32)
+        else:
+            model, tokenizer = self.onnx_sentence_transformer
+            inputs = tokenizer([query], padding=True, truncation=True, max_length=256, return_tensors="np")
+            token_embeddings = np.asarray(model(**inputs).last_hidden_state, dtype=np.float32)
+            
+            # Masked mean pooling + L2 normalization, matching the all-MiniLM-L6-v2 pipeline
+            mask = inputs["attention_mask"][..., None].astype(np.float32)
+            pooled = (token_embeddings * mask).sum(axis=1)[0] / max(mask.sum(), 1e-9)
+            vector = pooled / max(np.linalg.norm(pooled), 1e-12)
         
-        return results
+        vector.flags.writeable = False
+        return vector
     
-    async def _bm25_search(self, query: str, subject: str, grade: str, limit: int = 5, student_group_info: str = "") -> List[Tuple[str, Dict, float]]:
-        """BM25 keyword search with student group context"""
-        # This would require building a BM25 index from your documents
-        # For now, return empty results
-        return []
+    def _load_onnx_model(self, model_cls, model_name: str) -> Tuple[Any, Any]:
+        """Export a Hugging Face model to ONNX with dynamic int8 quantization, cached on disk after the first run"""
+        save_dir = os.path.join(self.retrieval_config["onnx_cache_dir"], model_name.replace("/", "__"))
+        quantized_file = "model_quantized.onnx"
+        
+        if not os.path.exists(os.path.join(save_dir, quantized_file)):
+            model = model_cls.from_pretrained(model_name, export=True)
+            model.save_pretrained(save_dir)
+            AutoTokenizer.from_pretrained(model_name).save_pretrained(save_dir)
+            ORTQuantizer.from_pretrained(model).quantize(
+                save_dir=save_dir,
+                quantization_config=AutoQuantizationConfig.avx512_vnni(is_static=False, per_channel=False)
+            )
+            print(f"✅ Exported int8 ONNX model for {model_name}")
+        
+        return model_cls.from_pretrained(save_dir, file_name=quantized_file), AutoTokenizer.from_pretrained(save_dir)
     
-    def _build_metadata_filter(self, subject: str, grade: str) -> Optional[Filter]:
-        """Build basic metadata filter"""
-        conditions = []
+    def _rerank_scores(self, query_doc_pairs: List[List[str]]) -> np.ndarray:
+        """Cross-encoder relevance scores for [query, document] pairs, on ONNX Runtime when available"""
+        if self.onnx_cross_encoder is None:
+            return np.asarray(self.cross_encoder.predict(query_doc_pairs), dtype=np.float32)
+        
+        model, tokenizer = self.onnx_cross_encoder
+        inputs = tokenizer(
+            [pair[0] for pair in query_doc_pairs], [pair[1] for pair in query_doc_pairs],
+            padding=True, truncation=True, return_tensors="np"
+        )
+        logits = np.asarray(model(**inputs).logits, dtype=np.float32).reshape(-1)
         
-        if subject:
-            conditions.append(FieldCondition(key="subject", match=MatchValue(value=subject)))
-        if grade:
-            conditions.append(FieldCondition(key="grade", match=MatchValue(value=grade)))
+        # Same sigmoid CrossEncoder.predict applies to single-label models, so scores stay in [0, 1]
+        return 1.0 / (1.0 + np.exp(-logits))
+    
+    def _faiss_search(self, query_vectors: np.ndarray, subject: str, grade: str, limit: int) -> Optional[List[List[Tuple[str, Dict, float]]]]:
+        """
+        k-NN search over the IVF-PQ index with L2-normalized query vectors, restricted to the subject/grade's rows.
+        Returns None when a query comes up short so the caller can fall back to Qdrant's filtered search.
+        """
+        xq = np.ascontiguousarray(query_vectors, dtype=np.float32)
+        selector, matching = self._faiss_selector(subject, grade)
+        k = min(limit, matching)
+        if k == 0:
+            return [[] for _ in range(len(xq))]
+        
+        # Search parameters override the index's own nprobe, so it is passed along with the selector
+        params = faiss.SearchParametersIVF(nprobe=self.retrieval_config["faiss_nprobe"])
+        if selector is not None:
+            params.sel = selector
+        try:
+            scores, ids = self.faiss_index.search(xq, k, params=params)
+        except Exception as e:
+            # GPU IVF-PQ indexes do not support ID selectors
+            print(f"⚠️  Filtered FAISS search failed, using Qdrant search: {e}")
+            return None
         
-        if conditions:
-            return Filter(must=conditions)
-        return None
+        batches = [
+            [(self._corpus_texts[idx], self._corpus_metadata[idx], float(score)) for score, idx in zip(row_scores, row_ids) if idx >= 0]
+            for row_scores, row_ids in zip(scores, ids)
+        ]
+        
+        # The probed IVF lists can hold fewer matching rows than requested
+        if any(len(hits) < k for hits in batches):
+            return None
+        return batches
     
-    def _build_advanced_metadata_filter(self, query: str, subject: str, grade: str, student_group_info: str = "") -> Optional[Filter]:
-        """Build advanced metadata filter with domain/cluster matching and student group context"""
-        conditions = []
+    def _faiss_selector(self, subject: str, grade: str) -> Tuple[Optional[Any], int]:
+        """FAISS ID selector over the rows matching subject/grade (None when unfiltered) and the number of those rows"""
+        if not subject and not grade:
+            return None, len(self._corpus_texts)
+        
+        key = (subject, grade)
+        cached = self._faiss_selectors.get(key)
+        if cached is None:
+            mask = np.ones(len(self._corpus_texts), dtype=bool)
+            if subject:
+                mask &= self._corpus_subjects == subject
+            if grade:
+                mask &= self._corpus_grades == grade
+            rows = np.flatnonzero(mask).astype(np.int64)
+            cached = self._faiss_selectors[key] = (faiss.IDSelectorBatch(rows), rows.size)
+        return cached
+    
+    async def _bm25_search(self, query: str, subject: str, grade: str, limit: int = 5, student_group_info: str = "") -> ResultBatch:
+        """BM25 keyword search with student group context"""
+        if self.bm25_index is None:
+            return ResultBatch.from_hits([])
         
-        # Basic filters
+        # Only the query is tokenized per call; corpus statistics are prebuilt
+        scores = self.bm25_index.get_scores(_TOKEN_PATTERN.findall(query.lower()))
+        
+        # The filter columns can already cover documents appended after the BM25 index was built
+        mask = scores > 0
         if subject:
-            conditions.append(FieldCondition(key="subject", match=MatchValue(value=subject)))
+            mask &= self._corpus_subjects[:len(scores)] == subject
         if grade:
-            conditions.append(FieldCondition(key="grade", match=MatchValue(value=grade)))
+            mask &= self._corpus_grades[:len(scores)] == grade
+        candidates = np.flatnonzero(mask)
+        if candidates.size == 0:
+            return ResultBatch.from_hits([])
+        
+        # Partial top-k selection instead of sorting the whole corpus
+        candidate_scores = scores[candidates]
+        top = _top_k_indices(candidate_scores, limit)
+        
+        # Scale to [0, 1] relative to the best match
+        max_score = candidate_scores[top[0]]
+        return ResultBatch.from_hits([
+            (self._corpus_texts[i], self._corpus_metadata[i], score / max_score)
+            for i, score in zip(candidates[top], candidate_scores[top])
+        ])
+    
+    def _load_corpus(self, with_vectors: bool = False) -> Tuple[List[Any], List[str], List[Dict[str, Any]], Optional[np.ndarray]]:
+        """Scroll the whole collection once into local id/text/metadata (and vector) lists"""
+        ids, texts, metadatas, vectors = [], [], [], []
+        offset = None
+        
+        while True:
+            points, offset = self.qdrant_client.scroll(
+                collection_name=self.collection_name,
+                limit=256,
+                offset=offset,
+                with_payload=True,
+                with_vectors=with_vectors
+            )
+            for point in points:
+                text, metadata = _split_payload(point.payload)
+                ids.append(point.id)
+                texts.append(text)
+                metadatas.append(metadata)
+                if with_vectors:
+                    vectors.append(point.vector)
+            if offset is None:
+                break
+        
+        return ids, texts, metadatas, np.asarray(vectors, dtype=np.float32) if vectors else None
+    
+    def _set_corpus(self, ids: List[Any], texts: List[str], metadatas: List[Dict[str, Any]]):
+        """Install the local corpus lists plus the subject/grade columns BM25 and FAISS filter on"""
+        self._corpus_ids = ids
+        self._corpus_rows = {point_id: row for row, point_id in enumerate(ids)}
+        self._corpus_texts = texts
+        self._corpus_metadata = metadatas
+        self._set_corpus_columns()
+    
+    def _set_corpus_columns(self):
+        """Rebuild the subject/grade filter columns from the corpus metadata"""
+        self._corpus_subjects = np.array([m.get("subject") for m in self._corpus_metadata], dtype=object)
+        self._corpus_grades = np.array([m.get("grade") for m in self._corpus_metadata], dtype=object)
+        self._faiss_selectors.clear()
+    
+    def refresh_corpus(self):
+        """
+        Bring the local corpus up to date with documents ingested since it was loaded.
+        New points are appended to the corpus lists and the FAISS index; re-upserted points are updated in place.
+        The BM25 index is then rebuilt over the updated corpus.
+        """
+        with self._corpus_lock:
+            version = self.rag_service.collection_version
+            if version == self._corpus_version:
+                return
+            if self.faiss_index is None and not ADVANCED_RETRIEVAL_AVAILABLE:
+                self._corpus_version = version
+                return
+            
+            try:
+                ids, texts, metadatas, _ = self._load_corpus()
+                new_rows = [i for i, point_id in enumerate(ids) if point_id not in self._corpus_rows]
+                changed = any(
+                    self._corpus_texts[self._corpus_rows[point_id]] != text
+                    for point_id, text in zip(ids, texts) if point_id in self._corpus_rows
+                )
+                
+                if self.faiss_index is not None and changed:
+                    # Replaced vectors cannot be updated in an IVF-PQ index without shifting row ids
+                    print("ℹ️  Re-ingested documents changed, using Qdrant search until the FAISS index is retrained")
+                    self.faiss_index = None
+                    if os.path.exists(self.retrieval_config["faiss_index_path"]):
+                        os.remove(self.retrieval_config["faiss_index_path"])
+                
+                new_vectors = None
+                if self.faiss_index is not None and new_rows:
+                    new_ids = [ids[i] for i in new_rows]
+                    points = self.qdrant_client.retrieve(
+                        collection_name=self.collection_name, ids=new_ids, with_payload=False, with_vectors=True
+                    )
+                    vectors_by_id = {point.id: point.vector for point in points}
+                    new_vectors = np.asarray([vectors_by_id[point_id] for point_id in new_ids], dtype=np.float32)
+                    faiss.normalize_L2(new_vectors)
+                
+                for point_id, text, metadata in zip(ids, texts, metadatas):
+                    row = self._corpus_rows.get(point_id)
+                    if row is not None:
+                        self._corpus_texts[row] = text
+                        self._corpus_metadata[row] = metadata
+                
+                # The lists grow before the index does, so every FAISS id a concurrent search sees resolves
+                for i in new_rows:
+                    self._corpus_rows[ids[i]] = len(self._corpus_ids)
+                    self._corpus_ids.append(ids[i])
+                    self._corpus_texts.append(texts[i])
+                    self._corpus_metadata.append(metadatas[i])
+                self._set_corpus_columns()
+                if new_vectors is not None:
+                    self.faiss_index.add(new_vectors)
+                    self._faiss_selectors.clear()
+                
+                # BM25 corpus statistics cannot be updated incrementally
+                if ADVANCED_RETRIEVAL_AVAILABLE:
+                    self._build_bm25_index()
+                
+                self._corpus_version = version
+                print(f"✅ Refreshed corpus with {len(new_rows)} new documents")
+                
+            except Exception as e:
+                print(f"⚠️  Corpus refresh failed: {e}")
+    
+    def _build_faiss_index(self):
+        """
+        Load (or train and persist) an OPQ + IVF-PQ FAISS index over the collection.
+        Small collections stay on Qdrant's exact search since PQ needs enough points to train.
+        """
+        index_path = self.retrieval_config["faiss_index_path"]
         
+        try:
+            if os.path.exists(index_path):
+                ids, texts, metadatas, _ = self._load_corpus()
+                index = faiss.read_index(index_path)
+                if index.ntotal != len(texts):
+                    print("⚠️  Persisted FAISS index is stale, retraining")
+                    os.remove(index_path)
+                    return self._build_faiss_index()
+            else:
+                # Count first so small collections never pull their vectors into memory
+                point_count = self.qdrant_client.count(collection_name=self.collection_name, exact=True).count
+                if point_count < self.retrieval_config["faiss_min_train_size"]:
+                    print(f"ℹ️  {point_count} vectors is below the IVF-PQ training size, using Qdrant search")
+                    return
+                
+                ids, texts, metadatas, vectors = self._load_corpus(with_vectors=True)
+                faiss.normalize_L2(vectors)
+                index = faiss.index_factory(
+                    vectors.shape[1], self.retrieval_config["faiss_index_factory"], faiss.METRIC_INNER_PRODUCT
+                )
+                index.train(vectors)
+                index.add(vectors)
+                os.makedirs(os.path.dirname(index_path), exist_ok=True)
+                faiss.write_index(index, index_path)
+                print(f"✅ Trained FAISS {self.retrieval_config['faiss_index_factory']} index on {index.ntotal} vectors")
+            
+            faiss.extract_index_ivf(index).nprobe = self.retrieval_config["faiss_nprobe"]
+            
+            # nprobe is set first so the GPU clone inherits it
+            if self.retrieval_config["use_gpu_faiss"] and faiss.get_num_gpus() > 0:
+                self._faiss_gpu_resources = faiss.StandardGpuResources()
+                cloner_options = faiss.GpuClonerOptions()
+                cloner_options.useFloat16 = True
+                index = faiss.index_cpu_to_gpu(self._faiss_gpu_resources, 0, index, cloner_options)
+                print("✅ FAISS index moved to GPU 0")
+            
+            self.faiss_index = index
+            self._set_corpus(ids, texts, metadatas)
+            
+        except Exception as e:
+            print(f"⚠️  FAISS index unavailable, using Qdrant search: {e}")
+    
+    def _build_bm25_index(self):
+        """Tokenize the local corpus (loading it if needed) and build the BM25 index"""
+        try:
+            if not self._corpus_texts:
+                self._set_corpus(*self._load_corpus()[:3])
+            if not self._corpus_texts:
+                print("ℹ️  Collection is empty, BM25 search disabled")
+                return
+            
+            # Built aside and swapped in, so searches never see a half-built index
+            corpus_tokens = [_TOKEN_PATTERN.findall(text.lower()) for text in self._corpus_texts]
+            bm25_index = BM25Okapi(corpus_tokens)
+            self._bm25_corpus_tokens = corpus_tokens
+            self.bm25_index = bm25_index
+            print(f"✅ Built BM25 index over {len(self._corpus_texts)} documents")
+            
+        except Exception as e:
+            print(f"⚠️  BM25 index unavailable: {e}")
+    
+    def _build_metadata_filter(self, subject: str, grade: str) -> Optional[Filter]:
+        """Build basic metadata filter"""
+        return _subject_grade_filter(subject, grade)
+    
+    def _build_advanced_metadata_filter(self, query: str, subject: str, grade: str, student_group_info: str = "") -> Optional[Filter]:
+        """Build advanced metadata filter with domain/cluster matching and student group context"""
         # Extract domain/cluster from query for additional filtering
         query_lower = query.lower()
+        domain = next(
+            (domain for keywords, domain in _QUERY_DOMAINS if any(keyword in query_lower for keyword in keywords)),
+            None
+        )
         
-        # Domain-specific filtering
-        if "fractions" in query_lower or "decimals" in query_lower:
-            conditions.append(FieldCondition(key="domain", match=MatchValue(value="Number and Operations")))
-        elif "geometry" in query_lower or "area" in query_lower:
-            conditions.append(FieldCondition(key="domain", match=MatchValue(value="Geometry")))
-        
-        # Student group specific filtering
-        if student_group_info:
-            if "ESL" in student_group_info or "English language" in student_group_info:
-                # Prefer visual and hands-on resources
-                pass  # Could add specific filters here
-            elif "ADHD" in student_group_info:
-                # Prefer interactive and movement-based resources
-                pass  # Could add specific filters here
-        
-        if conditions:
-            return Filter(must=conditions)
-        return None
+        return _advanced_metadata_filter(subject, grade, domain, _detect_student_group(student_group_info))
     
     def _assess_student_group_relevance(self, content: str, student_group_info: str) -> Optional[str]:
         """Assess how relevant content is to specific student group needs"""
         if not student_group_info:
             return None
-        
-        content_lower = content.lower()
-        relevance_factors = []
-        
-        if "ESL" in student_group_info or "English language" in student_group_info:
-            if any(term in content_lower for term in ["visual", "hands-on", "multimodal", "support", "accommodation"]):
-                relevance_factors.append("Visual/kinesthetic support")
-        
-        if "ADHD" in student_group_info:
-            if any(term in content_lower for term in ["movement", "kinesthetic", "interactive", "short", "active"]):
-                relevance_factors.append("Movement-based learning")
-        
-        if "learning disability" in student_group_info:
-            if any(term in content_lower for term in ["differentiated", "accommodation", "alternative", "support", "modified"]):
-                relevance_factors.append("Differentiated instruction")
-        
-        if "gifted" in student_group_info:
-            if any(term in content_lower for term in ["advanced", "challenge", "enrichment", "extension", "complex"]):
-                relevance_factors.append("Advanced content")
-        
-        return "; ".join(relevance_factors) if relevance_factors else None
+        return _assess_student_group_relevance_cached(content, student_group_info)
     
-    def _combine_results(self, results1: List, results2: List, alpha: float = 0.7) -> List[Tuple[str, Dict, float]]:
-        """Combine results from different retrieval methods"""
-        combined = {}
-        
-        # Add results from first method
-        for content, metadata, score in results1:
-            key = content[:100]  # Use first 100 chars as key
-            combined[key] = (content, metadata, score * alpha)
-        
-        # Add results from second method
-        for content, metadata, score in results2:
-            key = content[:100]
-            if key in combined:
-                # Combine scores
-                existing_content, existing_metadata, existing_score = combined[key]
-                combined[key] = (content, metadata, existing_score + score * (1 - alpha))
-            else:
-                combined[key] = (content, metadata, score * (1 - alpha))
-        
-        # Sort by combined score
-        sorted_results = sorted(combined.values(), key=lambda x: x[2], reverse=True)
-        return sorted_results
-    
-    def _deduplicate_and_rank(self, results: List) -> List[Tuple[str, Dict, float]]:
-        """Deduplicate results and rank by score"""
-        seen = set()
-        deduplicated = []
-        
-        for result in results:
-            if isinstance(result, dict):
-                content = result["content"]
-                metadata = result["metadata"]
-                score = result["score"]
-            else:
-                content, metadata, score = result
-            
-            key = content[:100]
-            if key not in seen:
-                seen.add(key)
-                deduplicated.append((content, metadata, score))
+    def _group_by_content(self, contents: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Group results by content key. Returns the index of each group's first occurrence
+        (in input order) and, per result, the position of its group in that array.
+        """
+        # One pass over a hash -> group dict; groups are numbered in first-seen order so ties rank as before
+        group_of_key = {}
+        first_index = []
+        groups = []
+        for i, key in enumerate(map(_content_key, contents)):
+            group = group_of_key.get(key)
+            if group is None:
+                group = group_of_key[key] = len(first_index)
+                first_index.append(i)
+            groups.append(group)
+        return np.array(first_index, dtype=np.intp), np.array(groups, dtype=np.intp)
+    
+    def _merge_results(self, *rankings: ResultBatch, top_k: Optional[int] = None, rrf_k: Optional[int] = None) -> ResultBatch:
+        """
+        Merge ranked results from one or more searches in a single grouping pass. With rrf_k, results
+        sharing a content key are fused by reciprocal rank; otherwise the first occurrence is kept.
+        Returns the top_k best (all of them when top_k is None) in descending score order.
+        """
+        if rrf_k is not None:
+            # Each result scores 1 / (rrf_k + rank) in its own ranking (rank counted from 1), so raw
+            # score scales never meet
+            rankings = [results.with_scores(1.0 / (rrf_k + np.arange(1, len(results) + 1))) for results in rankings]
+        
+        entries = ResultBatch.concat(list(rankings))
+        if len(entries) <= 1:
+            return entries
+        
+        representatives, groups = self._group_by_content(entries.contents)
+        if rrf_k is not None:
+            scores = np.zeros(len(representatives))
+            np.add.at(scores, groups, entries.scores)
+        else:
+            scores = entries.scores[representatives]
+        merged = entries.take(representatives).with_scores(scores)
         
-        # Sort by score
-        deduplicated.sort(key=lambda x: x[2], reverse=True)
-        return deduplicated
+        # Partial selection when the caller only needs the best few, otherwise a full sort
+        if top_k is not None:
+            return merged.top_k(top_k)
+        return merged.take(np.argsort(-merged.scores, kind="stable"))
     
     async def _generate_query_expansions(self, query: str, subject: str, grade: str, student_group_info: str = "") -> List[str]:
         """Generate expanded queries including student group specific expansions"""
         expansions = [query]  # Original query
         
-        # Add subject-specific expansions
-        if "objectives" in query.lower():
-            expansions.extend([
-                f"{subject} {grade} learning goals",
-                f"{subject} {grade} educational outcomes",
-                f"{subject} {grade} student expectations"
-            ])
-        
-        if "assessment" in query.lower():
-            expansions.extend([
-                f"{subject} {grade} evaluation methods",
-                f"{subject} {grade} testing strategies",
-                f"{subject} {grade} student assessment"
-            ])
-        
-        if "materials" in query.lower() or "resources" in query.lower():
-            expansions.extend([
-                f"{subject} {grade} teaching materials",
-                f"{subject} {grade} educational resources",
-                f"{subject} {grade} classroom supplies"
-            ])
+        # Add subject-specific expansions for every topic the query mentions, in table order
+        topics = _EXPANSION_TOPIC_SCANNER(query.lower())
+        for topic, suffixes in _QUERY_EXPANSIONS.items():
+            if topic in topics:
+                expansions.extend(f"{subject} {grade} {suffix}" for suffix in suffixes)
         
         # Add student group specific expansions
-        if student_group_info:
-            if "ESL" in student_group_info:
-                expansions.extend([
-                    f"{query} visual supports",
-                    f"{query} hands-on activities",
-                    f"{query} multimodal learning"
-                ])
-            elif "ADHD" in student_group_info:
-                expansions.extend([
-                    f"{query} movement activities",
-                    f"{query} interactive learning",
-                    f"{query} kinesthetic approaches"
-                ])
-            elif "learning disability" in student_group_info:
-                expansions.extend([
-                    f"{query} differentiated instruction",
-                    f"{query} accommodations",
-                    f"{query} alternative methods"
-                ])
-            elif "gifted" in student_group_info:
-                expansions.extend([
-                    f"{query} enrichment activities",
-                    f"{query} advanced challenges",
-                    f"{query} extension projects"
-                ])
+        group = _detect_student_group(student_group_info)
+        if group:
+            expansions.extend(f"{query} {suffix}" for suffix in _STUDENT_GROUP_EXPANSIONS[group])
         
         return expansions[:self.retrieval_config["expansion_queries"]]
     
     async def _compress_content(self, query: str, content: str, student_group_info: str = "") -> str:
         """Compress content to most relevant parts, considering student group context"""
         # Simple compression - extract sentences containing query terms
-        query_terms = query.lower().split()
-        sentences = content.split('. ')
-        
-        relevant_sentences = []
-        for sentence in sentences:
-            if any(term in sentence.lower() for term in query_terms):
-                relevant_sentences.append(sentence)
+        terms = query.lower().split()
         
         # Also look for student group relevant sentences
-        if student_group_info:
-            student_terms = []
-            if "ESL" in student_group_info:
-                student_terms.extend(["visual", "hands-on", "support", "accommodation"])
-            elif "ADHD" in student_group_info:
-                student_terms.extend(["movement", "interactive", "kinesthetic", "active"])
-            elif "learning disability" in student_group_info:
-                student_terms.extend(["differentiated", "accommodation", "alternative", "support"])
-            elif "gifted" in student_group_info:
-                student_terms.extend(["advanced", "challenge", "enrichment", "extension"])
-            
-            for sentence in sentences:
-                if any(term in sentence.lower() for term in student_terms):
-                    relevant_sentences.append(sentence)
+        group = _detect_student_group(student_group_info)
+        if group:
+            terms.extend(sorted(_STUDENT_GROUP_COMPRESSION_TERMS[group]))
+        
+        # One multi-pattern scan per sentence counts the distinct terms it contains
+        relevant_sentences = []
+        if terms:
+            scanner = _distinct_term_scanner(tuple(terms))
+            scored = (
+                (len(scanner(sentence.lower())), position, sentence)
+                for position, sentence in enumerate(content.split('. '))
+            )
+            # Stream the matching sentences through a 3-slot heap, then restore document order
+            top = heapq.nlargest(3, (item for item in scored if item[0]), key=lambda item: item[0])
+            relevant_sentences = [sentence for _, _, sentence in sorted(top, key=lambda item: item[1])]
         
         if relevant_sentences:
-            return '. '.join(relevant_sentences[:3])  # Top 3 relevant sentences
+            return '. '.join(relevant_sentences)  # Top 3 relevant sentences
         else:
             return content[:200]  # Fallback to first 200 chars
     
@@ -851,6 +1436,29 @@ class AdvancedRetriever:
         return retrieval_results
 
 # Integration with existing RAG service
+
+# RetrievalResult fields copied under their own names into formatted results; content, metadata
+# and score are mapped onto the original RAG service keys
+_RESULT_PASSTHROUGH_FIELDS = ("retrieval_method", "relevance_explanation", "student_group_relevance", "external_resource_type")
+
+def _format_result(result: RetrievalResult, subject: str, grade: str) -> Dict[str, Any]:
+    """Convert a RetrievalResult to the original RAG service result format"""
+    get = result.metadata.get  # Bound once for the seven metadata lookups
+    return {
+        "standard_id": get("standard_id", f"advanced_{result.retrieval_method}"),
+        "description": result.content,
+        "subject": subject,
+        "grade": grade,
+        "source": get("source", "Advanced Retrieval"),
+        "resource_url": get("resource_url", ""),
+        "resource_title": get("resource_title", ""),
+        "resource_type": get("type", "standard"),
+        "score": result.score,
+        "domain": get("domain", ""),
+        "cluster": get("cluster", ""),
+        **{name: getattr(result, name) for name in _RESULT_PASSTHROUGH_FIELDS}
+    }
+
 class EnhancedRAGService:
     """Enhanced RAG service with advanced retrieval - Updated for v2.0"""
     
@@ -868,8 +1476,63 @@ class EnhancedRAGService:
                 RetrievalStrategy.HIERARCHICAL,
                 RetrievalStrategy.STUDENT_GROUP_AWARE,
                 RetrievalStrategy.EXTERNAL_RESOURCE_FOCUSED
-            ]
+            ],
+            "use_result_cache": True,  # Reuse formatted results for repeated or near-identical requests
+            "result_cache_size": 512,
+            "result_cache_ttl": 3600,  # Seconds
+            "semantic_cache_threshold": 0.85,  # Min cosine similarity for a paraphrased query to hit the cache
+            "early_exit_score_threshold": 0.85,  # Top cosine score that lets compare_retrieval_strategies stop early
+            "warm_query_embeddings": True  # Pin template query embeddings for common subject/grade pairs at startup
         }
+        
+        # (normalized query, subject, grade, strategy, student group) -> (expires_at, query embedding, formatted results)
+        self._result_cache = OrderedDict()
+        self._result_cache_version = original_rag_service.collection_version  # Collection version the entries were built from
+        
+        # Warm in the background so construction never waits on the embedding API
+        if self.strategy_config["warm_query_embeddings"]:
+            threading.Thread(
+                target=self.advanced_retriever.warm_query_embeddings, args=(_warmup_queries(),), daemon=True
+            ).start()
+    
+    def _get_cached_results(self, cache_key: Tuple) -> Optional[List[Dict]]:
+        """Cached results for an exact repeat of a request"""
+        entry = self._result_cache.get(cache_key)
+        if entry is None:
+            return None
+        if entry[0] <= time.monotonic():
+            del self._result_cache[cache_key]
+            return None
+        self._result_cache.move_to_end(cache_key)
+        return entry[2]
+    
+    def _get_semantic_cached_results(self, cache_key: Tuple, query_embedding: np.ndarray) -> Optional[List[Dict]]:
+        """Cached results of the most similar earlier query with the same subject, grade, strategy and student group"""
+        now = time.monotonic()
+        candidates = [
+            (key, entry) for key, entry in self._result_cache.items()
+            if key[1:] == cache_key[1:] and entry[0] > now
+        ]
+        if not candidates:
+            return None
+        
+        # Embeddings are unit length, so one matrix-vector product gives every cosine similarity
+        similarities = np.stack([entry[1] for _, entry in candidates]) @ query_embedding
+        best = int(np.argmax(similarities))
+        if similarities[best] < self.strategy_config["semantic_cache_threshold"]:
+            return None
+        
+        key, entry = candidates[best]
+        self._result_cache.move_to_end(key)
+        return entry[2]
+    
+    def _store_cached_results(self, cache_key: Tuple, query_embedding: np.ndarray, formatted_results: List[Dict]):
+        """Add results to the cache, evicting the least recently used entry when full"""
+        expires_at = time.monotonic() + self.strategy_config["result_cache_ttl"]
+        self._result_cache[cache_key] = (expires_at, query_embedding, [dict(result) for result in formatted_results])
+        self._result_cache.move_to_end(cache_key)
+        if len(self._result_cache) > self.strategy_config["result_cache_size"]:
+            self._result_cache.popitem(last=False)
     
     async def retrieve_relevant_standards_advanced(
         self, 
@@ -889,31 +1552,34 @@ class EnhancedRAGService:
             strategy = self.strategy_config["default_strategy"]
         
         try:
+            # Serve repeated and paraphrased requests from the result cache
+            use_cache = self.strategy_config["use_result_cache"] and not kwargs
+            if use_cache:
+                # Documents ingested since the results were cached may belong in them
+                if self._result_cache_version != self.original_rag_service.collection_version:
+                    self._result_cache.clear()
+                    self._result_cache_version = self.original_rag_service.collection_version
+                
+                cache_key = (" ".join(query.lower().split()), subject, grade, strategy.value, student_group_info)
+                cached_results = self._get_cached_results(cache_key)
+                if cached_results is None:
+                    # The embedding is cached by the retriever, so a miss reuses it for semantic search
+                    query_embedding = (await asyncio.to_thread(self.advanced_retriever._embed_queries, [query]))[0]
+                    cached_results = self._get_semantic_cached_results(cache_key, query_embedding)
+                if cached_results is not None:
+                    return [dict(result) for result in cached_results]
+            
             # Use advanced retrieval
             results = await self.advanced_retriever.advanced_retrieve(
                 query, subject, grade, strategy, student_group_info, **kwargs
             )
             
             # Convert to original format for compatibility
-            formatted_results = []
-            for result in results:
-                formatted_results.append({
-                    "standard_id": result.metadata.get("standard_id", f"advanced_{result.retrieval_method}"),
-                    "description": result.content,
-                    "subject": subject,
-                    "grade": grade,
-                    "source": result.metadata.get("source", "Advanced Retrieval"),
-                    "resource_url": result.metadata.get("resource_url", ""),
-                    "resource_title": result.metadata.get("resource_title", ""),
-                    "resource_type": result.metadata.get("type", "standard"),
-                    "score": result.score,
-                    "domain": result.metadata.get("domain", ""),
-                    "cluster": result.metadata.get("cluster", ""),
-                    "retrieval_method": result.retrieval_method,
-                    "relevance_explanation": result.relevance_explanation,
-                    "student_group_relevance": result.student_group_relevance,
-                    "external_resource_type": result.external_resource_type
-                })
+            formatted_results = [_format_result(result, subject, grade) for result in results]
+            
+            # Empty results are not cached, so a later request can pick up newly ingested documents
+            if use_cache and formatted_results:
+                self._store_cached_results(cache_key, query_embedding, formatted_results)
             
             return formatted_results
             
@@ -926,11 +1592,15 @@ class EnhancedRAGService:
         query: str, 
         subject: str, 
         grade: str,
-        student_group_info: str = ""
+        student_group_info: str = "",
+        early_exit_on_confidence: bool = False
     ) -> Dict[str, List[Dict]]:
         """
         Compare different retrieval strategies for analysis
         Updated to include student group context
+        With early_exit_on_confidence, returns as soon as a cosine-scored strategy (see
+        _COSINE_SCORED_STRATEGIES) yields a full, confident result set and cancels the strategies
+        still running (they are left out of the results)
         """
         
         strategies_to_test = [
@@ -944,17 +1614,43 @@ class EnhancedRAGService:
             RetrievalStrategy.EXTERNAL_RESOURCE_FOCUSED
         ]
         
+        # Run all strategies concurrently; a failing strategy reports its exception instead of cancelling the rest
+        tasks = {
+            asyncio.ensure_future(
+                self.retrieve_relevant_standards_advanced(query, subject, grade, strategy, student_group_info)
+            ): strategy
+            for strategy in strategies_to_test
+        }
+        
         results = {}
+        pending = set(tasks)
         
-        for strategy in strategies_to_test:
-            try:
-                strategy_results = await self.retrieve_relevant_standards_advanced(
-                    query, subject, grade, strategy, student_group_info
-                )
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            
+            confident = False
+            for task in done:
+                strategy = tasks[task]
+                if task.exception() is not None:
+                    print(f"❌ {strategy.value}: {task.exception()}")
+                    results[strategy.value] = []
+                    continue
+                
+                strategy_results = task.result()
                 results[strategy.value] = strategy_results
                 print(f"✅ {strategy.value}: {len(strategy_results)} results")
-            except Exception as e:
-                print(f"❌ {strategy.value}: {e}")
-                results[strategy.value] = []
-        
-        return results
\ No newline at end of file
+                confident = confident or (
+                    strategy in _COSINE_SCORED_STRATEGIES
+                    and len(strategy_results) >= self.advanced_retriever.retrieval_config["final_top_k"]
+                    and max(result.get("score", 0.0) for result in strategy_results) > self.strategy_config["early_exit_score_threshold"]
+                )
+            
+            if early_exit_on_confidence and confident and pending:
+                for task in pending:
+                    task.cancel()
+                await asyncio.gather(*pending, return_exceptions=True)
+                print(f"⏭️  Skipped {len(pending)} strategies after a confident result")
+                break
+        
+        # Report in strategy order rather than completion order
+        return {strategy.value: results[strategy.value] for strategy in strategies_to_test if strategy.value in results}
\ No newline at end of file
@@ -1,99 +1,390 @@
 # Import necessary libraries
-from langgraph.graph import StateGraph, END
+from langgraph.graph import StateGraph, START, END
 from langchain_openai import ChatOpenAI
 from langchain_core.prompts import ChatPromptTemplate  # Updated import
-from typing import TypedDict, List, Dict, Any
+from langchain_core.runnables import RunnableConfig
+from typing import List, Dict, Any, AsyncIterator, Tuple, Optional
+from pydantic import BaseModel, Field, ValidationError
+from collections import OrderedDict
+from dataclasses import dataclass, field
+import copy
+import functools
+import hashlib
+import httpx
+import itertools
 import json
 import asyncio
 import re
+import sys
+import time
+import weakref
+import numpy as np
 
-class LessonPlanState(TypedDict):
-    user_input: str
-    subject: str
-    grade_level: str
-    topic: str
-    duration_minutes: int
-    teaching_style: str
-    student_group_info: str
-    retrieved_standards: List[Dict]
-    external_resources: List[Dict]
-    lesson_objectives: List[str]
-    activities: List[Dict]
-    assessments: List[Dict]
-    materials: List[str]
-    final_lesson_plan: Dict
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
 
-class EducationPlanningAgent:
-    def __init__(self, rag_service):
-        self.llm = ChatOpenAI(model="gpt-4", temperature=0.7)
-        self.rag_service = rag_service
-        self.graph = self._create_graph()
+try:
+    import ahocorasick
+    AHOCORASICK_AVAILABLE = True
+except ImportError:
+    AHOCORASICK_AVAILABLE = False
+
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+class _PerLoopAsyncTransport(httpx.AsyncBaseTransport):
+    """Async transport with one connection pool per event loop, created on first use"""
     
-    def _create_graph(self):
-        """Create the LangGraph workflow"""
-        workflow = StateGraph(LessonPlanState)
-        
-        # Add nodes
-        workflow.add_node("retrieve_standards", self.retrieve_standards)
-        workflow.add_node("fetch_external_resources", self.fetch_external_resources)
-        workflow.add_node("generate_objectives", self.generate_objectives)
-        workflow.add_node("plan_activities", self.plan_activities)
-        workflow.add_node("design_assessments", self.design_assessments)
-        workflow.add_node("compile_lesson_plan", self.compile_lesson_plan)
-        
-        # Add edges
-        workflow.set_entry_point("retrieve_standards")
-        workflow.add_edge("retrieve_standards", "fetch_external_resources")
-        workflow.add_edge("fetch_external_resources", "generate_objectives")
-        workflow.add_edge("generate_objectives", "plan_activities")
-        workflow.add_edge("plan_activities", "design_assessments")
-        workflow.add_edge("design_assessments", "compile_lesson_plan")
-        workflow.add_edge("compile_lesson_plan", END)
-        
-        return workflow.compile()
+    def __init__(self, limits: httpx.Limits):
+        self._limits = limits
+        self._transports = weakref.WeakKeyDictionary()  # Event loop -> httpx.AsyncHTTPTransport
     
-    async def retrieve_standards(self, state: LessonPlanState) -> LessonPlanState:
-        """Retrieve relevant curriculum standards"""
-        query = f"{state['topic']} {state['subject']} {state['grade_level']}"
-        standards = await self.rag_service.retrieve_relevant_standards(
-            query, state['subject'], state['grade_level']
-        )
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        loop = asyncio.get_running_loop()
+        transport = self._transports.get(loop)
+        if transport is None:
+            # Pooled connections keep their loop alive, so drop pools left behind by closed loops
+            for closed_loop in [other for other in self._transports if other.is_closed()]:
+                del self._transports[closed_loop]
+            transport = self._transports[loop] = httpx.AsyncHTTPTransport(limits=self._limits)
+        return await transport.handle_async_request(request)
+    
+    async def aclose(self):
+        """Close the running event loop's connection pool"""
+        transport = self._transports.pop(asyncio.get_running_loop(), None)
+        if transport is not None:
+            await transport.aclose()
+
+# HTTP connection pools shared by every agent's ChatOpenAI, so keep-alive connections (and their
+# TLS sessions) are reused across agents and requests. Async connections are bound to the event
+# loop that opened them, so the async client keeps a pool per loop and works under repeated
+# asyncio.run calls as well as on one long-lived loop.
+_LLM_HTTP_LIMITS = httpx.Limits(max_connections=100, max_keepalive_connections=20)
+_LLM_HTTP_CLIENT = httpx.Client(limits=_LLM_HTTP_LIMITS, timeout=60)
+_LLM_ASYNC_TRANSPORT = _PerLoopAsyncTransport(_LLM_HTTP_LIMITS)
+_LLM_ASYNC_HTTP_CLIENT = httpx.AsyncClient(transport=_LLM_ASYNC_TRANSPORT, timeout=60)
+
+@dataclass(slots=True)
+class LessonPlanState:
+    """Graph state; nodes read attributes and return dicts of the fields they set"""
+    user_input: str = ""
+    subject: str = ""
+    grade_level: str = ""
+    topic: str = ""
+    duration_minutes: int = 45
+    teaching_style: str = "mixed"
+    student_group_info: str = ""
+    retrieved_standards: List[Dict] = field(default_factory=list)
+    external_resources: List[Dict] = field(default_factory=list)
+    standards_json: str = "[]"  # Prompt-ready serializations, built once per plan
+    external_resources_json: str = "[]"
+    lesson_objectives: List[str] = field(default_factory=list)
+    activities: List[Dict] = field(default_factory=list)
+    assessments: List[Dict] = field(default_factory=list)
+    materials: List[str] = field(default_factory=list)
+    final_lesson_plan: Dict = field(default_factory=dict)
+    generated_at: str = ""
+
+# Section headers in free-text activity and assessment responses
+_ACTIVITY_HEADER_RE = re.compile(r'ACTIVITY \d+:', re.IGNORECASE)
+_ASSESSMENT_HEADER_RE = re.compile(r'ASSESSMENT \d+:', re.IGNORECASE)
+
+# Activity type keywords in priority order
+_ACTIVITY_TYPE_KEYWORDS = (
+    (('warm-up', 'warm up', 'opening', 'introduction'), "Warm-up"),
+    (('main', 'instruction', 'teaching', 'lesson'), "Main Activity"),
+    (('practice', 'exercise', 'worksheet'), "Practice"),
+    (('closure', 'wrap-up', 'wrap up', 'conclusion'), "Closure"),
+)
+
+# Assessment method keywords in priority order
+_ASSESSMENT_METHOD_KEYWORDS = (
+    (('observation', 'observe', 'watch'), "Observation"),
+    (('discussion', 'discuss', 'talk'), "Discussion"),
+    (('question', 'ask', 'quiz'), "Questioning"),
+    (('work', 'product', 'artifact'), "Student Work"),
+    (('peer', 'partner', 'group'), "Peer Assessment"),
+)
+
+def _first_keyword_category(text: str, categories: Tuple, default: str) -> str:
+    """Label of the first category with a keyword in text (lowercase)"""
+    # str 'in' is a C fastsearch per keyword; for a dozen short keywords it outruns one
+    # compiled alternation, which sre tries at every position of the text
+    for keywords, label in categories:
+        for keyword in keywords:
+            if keyword in text:
+                return label
+    return default
+
+@functools.lru_cache(maxsize=1024)
+def _classify_assessment_method(description: str) -> str:
+    """
+    Memoized body of EducationPlanningAgent._extract_assessment_method. Assessment descriptions
+    repeat within and across plans, and str caches its own hash.
+    """
+    return _first_keyword_category(description.lower(), _ASSESSMENT_METHOD_KEYWORDS, "Multiple Methods")
+
+# Words marking a paragraph as an activity or assessment when a response has no section headers
+_FALLBACK_ACTIVITY_MARKERS = (
+    'warm-up', 'warm up', 'opening', 'introduction', 'main activity', 'instruction', 'practice',
+    'application', 'closure', 'wrap-up', 'wrap up',
+)
+_FALLBACK_ASSESSMENT_MARKERS = ('formative', 'summative', 'assessment', 'evaluation', 'quiz', 'test', 'check', 'monitor')
+# Keyword tables (in priority order) for fallback assessment types and timings
+_FALLBACK_ASSESSMENT_TYPE_KEYWORDS = (
+    (('formative',), "formative"),
+    (('summative', 'quiz', 'test'), "summative"),
+)
+_FALLBACK_TIMING_KEYWORDS = (
+    (('during', 'throughout'), "during lesson"),
+    (('end', 'after'), "end of lesson"),
+    (('beginning', 'start'), "beginning of lesson"),
+)
+
+# Material terms found in activity descriptions, and the labels each one adds to the materials list
+_MATERIAL_KEYWORDS = (
+    'paper', 'pencil', 'pen', 'marker', 'board', 'chart', 'worksheet', 'handout', 'book',
+    'textbook', 'computer', 'tablet', 'calculator', 'ruler', 'scissors', 'glue', 'manipulatives',
+    'blocks', 'cards', 'dice', 'notebook', 'whiteboard', 'projector', 'screen', 'speakers',
+)
+# Canonical labels are titled and interned once, so every plan shares one string object per label
+_MATERIAL_TERM_LABELS = {keyword: (sys.intern(keyword.title()),) for keyword in _MATERIAL_KEYWORDS}
+_MATERIAL_TERM_LABELS['manipulatives'] += (sys.intern("Math Manipulatives"),)
+_MATERIAL_TERM_LABELS.update({
+    term: (sys.intern(label),) for term, label in (
+        ('technology', "Technology/Devices"),
+        ('digital', "Technology/Devices"),
+        ('art supplies', "Art Supplies"),
+        ('science equipment', "Science Equipment"),
+        ('lab materials', "Lab Materials"),
+        ('construction materials', "Construction Materials"),
+    )
+})
+_DEFAULT_MATERIALS = (sys.intern("Standard classroom materials"),)
+
+# Labels are accumulated as bits of one int and decoded once per plan
+_MATERIAL_LABELS = tuple(sorted({label for labels in _MATERIAL_TERM_LABELS.values() for label in labels}))
+_MATERIAL_LABEL_BITS = {label: 1 << bit for bit, label in enumerate(_MATERIAL_LABELS)}
+_MATERIAL_BIT_LABELS = tuple((1 << bit, label) for bit, label in enumerate(_MATERIAL_LABELS))
+_MATERIAL_TERM_MASKS = {
+    term: sum(_MATERIAL_LABEL_BITS[label] for label in labels) for term, labels in _MATERIAL_TERM_LABELS.items()
+}
+
+def _decode_material_mask(found: int) -> List[str]:
+    """Labels whose bits are set in an accumulated mask"""
+    return [label for bit, label in _MATERIAL_BIT_LABELS if found & bit]
+
+def _build_material_scanner():
+    """Scanner returning the label mask of the material terms in a lowercase description.
+    
+    Terms match leftmost-longest without overlapping, so a longer term hides the terms inside
+    it: "whiteboard" adds Whiteboard but not Board, "pencil" adds Pencil but not Pen.
+    """
+    if AHOCORASICK_AVAILABLE:
+        automaton = ahocorasick.Automaton()
+        for term, mask in _MATERIAL_TERM_MASKS.items():
+            automaton.add_word(term, mask)
+        automaton.make_automaton()
         
-        state["retrieved_standards"] = standards
-        return state
+        def scan(text: str) -> int:
+            found = 0
+            for _, mask in automaton.iter_long(text):
+                found |= mask
+            return found
+        return scan
     
-    async def fetch_external_resources(self, state: LessonPlanState) -> LessonPlanState:
-        """Fetch additional resources from external APIs including dynamic standards"""
-        external_resources = []
+    # Longest alternatives first, so each match is the longest term starting there
+    pattern = re.compile('|'.join(map(re.escape, sorted(_MATERIAL_TERM_MASKS, key=len, reverse=True))))
+    
+    def scan(text: str) -> int:
+        found = 0
+        for match in pattern.finditer(text):
+            found |= _MATERIAL_TERM_MASKS[match.group()]
+        return found
+    return scan
+
+_scan_material_mask = _build_material_scanner()
+
+# Below this many description characters the automaton is faster than a kernel call
+_JIT_MATERIALS_MIN_CHARS = 512
+
+def _build_material_trie() -> Tuple[np.ndarray, np.ndarray]:
+    """Byte trie over the material terms for the compiled scan.
+    
+    Returns the transition table (state x byte, -1 where no term continues) and the label mask
+    of the term ending at each state. Uppercase ASCII bytes move like their lowercase letters,
+    so descriptions are scanned without lowercasing.
+    """
+    transitions = [[-1] * 256]
+    masks = [0]
+    for term, mask in _MATERIAL_TERM_MASKS.items():
+        state = 0
+        for byte in term.encode('ascii'):
+            if transitions[state][byte] < 0:
+                transitions[state][byte] = len(transitions)
+                transitions.append([-1] * 256)
+                masks.append(0)
+            state = transitions[state][byte]
+        masks[state] = mask
+    
+    transitions = np.array(transitions, dtype=np.int32)
+    upper = np.arange(ord('A'), ord('Z') + 1)
+    transitions[:, upper] = transitions[:, upper + 32]
+    return transitions, np.array(masks, dtype=np.int64)
+
+if NUMBA_AVAILABLE:
+    _MATERIAL_TRIE = _build_material_trie()
+    
+    @njit(cache=True)
+    def _material_trie_mask(buf, transitions, masks):
+        """Union of the label masks of the leftmost-longest material terms in a byte buffer"""
+        found = 0
+        start = 0
+        while start < len(buf):
+            state = 0
+            end = -1
+            mask = 0
+            pos = start
+            # Longest term starting here, if any
+            while pos < len(buf):
+                state = transitions[state, buf[pos]]
+                if state < 0:
+                    break
+                pos += 1
+                if masks[state]:
+                    end = pos
+                    mask = masks[state]
+            if end < 0:
+                start += 1
+            else:
+                found |= mask
+                start = end
+        return found
+
+# Field headers ("Duration: ...") recognized in activity and assessment sections, by lowercase name
+_ACTIVITY_FIELD_HEADERS = {
+    "duration": "duration",
+    "materials": "materials",
+    "instructions": "instructions",
+    "engagement strategy": "engagement_strategy",
+    "external resource integration": "external_resource_integration",
+    "assessment checkpoint": "assessment_checkpoint",
+}
+_ASSESSMENT_FIELD_HEADERS = {
+    "timing": "timing",
+    "instructions": "instructions",
+    "evaluation criteria": "evaluation_criteria",
+    "materials": "materials",
+    "external resource integration": "external_resource_integration",
+}
+
+def _numbered_item_text(line: str) -> Optional[str]:
+    """Text after a leading list number such as "3." or "12.", or None when the line is not numbered"""
+    if not line[:1].isdigit():
+        return None
+    dot = line.find('.')
+    if dot < 1 or not line[:dot].isdigit():
+        return None
+    return line[dot + 1:].strip()
+
+def _json_items(content: str, key: str) -> Optional[List[Any]]:
+    """Items of a JSON response ({key: [...]} or a bare list), or None when the response is not JSON"""
+    text = content.strip()
+    if text.startswith('```'):
+        # Drop a ```json fence
+        text = text.split('\n', 1)[-1].rsplit('```', 1)[0].strip()
+    if not text.startswith(('{', '[')):
+        return None
+    try:
+        data = json.loads(text)
+    except ValueError:
+        return None
+    items = data.get(key) if isinstance(data, dict) else data
+    return items if isinstance(items, list) else None
+
+def _validated_items(items: List[Any], model) -> List[BaseModel]:
+    """Items that validate against the schema; malformed entries are skipped"""
+    valid = []
+    for item in items:
         try:
-            # This will now include dynamic CCSS/NGSS standards
-            external_resources = await self.rag_service.external_api_service.fetch_all_external_resources(
-                state['subject'], state['grade_level'], state['topic']
-            )
-        except Exception as e:
-            print(f"Error fetching external resources: {e}")
-        state["external_resources"] = external_resources
-        return state
+            valid.append(model.model_validate(item))
+        except ValidationError:
+            continue
+    return valid
+
+def _to_json(value: Any) -> str:
+    """Serialize state for prompts and cache keys, with orjson when it is installed"""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(value, option=orjson.OPT_SERIALIZE_NUMPY).decode()
+    return json.dumps(value, ensure_ascii=False)
+
+def _jaccard_similarity(words1: frozenset, words2: frozenset) -> float:
+    """Word-set Jaccard similarity; the union size is derived from the intersection instead of built"""
+    if not words1 and not words2:
+        return 1.0
+    if not words1 or not words2:
+        return 0.0
     
-    async def generate_objectives(self, state: LessonPlanState) -> LessonPlanState:
-        """Generate learning objectives with external resource context"""
-        
-        # Create student group context
-        student_context = ""
-        if state["student_group_info"]:
-            student_context = f"""
-        
-STUDENT GROUP INFORMATION:
-{state["student_group_info"]}
+    intersection = len(words1 & words2)
+    return intersection / (len(words1) + len(words2) - intersection)
 
-IMPORTANT: When creating objectives, consider the specific needs mentioned above. Ensure objectives are:
-- Accessible to all learners mentioned
-- Include appropriate accommodations for ESL students, students with disabilities, etc.
-- Use clear, simple language when ESL students are present
-- Consider different ability levels and learning styles
-"""
-        
-        prompt = ChatPromptTemplate.from_template("""
+# From this many objectives (bulk generation), similarities are computed as one matrix product
+_BULK_DEDUP_MIN_SIZE = 64
+
+def _pairwise_jaccard(word_sets: List[frozenset]) -> np.ndarray:
+    """All pairwise Jaccard similarities, from a word-incidence matrix product"""
+    vocabulary = {}
+    rows, columns = [], []
+    for row, words in enumerate(word_sets):
+        for word in words:
+            rows.append(row)
+            columns.append(vocabulary.setdefault(word, len(vocabulary)))
+    incidence = np.zeros((len(word_sets), max(len(vocabulary), 1)), dtype=np.float32)
+    incidence[rows, columns] = 1.0
+    
+    # Intersection counts are small integers, exact in float32
+    intersections = (incidence @ incidence.T).astype(np.float64)
+    sizes = incidence.sum(axis=1, dtype=np.float64)
+    unions = sizes[:, None] + sizes[None, :] - intersections
+    # Two empty sets count as identical, matching _jaccard_similarity
+    return np.divide(intersections, unions, out=np.ones_like(intersections), where=unions > 0)
+
+class Activity(BaseModel):
+    """One lesson activity as returned by the model"""
+    title: str
+    duration: str = Field(description='Length of the activity, e.g. "8 minutes"')
+    materials: List[str] = Field(default_factory=list)
+    instructions: List[str] = Field(default_factory=list, description="Step-by-step instructions")
+    engagement_strategy: str = ""
+    external_resource_integration: str = ""
+    assessment_checkpoint: str = ""
+    accommodations: str = ""
+
+class Assessment(BaseModel):
+    """One assessment as returned by the model"""
+    type: str = Field(description="formative, summative or performance-based")
+    description: str = Field(description="[Type] - [Purpose]")
+    timing: str = "during lesson"
+    instructions: str = ""
+    evaluation_criteria: str = ""
+    materials: List[str] = Field(default_factory=list)
+    external_resource_integration: str = ""
+    accommodations: str = ""
+
+class LessonPlanOutput(BaseModel):
+    """Objectives, activities and assessments for one lesson"""
+    objectives: List[str] = Field(description='3-5 distinct objectives, each starting with "Students will..."')
+    activities: List[Activity]
+    assessments: List[Assessment]
+
+# Learning objectives prompt
+_OBJECTIVES_TEMPLATE = """
         Based on the following information, generate 3-5 DISTINCT, specific, measurable learning objectives:
 
         Subject: {subject}
@@ -122,46 +413,10 @@ IMPORTANT: When creating objectives, consider the specific needs mentioned above
         1. Students will describe [specific aspect]...
         2. Students will analyze [different aspect]...
         3. Students will create [another aspect]...
-        """)
-        
-        chain = prompt | self.llm
-        response = chain.invoke({
-            "subject": state["subject"],
-            "grade_level": state["grade_level"],
-            "topic": state["topic"],
-            "duration_minutes": state["duration_minutes"],
-            "teaching_style": state["teaching_style"],
-            "standards": json.dumps(state["retrieved_standards"]),
-            "external_resources": json.dumps(state["external_resources"]),
-            "student_context": student_context
-        })
-        
-        # Parse objectives from response
-        objectives = self._parse_objectives(response.content)
-        state["lesson_objectives"] = objectives
-        return state
-    
-    async def plan_activities(self, state: LessonPlanState) -> LessonPlanState:
-        """Plan engaging activities with external resource integration"""
-        
-        # Create student group context for activities
-        student_context = ""
-        if state["student_group_info"]:
-            student_context = f"""
-        
-STUDENT GROUP INFORMATION:
-{state["student_group_info"]}
+        """
 
-IMPORTANT: When creating activities, consider the specific needs mentioned above. Ensure activities:
-- Include appropriate accommodations and modifications
-- Provide multiple ways for students to engage (visual, auditory, kinesthetic)
-- Consider ESL students' language needs (visual supports, simplified language)
-- Accommodate students with disabilities (extended time, alternative formats, etc.)
-- Provide differentiation for different ability levels
-- Include collaborative opportunities when appropriate
-"""
-        
-        prompt = ChatPromptTemplate.from_template("""
+# Activity plan prompt
+_ACTIVITIES_TEMPLATE = """
         Create a comprehensive activity plan for a {duration_minutes}-minute lesson on {topic} for {grade_level} grade {subject}.
 
         Teaching Style: {teaching_style}
@@ -209,45 +464,10 @@ IMPORTANT: When creating activities, consider the specific needs mentioned above
         - Properly sequenced for learning progression
         - Inclusive and accessible
         - Accommodate the specific student group needs mentioned above
-        """)
-        
-        chain = prompt | self.llm
-        response = chain.invoke({
-            "duration_minutes": state["duration_minutes"],
-            "topic": state["topic"],
-            "grade_level": state["grade_level"],
-            "subject": state["subject"],
-            "teaching_style": state["teaching_style"],
-            "objectives": json.dumps(state["lesson_objectives"]),
-            "external_resources": json.dumps(state["external_resources"]),
-            "student_context": student_context
-        })
-        
-        activities = self._parse_activities(response.content)
-        state["activities"] = activities
-        return state
-    
-    async def design_assessments(self, state: LessonPlanState) -> LessonPlanState:
-        """Design formative and summative assessments"""
-        
-        # Create student group context for assessments
-        student_context = ""
-        if state["student_group_info"]:
-            student_context = f"""
-        
-STUDENT GROUP INFORMATION:
-{state["student_group_info"]}
+        """
 
-IMPORTANT: When creating assessments, consider the specific needs mentioned above. Ensure assessments:
-- Provide multiple ways for students to demonstrate learning
-- Include appropriate accommodations (extended time, alternative formats, etc.)
-- Consider ESL students' language needs (visual supports, simplified language)
-- Accommodate students with disabilities (assistive technology, modified expectations)
-- Provide differentiation for different ability levels
-- Include both formal and informal assessment methods
-"""
-        
-        prompt = ChatPromptTemplate.from_template("""
+# Assessment design prompt
+_ASSESSMENTS_TEMPLATE = """
         Design comprehensive assessment strategies for this lesson:
 
         Topic: {topic}
@@ -303,48 +523,522 @@ IMPORTANT: When creating assessments, consider the specific needs mentioned abov
         - Clear and measurable
         - Engaging for students
         - Accommodate the specific student group needs mentioned above
-        """)
-        
-        chain = prompt | self.llm
-        response = chain.invoke({
-            "topic": state["topic"],
-            "grade_level": state["grade_level"],
-            "subject": state["subject"],
-            "objectives": json.dumps(state["lesson_objectives"]),
-            "external_resources": json.dumps(state["external_resources"]),
+        """
+
+# Objectives, activities and assessments in one request, answered as a LessonPlanOutput
+_PLAN_BUNDLE_TEMPLATE = """
+        Plan a complete {duration_minutes}-minute lesson on {topic} for {grade_level} grade {subject}.
+
+        Teaching Style: {teaching_style}
+
+        Relevant Standards: {standards}
+
+        External Resources Available: {external_resources}
+
+        {student_context}
+
+        OBJECTIVES: Write 3-5 DISTINCT, specific, measurable learning objectives.
+        - Use varied action verbs and different cognitive levels; no two objectives may overlap
+        - Make them SMART and write each as a complete sentence starting with "Students will..."
+
+        ACTIVITIES: Create exactly 4 activities aligned with the objectives, in this order:
+        1. WARM-UP ACTIVITY (5-10 minutes)
+        2. MAIN INSTRUCTIONAL ACTIVITY (20-30 minutes)
+        3. PRACTICE/APPLICATION ACTIVITY (10-15 minutes)
+        4. CLOSURE ACTIVITY (5 minutes)
+        Each needs step-by-step instructions, materials, an engagement strategy, integration of the
+        external resources when applicable, an assessment checkpoint and accommodations.
+
+        ASSESSMENTS: Create exactly 3 assessments aligned with the objectives: one FORMATIVE (during the
+        lesson), one SUMMATIVE (end of lesson) and one PERFORMANCE-BASED. Each needs its timing,
+        implementation instructions, evaluation criteria, materials, external resource integration and
+        accommodations.
+
+        Everything must be age-appropriate for {grade_level}, engaging, inclusive and accessible.
+        """
+
+class LessonPlanBatchOutput(BaseModel):
+    """Plans for several lesson requests, in request order"""
+    plans: List[LessonPlanOutput]
+
+# Several bundle requests coalesced into one call; each request is a fully rendered bundle prompt
+_PLAN_BATCH_TEMPLATE = """
+        You will receive {count} independent lesson planning requests. Plan each lesson separately,
+        following its own instructions, and return exactly {count} plans in the same order as the requests.
+
+        {requests}
+        """
+
+# Parsed prompt templates, shared by every agent; only the LLM half of each chain is per agent
+_OBJECTIVES_PROMPT = ChatPromptTemplate.from_template(_OBJECTIVES_TEMPLATE)
+_ACTIVITIES_PROMPT = ChatPromptTemplate.from_template(_ACTIVITIES_TEMPLATE)
+_ASSESSMENTS_PROMPT = ChatPromptTemplate.from_template(_ASSESSMENTS_TEMPLATE)
+_PLAN_BUNDLE_PROMPT = ChatPromptTemplate.from_template(_PLAN_BUNDLE_TEMPLATE)
+_PLAN_BATCH_PROMPT = ChatPromptTemplate.from_template(_PLAN_BATCH_TEMPLATE)
+
+class _PlanBundleBatcher:
+    """Coalesces plan bundle requests that arrive within a short window into one LLM call
+    
+    Bound to the event loop it was created on; a lone request in a window goes through the
+    single-plan chain, and a batch that fails or comes back short is retried request by request.
+    """
+    
+    def __init__(self, bundle_prompt, bundle_chain, batch_chain, max_batch_size: int, window_seconds: float):
+        self.bundle_prompt = bundle_prompt
+        self.bundle_chain = bundle_chain
+        self.batch_chain = batch_chain
+        self.max_batch_size = max_batch_size
+        self.window_seconds = window_seconds
+        self._pending = []
+        self._flush_handle = None
+        self._flush_tasks = set()  # Strong references so running flushes are not garbage collected
+    
+    async def submit(self, inputs: Dict[str, Any]) -> LessonPlanOutput:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((inputs, future))
+        
+        if len(self._pending) >= self.max_batch_size:
+            self._flush_pending(loop)
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.window_seconds, self._flush_pending, loop)
+        return await future
+    
+    def _flush_pending(self, loop):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+        batch, self._pending, self._flush_handle = self._pending, [], None
+        if batch:
+            task = loop.create_task(self._flush(batch))
+            self._flush_tasks.add(task)
+            task.add_done_callback(self._flush_tasks.discard)
+    
+    async def _flush(self, batch):
+        if len(batch) > 1:
+            try:
+                requests = "\n\n".join(
+                    f"LESSON REQUEST {i}:\n{self.bundle_prompt.format_messages(**inputs)[0].content}"
+                    for i, (inputs, _) in enumerate(batch, 1)
+                )
+                output = await self.batch_chain.ainvoke({"count": len(batch), "requests": requests})
+                if len(output.plans) == len(batch):
+                    for (_, future), plan in zip(batch, output.plans):
+                        if not future.done():
+                            future.set_result(plan)
+                    return
+                print(f"Batched plan generation returned {len(output.plans)} plans for {len(batch)} requests")
+            except Exception as e:
+                print(f"Batched plan generation failed, retrying individually: {e}")
+        
+        results = await asyncio.gather(
+            *(self.bundle_chain.ainvoke(inputs) for inputs, _ in batch), return_exceptions=True
+        )
+        for (_, future), result in zip(batch, results):
+            if future.done():
+                continue
+            if isinstance(result, BaseException):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+# Student group guidance added to each prompt when the request describes the class
+_OBJECTIVES_STUDENT_CONTEXT = """
+        
+STUDENT GROUP INFORMATION:
+{student_group_info}
+
+IMPORTANT: When creating objectives, consider the specific needs mentioned above. Ensure objectives are:
+- Accessible to all learners mentioned
+- Include appropriate accommodations for ESL students, students with disabilities, etc.
+- Use clear, simple language when ESL students are present
+- Consider different ability levels and learning styles
+"""
+
+_ACTIVITIES_STUDENT_CONTEXT = """
+        
+STUDENT GROUP INFORMATION:
+{student_group_info}
+
+IMPORTANT: When creating activities, consider the specific needs mentioned above. Ensure activities:
+- Include appropriate accommodations and modifications
+- Provide multiple ways for students to engage (visual, auditory, kinesthetic)
+- Consider ESL students' language needs (visual supports, simplified language)
+- Accommodate students with disabilities (extended time, alternative formats, etc.)
+- Provide differentiation for different ability levels
+- Include collaborative opportunities when appropriate
+"""
+
+_ASSESSMENTS_STUDENT_CONTEXT = """
+        
+STUDENT GROUP INFORMATION:
+{student_group_info}
+
+IMPORTANT: When creating assessments, consider the specific needs mentioned above. Ensure assessments:
+- Provide multiple ways for students to demonstrate learning
+- Include appropriate accommodations (extended time, alternative formats, etc.)
+- Consider ESL students' language needs (visual supports, simplified language)
+- Accommodate students with disabilities (assistive technology, modified expectations)
+- Provide differentiation for different ability levels
+- Include both formal and informal assessment methods
+"""
+
+_PLAN_BUNDLE_STUDENT_CONTEXT = """
+        
+STUDENT GROUP INFORMATION:
+{student_group_info}
+
+IMPORTANT: Consider the specific needs mentioned above throughout the plan. Ensure objectives, activities and assessments:
+- Are accessible to all learners mentioned, using clear, simple language when ESL students are present
+- Provide multiple ways for students to engage and demonstrate learning (visual, auditory, kinesthetic)
+- Include appropriate accommodations (visual supports, extended time, alternative formats, assistive technology)
+- Provide differentiation for different ability levels
+"""
+
+def _render_student_context(template: str, student_group_info: str) -> str:
+    """Student group section for a prompt, or nothing when no group information was given"""
+    return template.format(student_group_info=student_group_info) if student_group_info else ""
+
+def _agent_node(method_name: str):
+    """Graph node that runs the named method on the agent passed in the run config"""
+    async def node(state: LessonPlanState, config: RunnableConfig) -> Dict[str, Any]:
+        return await getattr(config["configurable"]["agent"], method_name)(state)
+    
+    node.__name__ = method_name
+    return node
+
+class EducationPlanningAgent:
+    # Compiled workflows are shared by every agent, keyed by batch_generation
+    _compiled_graphs: Dict[bool, Any] = {}
+    
+    def __init__(self, rag_service, batch_generation: bool = True, model: str = "gpt-4o-mini"):
+        # gpt-4o-mini gives comparable lesson plans at much higher token throughput than gpt-4;
+        # pass model="gpt-4" to keep the original model
+        self.llm = ChatOpenAI(
+            model=model, temperature=0.7, streaming=True,
+            http_client=_LLM_HTTP_CLIENT, http_async_client=_LLM_ASYNC_HTTP_CLIENT
+        )
+        self.rag_service = rag_service
+        
+        # Generate objectives, activities and assessments in one LLM call (shared context is sent
+        # once), or as separate calls where activities and assessments build on the objectives
+        self.batch_generation = batch_generation
+        # Paragraph-level parsing for free-text responses without section headers; logged when used
+        self.use_parse_fallbacks = True
+        
+        # The prompts are fixed, so build each prompt | llm chain once instead of on every node call
+        self._objectives_chain = _OBJECTIVES_PROMPT | self.llm
+        self._activities_chain = _ACTIVITIES_PROMPT | self.llm
+        self._assessments_chain = _ASSESSMENTS_PROMPT | self.llm
+        # The bundle is returned through the LessonPlanOutput schema, so no free-text parsing is needed
+        self._plan_bundle_prompt = _PLAN_BUNDLE_PROMPT
+        self._plan_bundle_chain = _PLAN_BUNDLE_PROMPT | self.llm.with_structured_output(LessonPlanOutput)
+        self._plan_batch_chain = _PLAN_BATCH_PROMPT | self.llm.with_structured_output(LessonPlanBatchOutput)
+        self.graph = self._get_graph(batch_generation)
+        # Nodes are agent-independent functions; each run tells them which agent to call
+        self._run_config = {"configurable": {"agent": self}}
+        
+        # Concurrent plans on one event loop can share a single LLM call. Off by default, since a
+        # batched prompt trades some per-plan focus for throughput under concurrent load.
+        self.batch_config = {
+            "micro_batching": False,
+            "max_batch_size": 4,
+            "batch_window_ms": 150
+        }
+        self._plan_batchers = weakref.WeakKeyDictionary()  # Event loop -> _PlanBundleBatcher
+        
+        # Teachers often re-request the same lesson, and standards/resources repeat across lessons
+        self.cache_config = {
+            "use_plan_cache": True,
+            "plan_cache_size": 256,
+            "context_cache_size": 512,  # Retrieved standards and external resources
+            "prompt_resource_limit": 5,  # External resources included in LLM prompts
+            "rank_prompt_resources": True,  # Pick them by embedding similarity rather than API order
+            "cache_ttl": 3600  # Seconds
+        }
+        self._plan_cache = OrderedDict()
+        self._context_cache = OrderedDict()
+    
+    def _get_cached(self, cache: OrderedDict, key) -> Optional[Any]:
+        """Cached value for key, or None when missing or expired"""
+        entry = cache.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= time.monotonic():
+            del cache[key]
+            return None
+        cache.move_to_end(key)
+        return entry[1]
+    
+    def _store_cached(self, cache: OrderedDict, key, value: Any, max_size: int):
+        """Add a value to the cache, evicting the least recently used entry when full"""
+        cache[key] = (time.monotonic() + self.cache_config["cache_ttl"], value)
+        cache.move_to_end(key)
+        if len(cache) > max_size:
+            cache.popitem(last=False)
+    
+    def _plan_cache_key(self, user_input: Dict) -> str:
+        """Hash of the normalized inputs that shape a lesson plan"""
+        normalized = {
+            field: str(user_input.get(field, default)).strip().lower()
+            for field, default in (
+                ("subject", ""), ("grade_level", ""), ("topic", ""), ("teaching_style", "mixed"),
+                ("student_group_info", ""), ("duration_minutes", 45)
+            )
+        }
+        return hashlib.sha1(_to_json(normalized).encode()).hexdigest()
+    
+    def _cached_plan(self, user_input: Dict, cache_key: str) -> Optional[Dict]:
+        """Copy of a cached plan for these inputs, stamped with this request's generated_at"""
+        if not self.cache_config["use_plan_cache"]:
+            return None
+        plan = self._get_cached(self._plan_cache, cache_key)
+        if plan is None:
+            return None
+        plan = copy.deepcopy(plan)
+        plan["generated_at"] = user_input.get("generated_at", "")
+        return plan
+    
+    def _store_plan(self, cache_key: str, plan: Dict):
+        if self.cache_config["use_plan_cache"] and plan:
+            self._store_cached(self._plan_cache, cache_key, copy.deepcopy(plan), self.cache_config["plan_cache_size"])
+    
+    @classmethod
+    def _get_graph(cls, batch_generation: bool):
+        """Compiled workflow for this generation mode, built on first use"""
+        graph = cls._compiled_graphs.get(batch_generation)
+        if graph is None:
+            graph = cls._compiled_graphs[batch_generation] = cls._create_graph(batch_generation)
+        return graph
+    
+    @staticmethod
+    def _create_graph(batch_generation: bool):
+        """Create the LangGraph workflow"""
+        workflow = StateGraph(LessonPlanState)
+        
+        # Add nodes
+        workflow.add_node("retrieve_context", _agent_node("retrieve_context"))
+        workflow.add_node("compile_lesson_plan", _agent_node("compile_lesson_plan"))
+        
+        # Add edges
+        # Nodes return just the keys they set, so parallel branches never write the same key.
+        workflow.add_edge(START, "retrieve_context")
+        
+        if batch_generation:
+            workflow.add_node("generate_plan_bundle", _agent_node("generate_plan_bundle"))
+            workflow.add_edge("retrieve_context", "generate_plan_bundle")
+            workflow.add_edge("generate_plan_bundle", "compile_lesson_plan")
+        else:
+            # Activities and assessments only need the objectives, so they fan out in parallel
+            workflow.add_node("generate_objectives", _agent_node("generate_objectives"))
+            workflow.add_node("plan_activities", _agent_node("plan_activities"))
+            workflow.add_node("design_assessments", _agent_node("design_assessments"))
+            workflow.add_edge("retrieve_context", "generate_objectives")
+            workflow.add_edge("generate_objectives", "plan_activities")
+            workflow.add_edge("generate_objectives", "design_assessments")
+            workflow.add_edge(["plan_activities", "design_assessments"], "compile_lesson_plan")
+        
+        workflow.add_edge("compile_lesson_plan", END)
+        
+        return workflow.compile()
+    
+    async def retrieve_context(self, state: LessonPlanState) -> Dict[str, Any]:
+        """Retrieve standards and fetch external resources concurrently"""
+        # Independent I/O, so the node takes as long as the slower of the two
+        async with asyncio.TaskGroup() as tg:
+            standards_task = tg.create_task(self.retrieve_standards(state))
+            resources_task = tg.create_task(self.fetch_external_resources(state))
+        
+        return {**standards_task.result(), **resources_task.result()}
+    
+    async def retrieve_standards(self, state: LessonPlanState) -> Dict[str, Any]:
+        """Retrieve relevant curriculum standards"""
+        query = f"{state.topic} {state.subject} {state.grade_level}"
+        cache_key = ("standards", query, state.subject, state.grade_level)
+        update = self._get_cached(self._context_cache, cache_key)
+        if update is not None:
+            return copy.deepcopy(update)
+        
+        standards = await self.rag_service.retrieve_relevant_standards(
+            query, state.subject, state.grade_level
+        )
+        # Serialized once here; every generation prompt reuses the string
+        update = {"retrieved_standards": standards, "standards_json": _to_json(standards)}
+        # Copies go in and out of the cache, so a caller mutating the plan cannot corrupt it
+        self._store_cached(self._context_cache, cache_key, copy.deepcopy(update), self.cache_config["context_cache_size"])
+        return update
+    
+    async def fetch_external_resources(self, state: LessonPlanState) -> Dict[str, Any]:
+        """Fetch additional resources from external APIs including dynamic standards"""
+        cache_key = ("external_resources", state.subject, state.grade_level, state.topic)
+        update = self._get_cached(self._context_cache, cache_key)
+        if update is not None:
+            return copy.deepcopy(update)
+        
+        try:
+            # This will now include dynamic CCSS/NGSS standards
+            external_resources = await self.rag_service.external_api_service.fetch_all_external_resources(
+                state.subject, state.grade_level, state.topic
+            )
+        except Exception as e:
+            print(f"Error fetching external resources: {e}")
+            return {"external_resources": [], "external_resources_json": "[]"}
+        
+        # The plan lists every resource, but prompts only carry the most relevant few to keep the context short
+        prompt_resources = await self._select_prompt_resources(
+            external_resources, f"{state.topic} {state.subject}"
+        )
+        update = {
+            "external_resources": external_resources,
+            "external_resources_json": _to_json(prompt_resources)
+        }
+        # The API service returns [] when every source fails, so empty results are not cached and
+        # the next request retries the APIs
+        if external_resources:
+            self._store_cached(
+                self._context_cache, cache_key, copy.deepcopy(update), self.cache_config["context_cache_size"]
+            )
+        return update
+    
+    async def _select_prompt_resources(self, resources: List[Dict], query: str) -> List[Dict]:
+        """Top resources for the prompt, ranked by cosine similarity of title and description to the query"""
+        limit = self.cache_config["prompt_resource_limit"]
+        embeddings = getattr(self.rag_service, "embeddings", None)
+        if len(resources) <= limit or not self.cache_config["rank_prompt_resources"] or embeddings is None:
+            return resources[:limit]
+        
+        texts = [f"{resource.get('title', '')} {resource.get('description', '')}" for resource in resources]
+        try:
+            # Query and resources go in one embedding request
+            vectors = np.asarray(await embeddings.aembed_documents([query] + texts), dtype=np.float32)
+        except Exception as e:
+            print(f"Error ranking external resources: {e}")
+            return resources[:limit]
+        
+        vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        similarities = vectors[1:] @ vectors[0]
+        top = np.argsort(-similarities, kind="stable")[:limit]
+        return [resources[i] for i in top]
+    
+    async def generate_objectives(self, state: LessonPlanState) -> Dict[str, Any]:
+        """Generate learning objectives with external resource context"""
+        
+        student_context = _render_student_context(_OBJECTIVES_STUDENT_CONTEXT, state.student_group_info)
+        
+        response = await self._objectives_chain.ainvoke({
+            "subject": state.subject,
+            "grade_level": state.grade_level,
+            "topic": state.topic,
+            "duration_minutes": state.duration_minutes,
+            "teaching_style": state.teaching_style,
+            "standards": state.standards_json,
+            "external_resources": state.external_resources_json,
+            "student_context": student_context
+        })
+        
+        # Parse objectives from response
+        objectives = self._parse_objectives(response.content)
+        return {"lesson_objectives": objectives}
+    
+    async def plan_activities(self, state: LessonPlanState) -> Dict[str, Any]:
+        """Plan engaging activities with external resource integration"""
+        
+        student_context = _render_student_context(_ACTIVITIES_STUDENT_CONTEXT, state.student_group_info)
+        
+        response = await self._activities_chain.ainvoke({
+            "duration_minutes": state.duration_minutes,
+            "topic": state.topic,
+            "grade_level": state.grade_level,
+            "subject": state.subject,
+            "teaching_style": state.teaching_style,
+            "objectives": _to_json(state.lesson_objectives),
+            "external_resources": state.external_resources_json,
+            "student_context": student_context
+        })
+        
+        activities = self._parse_activities(response.content)
+        return {"activities": activities}
+    
+    async def design_assessments(self, state: LessonPlanState) -> Dict[str, Any]:
+        """Design formative and summative assessments"""
+        
+        student_context = _render_student_context(_ASSESSMENTS_STUDENT_CONTEXT, state.student_group_info)
+        
+        response = await self._assessments_chain.ainvoke({
+            "topic": state.topic,
+            "grade_level": state.grade_level,
+            "subject": state.subject,
+            "objectives": _to_json(state.lesson_objectives),
+            "external_resources": state.external_resources_json,
             "student_context": student_context
         })
         
         assessments = self._parse_assessments(response.content)
-        state["assessments"] = assessments
-        return state
+        return {"assessments": assessments}
     
+    async def generate_plan_bundle(self, state: LessonPlanState) -> Dict[str, Any]:
+        """Generate objectives, activities and assessments together in a single LLM call"""
+        
+        student_context = _render_student_context(_PLAN_BUNDLE_STUDENT_CONTEXT, state.student_group_info)
+        
+        inputs = {
+            "duration_minutes": state.duration_minutes,
+            "topic": state.topic,
+            "grade_level": state.grade_level,
+            "subject": state.subject,
+            "teaching_style": state.teaching_style,
+            "standards": state.standards_json,
+            "external_resources": state.external_resources_json,
+            "student_context": student_context
+        }
+        if self.batch_config["micro_batching"]:
+            plan = await self._get_plan_batcher().submit(inputs)
+        else:
+            plan = await self._plan_bundle_chain.ainvoke(inputs)
+        
+        return {
+            "lesson_objectives": [objective.strip() for objective in plan.objectives if objective.strip()][:5],
+            "activities": [self._normalize_activity(activity, i) for i, activity in enumerate(plan.activities, 1)],
+            "assessments": [
+                self._normalize_assessment(assessment) for assessment in plan.assessments if assessment.description
+            ]
+        }
+    
+    def _get_plan_batcher(self) -> _PlanBundleBatcher:
+        """Batcher for the running event loop, created on first use"""
+        loop = asyncio.get_running_loop()
+        batcher = self._plan_batchers.get(loop)
+        if batcher is None:
+            batcher = _PlanBundleBatcher(
+                self._plan_bundle_prompt, self._plan_bundle_chain, self._plan_batch_chain,
+                self.batch_config["max_batch_size"], self.batch_config["batch_window_ms"] / 1000
+            )
+            self._plan_batchers[loop] = batcher
+        return batcher
     
-    async def compile_lesson_plan(self, state: LessonPlanState) -> LessonPlanState:
+    async def compile_lesson_plan(self, state: LessonPlanState) -> Dict[str, Any]:
         """Compile final lesson plan with external resources"""
         lesson_plan = {
-            "title": f"{state['topic']} - {state['grade_level']} Grade {state['subject']}",
-            "subject": state["subject"],
-            "grade_level": state["grade_level"],
-            "duration_minutes": state["duration_minutes"],
-            "topic": state["topic"],
-            "teaching_style": state["teaching_style"],
-            "objectives": state["lesson_objectives"],
-            "activities": state["activities"],
-            "assessments": state["assessments"],
-            "materials": self._extract_materials(state["activities"]),
-            "standards_aligned": state["retrieved_standards"],
-            "external_resources": state["external_resources"],
-            "generated_at": state.get("generated_at", ""),
-            "api_sources": self._extract_api_sources(state["external_resources"])
+            "title": f"{state.topic} - {state.grade_level} Grade {state.subject}",
+            "subject": state.subject,
+            "grade_level": state.grade_level,
+            "duration_minutes": state.duration_minutes,
+            "topic": state.topic,
+            "teaching_style": state.teaching_style,
+            "objectives": state.lesson_objectives,
+            "activities": state.activities,
+            "assessments": state.assessments,
+            "materials": self._extract_materials(state.activities),
+            "standards_aligned": state.retrieved_standards,
+            "external_resources": state.external_resources,
+            "generated_at": state.generated_at,
+            "api_sources": self._extract_api_sources(state.external_resources)
         }
         
-        state["final_lesson_plan"] = lesson_plan
-        return state
+        return {"final_lesson_plan": lesson_plan}
     
-    async def generate_lesson_plan(self, user_input: Dict) -> Dict:
-        """Main method to generate lesson plan with external API integration"""
-        initial_state = LessonPlanState(
+    def _initial_state(self, user_input: Dict) -> LessonPlanState:
+        """Build the starting graph state from the request payload"""
+        return LessonPlanState(
             user_input=user_input.get("topic", ""),
             subject=user_input.get("subject", ""),
             grade_level=user_input.get("grade_level", ""),
@@ -352,44 +1046,106 @@ IMPORTANT: When creating assessments, consider the specific needs mentioned abov
             duration_minutes=user_input.get("duration_minutes", 45),
             teaching_style=user_input.get("teaching_style", "mixed"),
             student_group_info=user_input.get("student_group_info", ""),
-            retrieved_standards=[],
-            external_resources=[],
-            lesson_objectives=[],
-            activities=[],
-            assessments=[],
-            materials=[],
-            final_lesson_plan={},
             generated_at=user_input.get("generated_at", "")
         )
+    
+    async def generate_lesson_plan(self, user_input: Dict) -> Dict:
+        """Main method to generate lesson plan with external API integration"""
+        cache_key = self._plan_cache_key(user_input)
+        cached_plan = self._cached_plan(user_input, cache_key)
+        if cached_plan is not None:
+            return cached_plan
         
-        result = await self.graph.ainvoke(initial_state)
+        result = await self.graph.ainvoke(self._initial_state(user_input), self._run_config)
+        self._store_plan(cache_key, result["final_lesson_plan"])
         return result["final_lesson_plan"]
     
+    async def stream_lesson_plan(self, user_input: Dict) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        """Generate a lesson plan, yielding (node, state update) as each graph node finishes
+        
+        Lets callers render standards, resources and generated sections before the plan is
+        compiled; the last update comes from compile_lesson_plan and holds final_lesson_plan.
+        """
+        cache_key = self._plan_cache_key(user_input)
+        cached_plan = self._cached_plan(user_input, cache_key)
+        if cached_plan is not None:
+            yield "compile_lesson_plan", {"final_lesson_plan": cached_plan}
+            return
+        
+        async for chunk in self.graph.astream(
+            self._initial_state(user_input), self._run_config, stream_mode="updates"
+        ):
+            for node, update in chunk.items():
+                if node == "compile_lesson_plan" and update:
+                    self._store_plan(cache_key, update["final_lesson_plan"])
+                yield node, update or {}
+    
+    async def aclose(self):
+        """Close the running event loop's LLM connection pool, shared by every agent (call on shutdown)"""
+        await _LLM_ASYNC_TRANSPORT.aclose()
+    
     def _extract_api_sources(self, external_resources: List[Dict]) -> List[str]:
         """Extract unique API sources used"""
-        sources = set()
-        for resource in external_resources:
-            sources.add(resource.get("source", "Unknown"))
-        return list(sources)
+        return list({resource.get("source", "Unknown") for resource in external_resources})
+    
+    def _normalize_activity(self, activity: Activity, activity_num: int) -> Dict:
+        """Shape a structured activity like the ones _parse_single_activity produces"""
+        instructions = [step.strip() for step in activity.instructions if step.strip()]
+        title = activity.title or f"Activity {activity_num}"
+        return {
+            "title": title,
+            "description": ' '.join(instructions),
+            "duration": activity.duration or "10-15 minutes",
+            "materials": [material.strip() for material in activity.materials if material.strip()],
+            "instructions": instructions,
+            "engagement_strategy": activity.engagement_strategy,
+            "external_resource_integration": activity.external_resource_integration,
+            "assessment_checkpoint": activity.assessment_checkpoint,
+            "type": self._classify_activity_type(f"{title} {' '.join(instructions)}")
+        }
+    
+    def _normalize_assessment(self, assessment: Assessment) -> Dict:
+        """Shape a structured assessment like the ones _parse_single_assessment produces"""
+        assessment_type = assessment.type.lower()
+        return {
+            "type": next(
+                (known for known in ("formative", "summative", "differentiated") if known in assessment_type),
+                "formative"
+            ),
+            "description": assessment.description,
+            "timing": assessment.timing or "during lesson",
+            "method": self._extract_assessment_method(assessment.description),
+            "instructions": assessment.instructions,
+            "evaluation_criteria": assessment.evaluation_criteria,
+            "materials": [material.strip() for material in assessment.materials if material.strip()],
+            "external_resource_integration": assessment.external_resource_integration
+        }
     
     def _parse_objectives(self, content: str) -> List[str]:
         """Parse objectives from LLM response with deduplication"""
+        # JSON responses need no line scanning
+        items = _json_items(content, "objectives")
+        if items is not None:
+            objectives = list(dict.fromkeys(str(item).strip() for item in items if str(item).strip()))
+            return self._deduplicate_objectives(objectives)[:5]
+        
         objectives = []
-        lines = content.split('\n')
         
-        for line in lines:
+        for line in content.splitlines():
             line = line.strip()
             cleaned_line = None
             
             # Handle numbered objectives (1., 2., 3., etc.)
-            if line.startswith(('1.', '2.', '3.', '4.', '5.')):
-                cleaned_line = line[2:].strip()
+            if (numbered := _numbered_item_text(line)) is not None:
+                cleaned_line = numbered
             # Handle bullet points
             elif line.startswith(('-', '•')):
                 cleaned_line = line[1:].strip()
             # Handle lines that contain objective keywords
-            elif 'objective' in line.lower() or 'students will' in line.lower():
-                cleaned_line = line.strip()
+            else:
+                line_lower = line.lower()
+                if 'objective' in line_lower or 'students will' in line_lower:
+                    cleaned_line = line
             
             # Only add if we have a valid cleaned line and it's substantial
             if cleaned_line and len(cleaned_line) > 15:
@@ -401,7 +1157,8 @@ IMPORTANT: When creating assessments, consider the specific needs mentioned abov
         if not objectives:
             paragraphs = content.split('\n\n')
             for para in paragraphs:
-                if 'students will' in para.lower() or 'objective' in para.lower():
+                para_lower = para.lower()
+                if 'students will' in para_lower or 'objective' in para_lower:
                     para = para.strip()
                     if para not in objectives and len(para) > 15:
                         objectives.append(para)
@@ -416,47 +1173,47 @@ IMPORTANT: When creating assessments, consider the specific needs mentioned abov
         if len(objectives) <= 1:
             return objectives
         
+        if len(objectives) >= _BULK_DEDUP_MIN_SIZE:
+            similarities = _pairwise_jaccard([frozenset(obj.lower().split()) for obj in objectives])
+            kept = []
+            for i in range(len(objectives)):
+                if not kept or not (similarities[i, kept] > 0.8).any():
+                    kept.append(i)
+            return [objectives[i] for i in kept]
+        
+        # Tokenize each objective once rather than once per comparison
         unique_objectives = []
+        unique_word_sets = []
         
         for obj in objectives:
-            is_duplicate = False
+            words = frozenset(obj.lower().split())
             
-            # Check against existing unique objectives
-            for unique_obj in unique_objectives:
-                # Calculate similarity (simple word overlap check)
-                similarity = self._calculate_similarity(obj.lower(), unique_obj.lower())
-                
-                # If similarity is too high, consider it a duplicate
-                if similarity > 0.8:  # 80% similarity threshold
-                    is_duplicate = True
-                    break
+            # If similarity to any kept objective is too high (80% threshold), consider it a duplicate
+            if any(_jaccard_similarity(words, unique_words) > 0.8 for unique_words in unique_word_sets):
+                continue
             
-            if not is_duplicate:
-                unique_objectives.append(obj)
+            unique_objectives.append(obj)
+            unique_word_sets.append(words)
         
         return unique_objectives
 
     def _calculate_similarity(self, text1: str, text2: str) -> float:
         """Calculate simple word-based similarity between two texts"""
-        words1 = set(text1.split())
-        words2 = set(text2.split())
-        
-        if not words1 and not words2:
-            return 1.0
-        if not words1 or not words2:
-            return 0.0
-        
-        intersection = words1.intersection(words2)
-        union = words1.union(words2)
-        
-        return len(intersection) / len(union)
+        return _jaccard_similarity(frozenset(text1.split()), frozenset(text2.split()))
 
     def _parse_activities(self, content: str) -> List[Dict]:
         """Parse activities from LLM response with improved formatting"""
+        items = _json_items(content, "activities")
+        if items is not None:
+            return [
+                self._normalize_activity(activity, i)
+                for i, activity in enumerate(_validated_items(items, Activity), 1)
+            ]
+        
         activities = []
         
         # Split content into activity sections
-        activity_sections = re.split(r'ACTIVITY \d+:', content, flags=re.IGNORECASE)
+        activity_sections = _ACTIVITY_HEADER_RE.split(content)
         
         for i, section in enumerate(activity_sections[1:], 1):  # Skip first empty section
             activity = self._parse_single_activity(section, i)
@@ -464,14 +1221,14 @@ IMPORTANT: When creating assessments, consider the specific needs mentioned abov
                 activities.append(activity)
         
         # Fallback to old parsing if new method fails
-        if not activities:
+        if not activities and self.use_parse_fallbacks:
+            print("⚠️ No ACTIVITY sections found, falling back to paragraph parsing")
             activities = self._parse_activities_fallback(content)
         
         return activities
 
     def _parse_single_activity(self, section: str, activity_num: int) -> Dict:
         """Parse a single activity section"""
-        lines = section.strip().split('\n')
         activity = {
             "title": f"Activity {activity_num}",
             "description": "",
@@ -481,39 +1238,36 @@ IMPORTANT: When creating assessments, consider the specific needs mentioned abov
             "engagement_strategy": "",
             "external_resource_integration": "",
             "assessment_checkpoint": "",
-            "type": self._classify_activity_type(section.lower())
+            "type": self._classify_activity_type(section)
         }
         
         current_field = None
         
-        for line in lines:
+        for line in section.splitlines():
             line = line.strip()
             if not line:
                 continue
             
-            # Identify field headers
-            if line.lower().startswith('duration:'):
-                activity["duration"] = line.split(':', 1)[1].strip()
-            elif line.lower().startswith('materials:'):
+            # Identify field headers: only the text before the first colon is lowercased and looked up
+            header, has_colon, value = line.partition(':')
+            field = _ACTIVITY_FIELD_HEADERS.get(header.lower()) if has_colon else None
+            
+            if field == 'duration':
+                activity["duration"] = value.strip()
+            elif field == 'materials':
                 current_field = 'materials'
-                materials_text = line.split(':', 1)[1].strip()
+                materials_text = value.strip()
                 if materials_text:
                     activity["materials"] = [m.strip() for m in materials_text.split(',')]
-            elif line.lower().startswith('instructions:'):
+            elif field == 'instructions':
                 current_field = 'instructions'
-            elif line.lower().startswith('engagement strategy:'):
-                current_field = 'engagement_strategy'
-                activity["engagement_strategy"] = line.split(':', 1)[1].strip()
-            elif line.lower().startswith('external resource integration:'):
-                current_field = 'external_resource_integration'
-                activity["external_resource_integration"] = line.split(':', 1)[1].strip()
-            elif line.lower().startswith('assessment checkpoint:'):
-                current_field = 'assessment_checkpoint'
-                activity["assessment_checkpoint"] = line.split(':', 1)[1].strip()
-            elif line.startswith(('1.', '2.', '3.', '4.', '5.')):
+            elif field:
+                current_field = field
+                activity[field] = value.strip()
+            elif (step := _numbered_item_text(line)) is not None:
                 # Instruction steps
                 if current_field == 'instructions':
-                    activity["instructions"].append(line[2:].strip())
+                    activity["instructions"].append(step)
             elif current_field == 'instructions' and line:
                 activity["instructions"].append(line)
             elif not activity["title"] or activity["title"] == f"Activity {activity_num}":
@@ -531,15 +1285,11 @@ IMPORTANT: When creating assessments, consider the specific needs mentioned abov
         activities = []
         sections = content.split('\n\n')
         
-        activity_types = ['warm-up', 'warm up', 'opening', 'introduction', 
-                        'main activity', 'instruction', 'practice', 
-                        'application', 'closure', 'wrap-up', 'wrap up']
-        
         for section in sections:
             section_lower = section.lower()
             
-            if any(activity_type in section_lower for activity_type in activity_types):
-                lines = section.split('\n')
+            if any(activity_type in section_lower for activity_type in _FALLBACK_ACTIVITY_MARKERS):
+                lines = section.splitlines()
                 title = ""
                 description = ""
                 duration = ""
@@ -550,11 +1300,12 @@ IMPORTANT: When creating assessments, consider the specific needs mentioned abov
                     if not line:
                         continue
                         
+                    line_lower = line.lower()
                     if not title and len(line) > 5:
                         title = line
-                    elif 'minute' in line.lower() or 'duration' in line.lower():
+                    elif 'minute' in line_lower or 'duration' in line_lower:
                         duration = line
-                    elif 'material' in line.lower() or 'supplies' in line.lower():
+                    elif 'material' in line_lower or 'supplies' in line_lower:
                         materials.append(line)
                     else:
                         if line and line not in [title, duration]:
@@ -566,32 +1317,28 @@ IMPORTANT: When creating assessments, consider the specific needs mentioned abov
                         "description": description.strip(),
                         "duration": duration or "10-15 minutes",
                         "materials": materials,
-                        "type": self._classify_activity_type(title.lower() + " " + description.lower())
+                        "type": self._classify_activity_type(f"{title} {description}")
                     })
         
         return activities
 
     def _classify_activity_type(self, text: str) -> str:
         """Classify activity type based on content"""
-        text_lower = text.lower()
-        
-        if any(word in text_lower for word in ['warm-up', 'warm up', 'opening', 'introduction']):
-            return "Warm-up"
-        elif any(word in text_lower for word in ['main', 'instruction', 'teaching', 'lesson']):
-            return "Main Activity"
-        elif any(word in text_lower for word in ['practice', 'exercise', 'worksheet']):
-            return "Practice"
-        elif any(word in text_lower for word in ['closure', 'wrap-up', 'wrap up', 'conclusion']):
-            return "Closure"
-        else:
-            return "Activity"
+        return _first_keyword_category(text.lower(), _ACTIVITY_TYPE_KEYWORDS, "Activity")
 
     def _parse_assessments(self, content: str) -> List[Dict]:
         """Parse assessments from LLM response with improved formatting"""
+        items = _json_items(content, "assessments")
+        if items is not None:
+            return [
+                self._normalize_assessment(assessment)
+                for assessment in _validated_items(items, Assessment) if assessment.description
+            ]
+        
         assessments = []
         
         # Split content into assessment sections
-        assessment_sections = re.split(r'ASSESSMENT \d+:', content, flags=re.IGNORECASE)
+        assessment_sections = _ASSESSMENT_HEADER_RE.split(content)
         
         for i, section in enumerate(assessment_sections[1:], 1):  # Skip first empty section
             assessment = self._parse_single_assessment(section, i)
@@ -599,14 +1346,14 @@ IMPORTANT: When creating assessments, consider the specific needs mentioned abov
                 assessments.append(assessment)
         
         # Fallback to old parsing if new method fails
-        if not assessments:
+        if not assessments and self.use_parse_fallbacks:
+            print("⚠️ No ASSESSMENT sections found, falling back to paragraph parsing")
             assessments = self._parse_assessments_fallback(content)
         
         return assessments
 
     def _parse_single_assessment(self, section: str, assessment_num: int) -> Dict:
         """Parse a single assessment section"""
-        lines = section.strip().split('\n')
         assessment = {
             "type": "formative",
             "description": "",
@@ -620,28 +1367,25 @@ IMPORTANT: When creating assessments, consider the specific needs mentioned abov
         
         current_field = None
         
-        for line in lines:
+        for line in section.splitlines():
             line = line.strip()
             if not line:
                 continue
             
-            # Identify field headers
-            if line.lower().startswith('timing:'):
-                assessment["timing"] = line.split(':', 1)[1].strip()
-            elif line.lower().startswith('instructions:'):
-                current_field = 'instructions'
-                assessment["instructions"] = line.split(':', 1)[1].strip()
-            elif line.lower().startswith('evaluation criteria:'):
-                current_field = 'evaluation_criteria'
-                assessment["evaluation_criteria"] = line.split(':', 1)[1].strip()
-            elif line.lower().startswith('materials:'):
+            # Identify field headers: only the text before the first colon is lowercased and looked up
+            header, has_colon, value = line.partition(':')
+            field = _ASSESSMENT_FIELD_HEADERS.get(header.lower()) if has_colon else None
+            
+            if field == 'timing':
+                assessment["timing"] = value.strip()
+            elif field == 'materials':
                 current_field = 'materials'
-                materials_text = line.split(':', 1)[1].strip()
+                materials_text = value.strip()
                 if materials_text:
                     assessment["materials"] = [m.strip() for m in materials_text.split(',')]
-            elif line.lower().startswith('external resource integration:'):
-                current_field = 'external_resource_integration'
-                assessment["external_resource_integration"] = line.split(':', 1)[1].strip()
+            elif field:
+                current_field = field
+                assessment[field] = value.strip()
             elif current_field == 'instructions' and line:
                 assessment["instructions"] += " " + line
             elif current_field == 'evaluation_criteria' and line:
@@ -669,34 +1413,20 @@ IMPORTANT: When creating assessments, consider the specific needs mentioned abov
         assessments = []
         sections = content.split('\n\n')
         
-        assessment_types = ['formative', 'summative', 'assessment', 'evaluation', 
-                        'quiz', 'test', 'check', 'monitor']
-        
         for section in sections:
             section_lower = section.lower()
             
-            if any(assessment_type in section_lower for assessment_type in assessment_types):
-                lines = section.split('\n')
-                assessment_type = "formative"  # default
+            if any(assessment_type in section_lower for assessment_type in _FALLBACK_ASSESSMENT_MARKERS):
+                lines = section.splitlines()
                 description = ""
                 timing = ""
                 
                 # Determine assessment type
-                if 'formative' in section_lower:
-                    assessment_type = "formative"
-                elif 'summative' in section_lower:
-                    assessment_type = "summative"
-                elif 'quiz' in section_lower or 'test' in section_lower:
-                    assessment_type = "summative"
+                assessment_type = _first_keyword_category(section_lower, _FALLBACK_ASSESSMENT_TYPE_KEYWORDS, "formative")
                 
-                # Extract timing information
+                # Extract timing information; the last line that mentions one wins
                 for line in lines:
-                    if 'during' in line.lower() or 'throughout' in line.lower():
-                        timing = "during lesson"
-                    elif 'end' in line.lower() or 'after' in line.lower():
-                        timing = "end of lesson"
-                    elif 'beginning' in line.lower() or 'start' in line.lower():
-                        timing = "beginning of lesson"
+                    timing = _first_keyword_category(line.lower(), _FALLBACK_TIMING_KEYWORDS, timing)
                 
                 # Combine all lines for description
                 description = ' '.join([line.strip() for line in lines if line.strip()])
@@ -713,58 +1443,33 @@ IMPORTANT: When creating assessments, consider the specific needs mentioned abov
 
     def _extract_assessment_method(self, description: str) -> str:
         """Extract assessment method from description"""
-        desc_lower = description.lower()
-        
-        if any(word in desc_lower for word in ['observation', 'observe', 'watch']):
-            return "Observation"
-        elif any(word in desc_lower for word in ['discussion', 'discuss', 'talk']):
-            return "Discussion"
-        elif any(word in desc_lower for word in ['question', 'ask', 'quiz']):
-            return "Questioning"
-        elif any(word in desc_lower for word in ['work', 'product', 'artifact']):
-            return "Student Work"
-        elif any(word in desc_lower for word in ['peer', 'partner', 'group']):
-            return "Peer Assessment"
-        else:
-            return "Multiple Methods"
+        return _classify_assessment_method(description)
 
 
-    def _extract_materials(self, activities: List[Dict]) -> List[str]:
+    def _extract_materials(self, activities: List[Dict]) -> Tuple[str, ...]:
         """Extract materials list from activities with improved categorization"""
-        materials = set()
+        if not activities:
+            return _DEFAULT_MATERIALS
         
-        for activity in activities:
-            # Extract materials from activity description
-            description = activity.get("description", "").lower()
-            activity_materials = activity.get("materials", [])
-            
-            # Add explicit materials
-            for material in activity_materials:
-                materials.add(material)
-            
-            # Extract materials from description using common patterns
-            material_keywords = ['paper', 'pencil', 'pen', 'marker', 'board', 'chart', 
-                            'worksheet', 'handout', 'book', 'textbook', 'computer', 
-                            'tablet', 'calculator', 'ruler', 'scissors', 'glue',
-                            'manipulatives', 'blocks', 'cards', 'dice', 'notebook',
-                            'whiteboard', 'projector', 'screen', 'speakers']
-            
-            for keyword in material_keywords:
-                if keyword in description:
-                    materials.add(keyword.title())
-            
-            # Look for specific material mentions
-            if 'manipulatives' in description:
-                materials.add("Math Manipulatives")
-            if 'technology' in description or 'digital' in description:
-                materials.add("Technology/Devices")
-            if 'art supplies' in description:
-                materials.add("Art Supplies")
-            if 'science equipment' in description:
-                materials.add("Science Equipment")
-            if 'lab materials' in description:
-                materials.add("Lab Materials")
-            if 'construction materials' in description:
-                materials.add("Construction Materials")
-        
-        return list(materials) if materials else ["Standard classroom materials"]
\ No newline at end of file
+        # Descriptions and explicit materials as parallel columns, each built by one comprehension
+        descriptions = [activity.get("description", "") for activity in activities]
+        materials = set(itertools.chain.from_iterable(activity.get("materials", []) for activity in activities))
+        
+        # All descriptions are scanned as one '\x1f'-separated corpus; no term contains the
+        # separator, so no match spans two activities. Empty descriptions are left out.
+        corpus = "\x1f".join(filter(None, descriptions))
+        if not corpus:
+            found = 0
+        elif NUMBA_AVAILABLE and len(corpus) >= _JIT_MATERIALS_MIN_CHARS and '\u212a' not in corpus:
+            # Large batches: one compiled trie scan over the UTF-8 bytes, which folds case itself.
+            # Multi-byte characters (curly quotes, dashes) never occur in a term and end any match
+            # in progress; the Kelvin sign is the one non-ASCII character lower() turns into an ASCII letter.
+            found = int(_material_trie_mask(np.frombuffer(corpus.encode('utf-8'), dtype=np.uint8), *_MATERIAL_TRIE))
+        else:
+            # Keywords and material phrases in one scan; the automaton matches lowercase terms,
+            # so the corpus is only copied when it has capitals
+            found = _scan_material_mask(corpus if corpus.islower() else corpus.lower())
+        materials.update(_decode_material_mask(found))
+        
+        # Sorted so identical inputs give identical plans (and cache entries)
+        return tuple(sorted(materials)) if materials else _DEFAULT_MATERIALS
\ No newline at end of file
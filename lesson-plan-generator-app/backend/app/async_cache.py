@@ -0,0 +1,38 @@
+# app/async_cache.py
+import copy
+import functools
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Optional
+
+def ttl_cache(maxsize: int = 512, ttl: float = 3600, should_cache: Optional[Callable[[Any], bool]] = bool):
+    """
+    LRU + TTL cache for async functions, keyed by the function and its arguments.
+
+    Results are stored and returned as deep copies, so callers can mutate what they get without
+    corrupting the cache. By default only truthy results are cached, so an empty result from a
+    failed request is retried on the next call rather than served until it expires.
+    """
+    def decorator(func):
+        cache = OrderedDict()  # key -> (expires_at, value)
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            key = (args, tuple(sorted(kwargs.items())))
+            entry = cache.get(key)
+            if entry is not None:
+                if entry[0] > time.monotonic():
+                    cache.move_to_end(key)
+                    return copy.deepcopy(entry[1])
+                del cache[key]
+
+            result = await func(*args, **kwargs)
+            if should_cache is None or should_cache(result):
+                cache[key] = (time.monotonic() + ttl, copy.deepcopy(result))
+                if len(cache) > maxsize:
+                    cache.popitem(last=False)
+            return result
+
+        wrapper.cache_clear = cache.clear
+        return wrapper
+    return decorator
@@ -4,9 +4,172 @@ import asyncio
 import aiohttp
 import json
 import os
+import re
+import sys
 from typing import List, Dict, Optional
 from datetime import datetime, timedelta
+from types import MappingProxyType
 import time
+import weakref
+from urllib.parse import quote
+
+from yarl import URL
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+from .async_cache import ttl_cache
+
+# API response bodies are decoded with orjson when it is installed
+_json_loads = orjson.loads if ORJSON_AVAILABLE else json.loads
+
+# Wikipedia REST summary (title appended as a path segment) and Action API endpoints
+_WIKIPEDIA_SUMMARY_URL = "https://en.wikipedia.org/api/rest_v1/page/summary/"
+_WIKIPEDIA_QUERY_URL = URL("https://en.wikipedia.org/w/api.php")
+# Per-endpoint limit, kept under _SOURCE_TIMEOUT so the mock fallback is still returned when every
+# endpoint stalls
+_WIKIPEDIA_ENDPOINT_TIMEOUT = aiohttp.ClientTimeout(total=4)
+
+# Article links use the title as one percent-encoded path segment, spaces as underscores
+_WIKIPEDIA_ARTICLE_URL = "https://en.wikipedia.org/wiki/"
+
+def _wikipedia_article_url(topic: str) -> str:
+    """Link to the Wikipedia article titled topic"""
+    return _WIKIPEDIA_ARTICLE_URL + quote(topic.replace(' ', '_'), safe='')
+
+# First number in a grade label such as '6th Grade' or 'Grade 6'
+_GRADE_DIGITS_RE = re.compile(r'\d+')
+
+# Seconds each source gets in fetch_all_external_resources before its results are dropped
+_SOURCE_TIMEOUT = 5
+
+# Ed-Fi grade level descriptors by grade label; read-only and shared by every lookup
+_EDFI_GRADE_DESCRIPTORS = MappingProxyType({
+    sys.intern(grade): sys.intern(descriptor) for grade, descriptor in {
+        "Kindergarten": "uri://ed-fi.org/GradeLevelDescriptor#Kindergarten",
+        "1st Grade": "uri://ed-fi.org/GradeLevelDescriptor#First grade",
+        "2nd Grade": "uri://ed-fi.org/GradeLevelDescriptor#Second grade",
+        "3rd Grade": "uri://ed-fi.org/GradeLevelDescriptor#Third grade",
+        "4th Grade": "uri://ed-fi.org/GradeLevelDescriptor#Fourth grade",
+        "5th Grade": "uri://ed-fi.org/GradeLevelDescriptor#Fifth grade",
+        "6th Grade": "uri://ed-fi.org/GradeLevelDescriptor#Sixth grade",
+        "7th Grade": "uri://ed-fi.org/GradeLevelDescriptor#Seventh grade",
+        "8th Grade": "uri://ed-fi.org/GradeLevelDescriptor#Eighth grade"
+    }.items()
+})
+_EDFI_DEFAULT_GRADE_DESCRIPTOR = _EDFI_GRADE_DESCRIPTORS["6th Grade"]
+
+# Static standards templates, built once at import and read-only so no request can alter them for
+# the next; each request overlays subject, grade level and fetch time onto copies
+
+# Type and source labels shared by every standard; interned so all dicts (and copies) hold one object
+_TYPE_CCSS = sys.intern("Common Core Standard")
+_SOURCE_CCSS = sys.intern("Common Core")
+_TYPE_NGSS = sys.intern("NGSS Standard")
+_SOURCE_NGSS = sys.intern("NGSS")
+
+# Common Core math standards for grade 6 and up
+_CCSS_MATH_STANDARDS = (
+    MappingProxyType({
+        "title": "CCSS.MATH.CONTENT.6.NS.A.1",
+        "description": "Interpret and compute quotients of fractions, and solve word problems involving division of fractions by fractions.",
+        "resource_url": "https://www.corestandards.org/Math/Content/6/NS/A/1/",
+        "type": _TYPE_CCSS,
+        "source": _SOURCE_CCSS,
+        "domain": "Number and Operations—Fractions"
+    }),
+    MappingProxyType({
+        "title": "CCSS.MATH.CONTENT.6.NS.B.2",
+        "description": "Fluently divide multi-digit numbers using the standard algorithm.",
+        "resource_url": "https://www.corestandards.org/Math/Content/6/NS/B/2/",
+        "type": _TYPE_CCSS,
+        "source": _SOURCE_CCSS,
+        "domain": "Number and Operations in Base Ten"
+    }),
+    MappingProxyType({
+        "title": "CCSS.MATH.CONTENT.6.RP.A.1",
+        "description": "Understand the concept of a ratio and use ratio language to describe a ratio relationship between two quantities.",
+        "resource_url": "https://www.corestandards.org/Math/Content/6/RP/A/1/",
+        "type": _TYPE_CCSS,
+        "source": _SOURCE_CCSS,
+        "domain": "Ratios and Proportional Relationships"
+    }),
+    MappingProxyType({
+        "title": "CCSS.MATH.CONTENT.6.EE.A.1",
+        "description": "Write and evaluate numerical expressions involving whole-number exponents.",
+        "resource_url": "https://www.corestandards.org/Math/Content/6/EE/A/1/",
+        "type": _TYPE_CCSS,
+        "source": _SOURCE_CCSS,
+        "domain": "Expressions and Equations"
+    }),
+    MappingProxyType({
+        "title": "CCSS.MATH.CONTENT.6.G.A.1",
+        "description": "Find the area of right triangles, other triangles, special quadrilaterals, and polygons by composing into rectangles or decomposing into triangles and other shapes.",
+        "resource_url": "https://www.corestandards.org/Math/Content/6/G/A/1/",
+        "type": _TYPE_CCSS,
+        "source": _SOURCE_CCSS,
+        "domain": "Geometry"
+    }),
+)
+
+# Common Core ELA standards for grade 6 and up
+_CCSS_ELA_STANDARDS = (
+    MappingProxyType({
+        "title": "CCSS.ELA-LITERACY.RL.6.1",
+        "description": "Cite textual evidence to support analysis of what the text says explicitly as well as inferences drawn from the text.",
+        "resource_url": "https://www.corestandards.org/ELA-Literacy/RL/6/1/",
+        "type": _TYPE_CCSS,
+        "source": _SOURCE_CCSS,
+        "domain": "Reading Literature"
+    }),
+    MappingProxyType({
+        "title": "CCSS.ELA-LITERACY.RI.6.1",
+        "description": "Cite textual evidence to support analysis of what the text says explicitly as well as inferences drawn from the text.",
+        "resource_url": "https://www.corestandards.org/ELA-Literacy/RI/6/1/",
+        "type": _TYPE_CCSS,
+        "source": _SOURCE_CCSS,
+        "domain": "Reading Informational Text"
+    }),
+    MappingProxyType({
+        "title": "CCSS.ELA-LITERACY.W.6.1",
+        "description": "Write arguments to support claims with clear reasons and relevant evidence.",
+        "resource_url": "https://www.corestandards.org/ELA-Literacy/W/6/1/",
+        "type": _TYPE_CCSS,
+        "source": _SOURCE_CCSS,
+        "domain": "Writing"
+    }),
+)
+
+# NGSS middle school performance expectations
+_NGSS_STANDARDS = (
+    MappingProxyType({
+        "title": "MS-PS1-1",
+        "description": "Develop models to describe the atomic composition of simple molecules and extended structures.",
+        "resource_url": "https://www.nextgenscience.org/pe/ms-ps1-1-matter-and-its-interactions",
+        "type": _TYPE_NGSS,
+        "source": _SOURCE_NGSS,
+        "domain": "Physical Sciences"
+    }),
+    MappingProxyType({
+        "title": "MS-LS1-1",
+        "description": "Conduct an investigation to provide evidence that living things are made of cells.",
+        "resource_url": "https://www.nextgenscience.org/pe/ms-ls1-1-from-molecules-organisms-structures-and-processes",
+        "type": _TYPE_NGSS,
+        "source": _SOURCE_NGSS,
+        "domain": "Life Sciences"
+    }),
+    MappingProxyType({
+        "title": "MS-ESS1-1",
+        "description": "Develop and use a model of the Earth-sun-moon system to describe the cyclic patterns of lunar phases, eclipses of the sun and moon, and seasons.",
+        "resource_url": "https://www.nextgenscience.org/pe/ms-ess1-1-earth-s-place-universe",
+        "type": _TYPE_NGSS,
+        "source": _SOURCE_NGSS,
+        "domain": "Earth and Space Sciences"
+    }),
+)
 
 class ExternalAPIService:
     def __init__(self):
@@ -15,190 +178,93 @@ class ExternalAPIService:
         self.edfi_base_url = None
         self.edfi_rate_limit = 0
         self.edfi_requests = []
+        # One pooled HTTP session per event loop, so concurrent fetches reuse keep-alive connections
+        self._sessions = weakref.WeakKeyDictionary()  # Event loop -> aiohttp.ClientSession
+    
+    async def _session(self) -> aiohttp.ClientSession:
+        """Shared HTTP session for the running event loop, created on first use"""
+        loop = asyncio.get_running_loop()
+        session = self._sessions.get(loop)
+        if session is None or session.closed:
+            # A session references its own loop, so entries for closed loops are never collected on their own
+            for closed_loop in [other for other in self._sessions if other.is_closed()]:
+                del self._sessions[closed_loop]
+            session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=32, limit_per_host=8, ttl_dns_cache=300),
+                timeout=aiohttp.ClientTimeout(total=10)
+            )
+            self._sessions[loop] = session
+        return session
     
+    async def aclose(self):
+        """Close the running event loop's HTTP session (call on shutdown)"""
+        session = self._sessions.pop(asyncio.get_running_loop(), None)
+        if session is not None:
+            await session.close()
+    
+    @ttl_cache(maxsize=512, ttl=3600)
     async def fetch_common_core_standards(self, subject: str, grade: str) -> List[Dict]:
         """Fetch Common Core State Standards using dynamic generation"""
         try:
             # Limit to 3 most relevant standards
-            standards = self._generate_common_core_standards(subject, grade)
-            return standards[:3]  # Limit to 3 standards
+            return self._generate_common_core_standards(subject, grade, limit=3)
             
         except Exception as e:
             print(f"Error fetching Common Core standards: {e}")
             return []
     
-    def _generate_common_core_standards(self, subject: str, grade: str) -> List[Dict]:
-        """Generate Common Core standards based on subject and grade"""
-        standards = []
-        
+    def _generate_common_core_standards(self, subject: str, grade: str, limit: int = 3) -> List[Dict]:
+        """Generate up to `limit` Common Core standards based on subject and grade"""
         # Map subjects to Common Core domains
-        if subject.lower() in ["mathematics", "math"]:
-            grade_num = self._extract_grade_number(grade)
-            
-            if grade_num >= 6:
-                standards.extend([
-                    {
-                        "title": f"CCSS.MATH.CONTENT.6.NS.A.1",
-                        "description": "Interpret and compute quotients of fractions, and solve word problems involving division of fractions by fractions.",
-                        "resource_url": "https://www.corestandards.org/Math/Content/6/NS/A/1/",
-                        "type": "Common Core Standard",
-                        "subject": subject,
-                        "source": "Common Core",
-                        "grade_level": grade,
-                        "domain": "Number and Operations—Fractions",
-                        "fetched_at": datetime.now().isoformat()
-                    },
-                    {
-                        "title": f"CCSS.MATH.CONTENT.6.NS.B.2",
-                        "description": "Fluently divide multi-digit numbers using the standard algorithm.",
-                        "resource_url": "https://www.corestandards.org/Math/Content/6/NS/B/2/",
-                        "type": "Common Core Standard",
-                        "subject": subject,
-                        "source": "Common Core",
-                        "grade_level": grade,
-                        "domain": "Number and Operations in Base Ten",
-                        "fetched_at": datetime.now().isoformat()
-                    },
-                    {
-                        "title": f"CCSS.MATH.CONTENT.6.RP.A.1",
-                        "description": "Understand the concept of a ratio and use ratio language to describe a ratio relationship between two quantities.",
-                        "resource_url": "https://www.corestandards.org/Math/Content/6/RP/A/1/",
-                        "type": "Common Core Standard",
-                        "subject": subject,
-                        "source": "Common Core",
-                        "grade_level": grade,
-                        "domain": "Ratios and Proportional Relationships",
-                        "fetched_at": datetime.now().isoformat()
-                    },
-                    {
-                        "title": f"CCSS.MATH.CONTENT.6.EE.A.1",
-                        "description": "Write and evaluate numerical expressions involving whole-number exponents.",
-                        "resource_url": "https://www.corestandards.org/Math/Content/6/EE/A/1/",
-                        "type": "Common Core Standard",
-                        "subject": subject,
-                        "source": "Common Core",
-                        "grade_level": grade,
-                        "domain": "Expressions and Equations",
-                        "fetched_at": datetime.now().isoformat()
-                    },
-                    {
-                        "title": f"CCSS.MATH.CONTENT.6.G.A.1",
-                        "description": "Find the area of right triangles, other triangles, special quadrilaterals, and polygons by composing into rectangles or decomposing into triangles and other shapes.",
-                        "resource_url": "https://www.corestandards.org/Math/Content/6/G/A/1/",
-                        "type": "Common Core Standard",
-                        "subject": subject,
-                        "source": "Common Core",
-                        "grade_level": grade,
-                        "domain": "Geometry",
-                        "fetched_at": datetime.now().isoformat()
-                    }
-                ])
+        subject_lower = subject.lower()
+        if subject_lower in ["mathematics", "math"]:
+            templates = _CCSS_MATH_STANDARDS
+        elif subject_lower in ["english", "language arts", "reading", "writing"]:
+            templates = _CCSS_ELA_STANDARDS
+        else:
+            print(f"Generated 0 Common Core standards for {subject} grade {grade}")
+            return []
         
-        elif subject.lower() in ["english", "language arts", "reading", "writing"]:
-            grade_num = self._extract_grade_number(grade)
-            
-            if grade_num >= 6:
-                standards.extend([
-                    {
-                        "title": f"CCSS.ELA-LITERACY.RL.6.1",
-                        "description": "Cite textual evidence to support analysis of what the text says explicitly as well as inferences drawn from the text.",
-                        "resource_url": "https://www.corestandards.org/ELA-Literacy/RL/6/1/",
-                        "type": "Common Core Standard",
-                        "subject": subject,
-                        "source": "Common Core",
-                        "grade_level": grade,
-                        "domain": "Reading Literature",
-                        "fetched_at": datetime.now().isoformat()
-                    },
-                    {
-                        "title": f"CCSS.ELA-LITERACY.RI.6.1",
-                        "description": "Cite textual evidence to support analysis of what the text says explicitly as well as inferences drawn from the text.",
-                        "resource_url": "https://www.corestandards.org/ELA-Literacy/RI/6/1/",
-                        "type": "Common Core Standard",
-                        "subject": subject,
-                        "source": "Common Core",
-                        "grade_level": grade,
-                        "domain": "Reading Informational Text",
-                        "fetched_at": datetime.now().isoformat()
-                    },
-                    {
-                        "title": f"CCSS.ELA-LITERACY.W.6.1",
-                        "description": "Write arguments to support claims with clear reasons and relevant evidence.",
-                        "resource_url": "https://www.corestandards.org/ELA-Literacy/W/6/1/",
-                        "type": "Common Core Standard",
-                        "subject": subject,
-                        "source": "Common Core",
-                        "grade_level": grade,
-                        "domain": "Writing",
-                        "fetched_at": datetime.now().isoformat()
-                    }
-                ])
+        standards = []
+        if self._extract_grade_number(grade) >= 6:
+            now_iso = datetime.now().isoformat()  # One timestamp shared by every generated standard
+            standards = [
+                {**template, "subject": subject, "grade_level": grade, "fetched_at": now_iso}
+                for template in templates[:limit]
+            ]
         
         print(f"Generated {len(standards)} Common Core standards for {subject} grade {grade}")
         return standards
     
+    @ttl_cache(maxsize=512, ttl=3600)
     async def fetch_ngss_standards(self, subject: str, grade: str) -> List[Dict]:
         """Fetch NGSS standards using dynamic generation"""
         try:
             if subject.lower() not in ['science', 'physics', 'chemistry', 'biology', 'astronomy']:
                 return []
             
-            standards = self._generate_ngss_standards(subject, grade)
-            return standards[:2]  # Limit to 2 standards
+            return self._generate_ngss_standards(subject, grade, limit=2)
             
         except Exception as e:
             print(f"Error fetching NGSS standards: {e}")
             return []
     
-    def _generate_ngss_standards(self, subject: str, grade: str) -> List[Dict]:
-        """Generate NGSS standards based on subject and grade"""
+    def _generate_ngss_standards(self, subject: str, grade: str, limit: int = 2) -> List[Dict]:
+        """Generate up to `limit` NGSS standards based on subject and grade"""
         standards = []
-        grade_num = self._extract_grade_number(grade)
-        
-        if grade_num >= 6:
-            standards.extend([
-                {
-                    "title": "MS-PS1-1",
-                    "description": "Develop models to describe the atomic composition of simple molecules and extended structures.",
-                    "resource_url": "https://www.nextgenscience.org/pe/ms-ps1-1-matter-and-its-interactions",
-                    "type": "NGSS Standard",
-                    "subject": subject,
-                    "source": "NGSS",
-                    "grade_level": grade,
-                    "domain": "Physical Sciences",
-                    "fetched_at": datetime.now().isoformat()
-                },
-                {
-                    "title": "MS-LS1-1",
-                    "description": "Conduct an investigation to provide evidence that living things are made of cells.",
-                    "resource_url": "https://www.nextgenscience.org/pe/ms-ls1-1-from-molecules-organisms-structures-and-processes",
-                    "type": "NGSS Standard",
-                    "subject": subject,
-                    "source": "NGSS",
-                    "grade_level": grade,
-                    "domain": "Life Sciences",
-                    "fetched_at": datetime.now().isoformat()
-                },
-                {
-                    "title": "MS-ESS1-1",
-                    "description": "Develop and use a model of the Earth-sun-moon system to describe the cyclic patterns of lunar phases, eclipses of the sun and moon, and seasons.",
-                    "resource_url": "https://www.nextgenscience.org/pe/ms-ess1-1-earth-s-place-universe",
-                    "type": "NGSS Standard",
-                    "subject": subject,
-                    "source": "NGSS",
-                    "grade_level": grade,
-                    "domain": "Earth and Space Sciences",
-                    "fetched_at": datetime.now().isoformat()
-                }
-            ])
+        if self._extract_grade_number(grade) >= 6:
+            now_iso = datetime.now().isoformat()  # One timestamp shared by every generated standard
+            standards = [
+                {**template, "subject": subject, "grade_level": grade, "fetched_at": now_iso}
+                for template in _NGSS_STANDARDS[:limit]
+            ]
         
         print(f"Generated {len(standards)} NGSS standards for {subject} grade {grade}")
         return standards
     
     def _extract_grade_number(self, grade: str) -> int:
         """Extract numeric grade from string like '6th Grade' or 'Grade 6'"""
-        import re
-        match = re.search(r'\d+', grade)
+        match = _GRADE_DIGITS_RE.search(grade)
         return int(match.group()) if match else 6
     
     async def fetch_all_external_resources(self, subject: str, grade_level: str, topic: str) -> List[Dict]:
@@ -218,30 +284,21 @@ class ExternalAPIService:
             resource_priorities.append(("nasa", self.fetch_nasa_education_resources(subject, topic)))
         
         try:
-            # Fetch resources concurrently
-            results = await asyncio.gather(*[task for _, task in resource_priorities], return_exceptions=True)
-            
-            # Process results and ensure diversity
-            resource_groups = {}
-            for i, (source_type, result) in enumerate(zip([name for name, _ in resource_priorities], results)):
-                if isinstance(result, list) and result:
-                    resource_groups[source_type] = result
-                elif isinstance(result, Exception):
-                    print(f"API error for {source_type}: {result}")
+            # Fetch resources concurrently; each source has its own deadline, so a slow API only
+            # costs its own results
+            async with asyncio.TaskGroup() as tg:
+                tasks = [
+                    tg.create_task(self._fetch_source(source_type, coro), name=source_type)
+                    for source_type, coro in resource_priorities
+                ]
             
-            # Select diverse resources (max 3 per source type, total max 10)
+            # Select diverse resources (max 3 per source type, total max 10) in one pass over the
+            # results, in priority order
             max_per_source = 3
             max_total = 10
             
-            for source_type, resources in resource_groups.items():
-                if len(all_resources) >= max_total:
-                    break
-                    
-                # Take up to max_per_source from this source
-                remaining_slots = max_total - len(all_resources)
-                resources_to_add = min(max_per_source, remaining_slots, len(resources))
-                
-                all_resources.extend(resources[:resources_to_add])
+            for task in tasks:
+                all_resources.extend(task.result()[:min(max_per_source, max_total - len(all_resources))])
             
             print(f"Fetched {len(all_resources)} diverse resources from external APIs")
             return all_resources
@@ -250,7 +307,19 @@ class ExternalAPIService:
             print(f"Error fetching external resources: {e}")
             return []
     
+    async def _fetch_source(self, source_type: str, coro) -> List[Dict]:
+        """Await one source's fetch under the per-source timeout, returning [] on timeout or error"""
+        try:
+            result = await asyncio.wait_for(coro, timeout=_SOURCE_TIMEOUT)
+        except TimeoutError:
+            print(f"API timeout for {source_type} after {_SOURCE_TIMEOUT}s")
+            return []
+        except Exception as e:
+            print(f"API error for {source_type}: {e}")
+            return []
+        return result if isinstance(result, list) else []
 
+    @ttl_cache(maxsize=512, ttl=3600)
     async def fetch_youtube_educational_resources(self, subject: str, topic: str) -> List[Dict]:
         """Fetch educational videos from YouTube Data API"""
         try:
@@ -261,50 +330,56 @@ class ExternalAPIService:
                 print("YouTube API key not configured - skipping YouTube resources")
                 return []
             
-            async with aiohttp.ClientSession() as session:
-                url = "https://www.googleapis.com/youtube/v3/search"
-                params = {
-                    "part": "snippet",
-                    "q": f"{topic} {subject} educational lesson",
-                    "type": "video",
-                    "maxResults": 3,  # Reduced from 10 to 3
-                    "key": api_key,
-                    "order": "relevance",
-                    "videoDuration": "medium",  # 4-20 minutes
-                    "videoDefinition": "high",
-                    "relevanceLanguage": "en"
-                }
-                
-                async with session.get(url, params=params, timeout=10) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        resources = []
-                        
-                        for item in data.get("items", []):
-                            snippet = item.get("snippet", {})
-                            video_id = item.get("id", {}).get("videoId", "")
-                            
-                            resource = {
-                                "title": snippet.get("title", ""),
-                                "description": snippet.get("description", "")[:200] + "..." if len(snippet.get("description", "")) > 200 else snippet.get("description", ""),
-                                "resource_url": f"https://www.youtube.com/watch?v={video_id}",
-                                "type": "Educational Video",
-                                "subject": subject,
-                                "source": "YouTube",
-                                "thumbnail": snippet.get("thumbnails", {}).get("medium", {}).get("url", ""),
-                                "channel": snippet.get("channelTitle", ""),
-                                "published": snippet.get("publishedAt", ""),
-                                "fetched_at": datetime.now().isoformat()
-                            }
-                            resources.append(resource)
-                        
-                        print(f"Fetched {len(resources)} YouTube educational videos")
-                        return resources
-                    else:
-                        error_text = await response.text()
-                        print(f"YouTube API error: {response.status} - {error_text}")
-                        return []
+            session = await self._session()
+            url = "https://www.googleapis.com/youtube/v3/search"
+            params = {
+                "part": "snippet",
+                "q": f"{topic} {subject} educational lesson",
+                "type": "video",
+                "maxResults": 3,  # Reduced from 10 to 3
+                "key": api_key,
+                "order": "relevance",
+                "videoDuration": "medium",  # 4-20 minutes
+                "videoDefinition": "high",
+                "relevanceLanguage": "en",
+                # Partial response: only the fields the resources below are built from
+                "fields": "items(id/videoId,snippet(title,description,channelTitle,publishedAt,thumbnails/medium/url))"
+            }
+            
+            async with session.get(url, params=params, timeout=10) as response:
+                if response.status == 200:
+                    data = await response.json(loads=_json_loads)
+                    resources = []
+                    now_iso = datetime.now().isoformat()
+                    
+                    for item in data.get("items", []):
+                        snippet = item.get("snippet", {})
+                        video_id = item.get("id", {}).get("videoId", "")
+                        description = snippet.get("description", "")
+                        if len(description) > 200:
+                            description = description[:200] + "..."
                         
+                        resource = {
+                            "title": snippet.get("title", ""),
+                            "description": description,
+                            "resource_url": f"https://www.youtube.com/watch?v={video_id}",
+                            "type": "Educational Video",
+                            "subject": subject,
+                            "source": "YouTube",
+                            "thumbnail": snippet.get("thumbnails", {}).get("medium", {}).get("url", ""),
+                            "channel": snippet.get("channelTitle", ""),
+                            "published": snippet.get("publishedAt", ""),
+                            "fetched_at": now_iso
+                        }
+                        resources.append(resource)
+                    
+                    print(f"Fetched {len(resources)} YouTube educational videos")
+                    return resources
+                else:
+                    error_text = await response.text()
+                    print(f"YouTube API error: {response.status} - {error_text}")
+                    return []
+                    
         except Exception as e:
             print(f"Error fetching YouTube resources: {e}")
             return []
@@ -336,35 +411,36 @@ class ExternalAPIService:
     async def fetch_openstax_resources(self, subject: str, topic: str) -> List[Dict]:
         """Fetch resources from OpenStax API"""
         try:
-            async with aiohttp.ClientSession() as session:
-                url = "https://openstax.org/api/v2/pages"
-                params = {
-                    "search": f"{topic} {subject}",
-                    "per_page": 10
-                }
-                
-                async with session.get(url, params=params, timeout=10) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        resources = []
-                        
-                        for item in data.get("results", []):
-                            resource = {
-                                "title": item.get("title", ""),
-                                "description": item.get("description", ""),
-                                "resource_url": item.get("url", ""),
-                                "type": "OpenStax Resource",
-                                "subject": subject,
-                                "source": "OpenStax",
-                                "fetched_at": datetime.now().isoformat()
-                            }
-                            resources.append(resource)
-                        
-                        return resources
-                    else:
-                        print(f"OpenStax API error: {response.status}")
-                        return []
-                        
+            session = await self._session()
+            url = "https://openstax.org/api/v2/pages"
+            params = {
+                "search": f"{topic} {subject}",
+                "per_page": 10
+            }
+            
+            async with session.get(url, params=params, timeout=10) as response:
+                if response.status == 200:
+                    data = await response.json(loads=_json_loads)
+                    resources = []
+                    now_iso = datetime.now().isoformat()
+                    
+                    for item in data.get("results", []):
+                        resource = {
+                            "title": item.get("title", ""),
+                            "description": item.get("description", ""),
+                            "resource_url": item.get("url", ""),
+                            "type": "OpenStax Resource",
+                            "subject": subject,
+                            "source": "OpenStax",
+                            "fetched_at": now_iso
+                        }
+                        resources.append(resource)
+                    
+                    return resources
+                else:
+                    print(f"OpenStax API error: {response.status}")
+                    return []
+                    
         except Exception as e:
             print(f"Error fetching OpenStax resources: {e}")
             return []
@@ -372,160 +448,179 @@ class ExternalAPIService:
     async def fetch_merlot_resources(self, subject: str, topic: str) -> List[Dict]:
         """Fetch resources from MERLOT API"""
         try:
-            async with aiohttp.ClientSession() as session:
-                url = "https://www.merlot.org/merlot/materials"
-                params = {
-                    "search": f"{topic} {subject}",
-                    "limit": 10
-                }
-                
-                async with session.get(url, params=params, timeout=10) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        resources = []
-                        
-                        for item in data.get("results", []):
-                            resource = {
-                                "title": item.get("title", ""),
-                                "description": item.get("description", ""),
-                                "resource_url": item.get("url", ""),
-                                "type": "MERLOT Resource",
-                                "subject": subject,
-                                "source": "MERLOT",
-                                "fetched_at": datetime.now().isoformat()
-                            }
-                            resources.append(resource)
-                        
-                        return resources
-                    else:
-                        print(f"MERLOT API error: {response.status}")
-                        return []
-                        
+            session = await self._session()
+            url = "https://www.merlot.org/merlot/materials"
+            params = {
+                "search": f"{topic} {subject}",
+                "limit": 10
+            }
+            
+            async with session.get(url, params=params, timeout=10) as response:
+                if response.status == 200:
+                    data = await response.json(loads=_json_loads)
+                    resources = []
+                    now_iso = datetime.now().isoformat()
+                    
+                    for item in data.get("results", []):
+                        resource = {
+                            "title": item.get("title", ""),
+                            "description": item.get("description", ""),
+                            "resource_url": item.get("url", ""),
+                            "type": "MERLOT Resource",
+                            "subject": subject,
+                            "source": "MERLOT",
+                            "fetched_at": now_iso
+                        }
+                        resources.append(resource)
+                    
+                    return resources
+                else:
+                    print(f"MERLOT API error: {response.status}")
+                    return []
+                    
         except Exception as e:
             print(f"Error fetching MERLOT resources: {e}")
             return []
     
+    @ttl_cache(maxsize=512, ttl=3600)
     async def fetch_nasa_education_resources(self, subject: str, topic: str) -> List[Dict]:
         """Fetch resources from NASA Education API"""
         try:
-            async with aiohttp.ClientSession() as session:
-                url = "https://api.nasa.gov/planetary/apod"
-                params = {
-                    "api_key": "DEMO_KEY",
-                    "count": 5
-                }
-                
-                async with session.get(url, params=params, timeout=10) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        resources = []
-                        
-                        for item in data:
-                            resource = {
-                                "title": item.get("title", ""),
-                                "description": item.get("explanation", ""),
-                                "resource_url": item.get("url", ""),
-                                "type": "NASA Educational Resource",
-                                "subject": subject,
-                                "source": "NASA",
-                                "fetched_at": datetime.now().isoformat()
-                            }
-                            resources.append(resource)
-                        
-                        return resources
-                    else:
-                        print(f"NASA API error: {response.status}")
-                        return []
-                        
+            session = await self._session()
+            url = "https://api.nasa.gov/planetary/apod"
+            params = {
+                "api_key": "DEMO_KEY",
+                "count": 5
+            }
+            
+            async with session.get(url, params=params, timeout=10) as response:
+                if response.status == 200:
+                    data = await response.json(loads=_json_loads)
+                    resources = []
+                    now_iso = datetime.now().isoformat()
+                    
+                    for item in data:
+                        resource = {
+                            "title": item.get("title", ""),
+                            "description": item.get("explanation", ""),
+                            "resource_url": item.get("url", ""),
+                            "type": "NASA Educational Resource",
+                            "subject": subject,
+                            "source": "NASA",
+                            "fetched_at": now_iso
+                        }
+                        resources.append(resource)
+                    
+                    return resources
+                else:
+                    print(f"NASA API error: {response.status}")
+                    return []
+                    
         except Exception as e:
             print(f"Error fetching NASA resources: {e}")
             return []
     
+    # The mock resource returned when every endpoint fails is not cached
+    @ttl_cache(maxsize=512, ttl=3600, should_cache=lambda resources: bool(resources) and resources[0]["source"] == "Wikipedia")
     async def fetch_wikipedia_resources(self, subject: str, topic: str) -> List[Dict]:
         """Fetch resources from Wikipedia API with improved error handling"""
         try:
-            async with aiohttp.ClientSession() as session:
-                headers = {
-                    "User-Agent": "LessonPlanGenerator/1.0 (Educational Tool; contact@example.com)"
-                }
-                
-                # Try multiple Wikipedia API endpoints
-                endpoints = [
-                    f"https://en.wikipedia.org/api/rest_v1/page/summary/{topic}",
-                    f"https://en.wikipedia.org/w/api.php?action=query&format=json&prop=extracts&exintro&explaintext&titles={topic}",
-                    f"https://en.wikipedia.org/w/api.php?action=query&format=json&prop=extracts&exintro&titles={topic}"
-                ]
+            session = await self._session()
+            headers = {
+                "User-Agent": "LessonPlanGenerator/1.0 (Educational Tool; contact@example.com)"
+            }
+            
+            # Try multiple Wikipedia API endpoints; the topic is percent-encoded as one path segment
+            # (so "AC/DC" stays one title) and as a query value
+            endpoints = [
+                URL(_WIKIPEDIA_SUMMARY_URL + quote(topic, safe=''), encoded=True),
+                _WIKIPEDIA_QUERY_URL.with_query(
+                    action="query", format="json", prop="extracts", exintro="1", explaintext="1", titles=topic
+                ),
+                _WIKIPEDIA_QUERY_URL.with_query(action="query", format="json", prop="extracts", exintro="1", titles=topic)
+            ]
+            
+            # All endpoints are requested at once and the first usable answer wins, so a stalled
+            # endpoint never holds up a faster one; of answers arriving together, the most preferred
+            # endpoint's is taken
+            tasks = [
+                asyncio.create_task(self._fetch_wikipedia_endpoint(session, url, headers, subject, topic))
+                for url in endpoints
+            ]
+            try:
+                pending = set(tasks)
+                while pending:
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    resource = next(
+                        (task.result() for task in tasks if task in done and task.result() is not None), None
+                    )
+                    if resource is not None:
+                        print(f"Fetched Wikipedia resource for {topic}")
+                        return [resource]
+            finally:
+                # Wait for the losing requests to unwind so their connections go back to the pool
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+            
+            # If all endpoints fail, return a mock Wikipedia resource
+            print(f"All Wikipedia API endpoints failed for {topic}, using mock resource")
+            return [{
+                "title": f"{topic.title()} - Educational Resource",
+                "description": f"Educational content about {topic} for {subject} students. This resource provides comprehensive information and learning materials.",
+                "resource_url": _wikipedia_article_url(topic),
+                "type": "Wikipedia Article",
+                "subject": subject,
+                "source": "Wikipedia (Mock)",
+                "fetched_at": datetime.now().isoformat()
+            }]
+            
+        except Exception as e:
+            print(f"Error fetching Wikipedia resources: {e}")
+            return []
+    
+    async def _fetch_wikipedia_endpoint(self, session: aiohttp.ClientSession, url: URL, headers: Dict,
+                                        subject: str, topic: str) -> Optional[Dict]:
+        """Wikipedia resource from one endpoint, or None when the endpoint fails or has no page"""
+        try:
+            async with session.get(url, headers=headers, timeout=_WIKIPEDIA_ENDPOINT_TIMEOUT) as response:
+                if response.status != 200:
+                    return None
+                data = await response.json(loads=_json_loads)
                 
-                for url in endpoints:
-                    try:
-                        async with session.get(url, headers=headers, timeout=10) as response:
-                            if response.status == 200:
-                                data = await response.json()
-                                
-                                # Handle different API response formats
-                                if "rest_v1" in url:
-                                    # REST API format
-                                    resource = {
-                                        "title": data.get("title", topic.title()),
-                                        "description": data.get("extract", f"Educational content about {topic}"),
-                                        "resource_url": data.get("content_urls", {}).get("desktop", {}).get("page", f"https://en.wikipedia.org/wiki/{topic}"),
-                                        "type": "Wikipedia Article",
-                                        "subject": subject,
-                                        "source": "Wikipedia",
-                                        "fetched_at": datetime.now().isoformat()
-                                    }
-                                else:
-                                    # Query API format
-                                    pages = data.get("query", {}).get("pages", {})
-                                    if pages:
-                                        page_data = list(pages.values())[0]
-                                        resource = {
-                                            "title": page_data.get("title", topic.title()),
-                                            "description": page_data.get("extract", f"Educational content about {topic}")[:500] + "...",
-                                            "resource_url": f"https://en.wikipedia.org/wiki/{topic}",
-                                            "type": "Wikipedia Article",
-                                            "subject": subject,
-                                            "source": "Wikipedia",
-                                            "fetched_at": datetime.now().isoformat()
-                                        }
-                                    else:
-                                        continue
-                                
-                                print(f"Fetched Wikipedia resource for {topic}")
-                                return [resource]
-                                
-                    except Exception as e:
-                        print(f"Wikipedia API endpoint failed: {e}")
-                        continue
+                # Handle different API response formats
+                if "rest_v1" in url.path:
+                    # REST API format
+                    return {
+                        "title": data.get("title", topic.title()),
+                        "description": data.get("extract", f"Educational content about {topic}"),
+                        "resource_url": data.get("content_urls", {}).get("desktop", {}).get("page", _wikipedia_article_url(topic)),
+                        "type": "Wikipedia Article",
+                        "subject": subject,
+                        "source": "Wikipedia",
+                        "fetched_at": datetime.now().isoformat()
+                    }
                 
-                # If all endpoints fail, return a mock Wikipedia resource
-                print(f"All Wikipedia API endpoints failed for {topic}, using mock resource")
-                return [{
-                    "title": f"{topic.title()} - Educational Resource",
-                    "description": f"Educational content about {topic} for {subject} students. This resource provides comprehensive information and learning materials.",
-                    "resource_url": f"https://en.wikipedia.org/wiki/{topic}",
+                # Query API format
+                pages = data.get("query", {}).get("pages", {})
+                page_data = next(iter(pages.values()), None)
+                if page_data is None:
+                    return None
+                return {
+                    "title": page_data.get("title", topic.title()),
+                    "description": page_data.get("extract", f"Educational content about {topic}")[:500] + "...",
+                    "resource_url": _wikipedia_article_url(topic),
                     "type": "Wikipedia Article",
                     "subject": subject,
-                    "source": "Wikipedia (Mock)",
+                    "source": "Wikipedia",
                     "fetched_at": datetime.now().isoformat()
-                }]
+                }
                 
         except Exception as e:
-            print(f"Error fetching Wikipedia resources: {e}")
-            return []
+            print(f"Wikipedia API endpoint failed: {e}")
+            return None
             
     def _map_grade_to_edfi_descriptor(self, grade: str) -> str:
         """Map grade level to Ed-Fi grade level descriptor"""
-        grade_mapping = {
-            "Kindergarten": "uri://ed-fi.org/GradeLevelDescriptor#Kindergarten",
-            "1st Grade": "uri://ed-fi.org/GradeLevelDescriptor#First grade",
-            "2nd Grade": "uri://ed-fi.org/GradeLevelDescriptor#Second grade",
-            "3rd Grade": "uri://ed-fi.org/GradeLevelDescriptor#Third grade",
-            "4th Grade": "uri://ed-fi.org/GradeLevelDescriptor#Fourth grade",
-            "5th Grade": "uri://ed-fi.org/GradeLevelDescriptor#Fifth grade",
-            "6th Grade": "uri://ed-fi.org/GradeLevelDescriptor#Sixth grade",
-            "7th Grade": "uri://ed-fi.org/GradeLevelDescriptor#Seventh grade",
-            "8th Grade": "uri://ed-fi.org/GradeLevelDescriptor#Eighth grade"
-        }
-        return grade_mapping.get(grade, "uri://ed-fi.org/GradeLevelDescriptor#Sixth grade")
+        return _EDFI_GRADE_DESCRIPTORS.get(grade, _EDFI_DEFAULT_GRADE_DESCRIPTOR)
     
\ No newline at end of file
@@ -3,12 +3,12 @@ from langchain_openai import OpenAIEmbeddings
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_community.document_loaders import PyPDFLoader, TextLoader
 from qdrant_client import QdrantClient
-from qdrant_client.models import Distance, VectorParams, PointStruct
-import json
+from qdrant_client.models import Distance, VectorParams, PointStruct, ScalarQuantization, ScalarQuantizationConfig, ScalarType, Filter, FieldCondition, MatchValue
 import os
 import asyncio
 import uuid
 import hashlib
+import numpy as np
 from typing import List, Dict, Any
 from dotenv import load_dotenv
 
@@ -17,12 +17,56 @@ load_dotenv()
 
 from .external_apis import ExternalAPIService
 
+# Integer class per lowercased payload "source", stored at ingest so retrieval can boost via lookup tables
+SOURCE_CLASSES = ("youtube", "wikipedia", "interactive", "assessment", "common core", "ngss", "nasa")
+SOURCE_CLASS_MAP = {source: i for i, source in enumerate(SOURCE_CLASSES)}
+SOURCE_CLASS_OTHER = len(SOURCE_CLASSES)
+
+def source_class(source: str) -> int:
+    """Map a payload source name to its SOURCE_CLASSES index (SOURCE_CLASS_OTHER if unknown)"""
+    return SOURCE_CLASS_MAP.get(str(source).lower(), SOURCE_CLASS_OTHER)
+
+# int8 scalar quantization kept in RAM: 4x smaller vectors for scoring, originals stay available for rescoring
+VECTOR_QUANTIZATION_CONFIG = ScalarQuantization(
+    scalar=ScalarQuantizationConfig(type=ScalarType.INT8, always_ram=True)
+)
+
+def _normalize_embedding(embedding: List[float]) -> List[float]:
+    """L2-normalize an embedding so DOT distance scores equal cosine similarity"""
+    vector = np.asarray(embedding, dtype=np.float32)
+    return (vector / max(np.linalg.norm(vector), 1e-12)).tolist()
+
+# Common subject/grade combinations, pre-populated at startup
+COMMON_SUBJECT_GRADES = [
+    ("Mathematics", "3rd Grade"),
+    ("Mathematics", "4th Grade"),
+    ("Mathematics", "5th Grade"),
+    ("Mathematics", "6th Grade"),
+    ("Mathematics", "7th Grade"),
+    ("Mathematics", "8th Grade"),
+    ("English Language Arts", "3rd Grade"),
+    ("English Language Arts", "4th Grade"),
+    ("English Language Arts", "5th Grade"),
+    ("English Language Arts", "6th Grade"),
+    ("English Language Arts", "7th Grade"),
+    ("English Language Arts", "8th Grade"),
+    ("Science", "3rd Grade"),
+    ("Science", "4th Grade"),
+    ("Science", "5th Grade"),
+    ("Science", "6th Grade"),
+    ("Science", "7th Grade"),
+    ("Science", "8th Grade"),
+]
+
 class RAGService:
     def __init__(self):
         self.embeddings = OpenAIEmbeddings(model="text-embedding-3-large")
-        self.qdrant_client = QdrantClient("localhost", port=6333)
+        # gRPC transport sends vectors and payloads as protobuf instead of REST JSON
+        self.qdrant_client = QdrantClient("localhost", port=6333, grpc_port=6334, prefer_grpc=True)
         self.collection_name = "lesson_standards"
         self.external_api_service = ExternalAPIService()
+        # Bumped on every upsert so retrievers holding a local copy of the corpus know to refresh it
+        self.collection_version = 0
 
     def _generate_document_id(self, prefix: str, subject: str, grade: str, index: int) -> str:
         """Generate a UUID-based document ID for Qdrant compatibility"""
@@ -45,8 +89,9 @@ class RAGService:
                     collection_name=self.collection_name,
                     vectors_config=VectorParams(
                         size=3072,  # OpenAI text-embedding-3-large dimension
-                        distance=Distance.COSINE
-                    )
+                        distance=Distance.DOT  # Vectors are stored L2-normalized
+                    ),
+                    quantization_config=VECTOR_QUANTIZATION_CONFIG
                 )
                 print(f"Created Qdrant collection: {self.collection_name}")
                 await self._load_dynamic_standards()
@@ -61,8 +106,9 @@ class RAGService:
                     collection_name=self.collection_name,
                     vectors_config=VectorParams(
                         size=3072,
-                        distance=Distance.COSINE
-                    )
+                        distance=Distance.DOT
+                    ),
+                    quantization_config=VECTOR_QUANTIZATION_CONFIG
                 )
                 print(f"Created Qdrant collection: {self.collection_name}")
             except Exception as e2:
@@ -72,29 +118,7 @@ class RAGService:
         """Load dynamic standards for common subjects and grades"""
         print("Loading dynamic standards...")
         
-        # Common subject/grade combinations to pre-populate
-        common_combinations = [
-            ("Mathematics", "3rd Grade"),
-            ("Mathematics", "4th Grade"),
-            ("Mathematics", "5th Grade"),
-            ("Mathematics", "6th Grade"),
-            ("Mathematics", "7th Grade"),
-            ("Mathematics", "8th Grade"),
-            ("English Language Arts", "3rd Grade"),
-            ("English Language Arts", "4th Grade"),
-            ("English Language Arts", "5th Grade"),
-            ("English Language Arts", "6th Grade"),
-            ("English Language Arts", "7th Grade"),
-            ("English Language Arts", "8th Grade"),
-            ("Science", "3rd Grade"),
-            ("Science", "4th Grade"),
-            ("Science", "5th Grade"),
-            ("Science", "6th Grade"),
-            ("Science", "7th Grade"),
-            ("Science", "8th Grade"),
-        ]
-        
-        for subject, grade in common_combinations:
+        for subject, grade in COMMON_SUBJECT_GRADES:
             try:
                 # Generate dynamic standards
                 ccss_standards = await self.external_api_service.fetch_common_core_standards(subject, grade)
@@ -146,7 +170,7 @@ class RAGService:
         """Add a document to Qdrant"""
         try:
             # Generate embedding
-            embedding = self.embeddings.embed_query(text)
+            embedding = _normalize_embedding(self.embeddings.embed_query(text))
             
             # Create point
             point = PointStruct(
@@ -154,6 +178,7 @@ class RAGService:
                 vector=embedding,
                 payload={
                     "text": text,
+                    "source_class": source_class(metadata.get("source", "")),
                     **metadata
                 }
             )
@@ -163,6 +188,7 @@ class RAGService:
                 collection_name=self.collection_name,
                 points=[point]
             )
+            self.collection_version += 1
             
         except Exception as e:
             print(f"Error adding document to Qdrant: {e}")
@@ -172,43 +198,34 @@ class RAGService:
         """Search documents in Qdrant"""
         try:
             # Generate query embedding
-            query_embedding = self.embeddings.embed_query(query)
+            query_embedding = _normalize_embedding(self.embeddings.embed_query(query))
             
             # Build filter
             filter_conditions = []
             if subject:
-                filter_conditions.append({
-                    "key": "subject",
-                    "match": {"value": subject}
-                })
+                filter_conditions.append(FieldCondition(key="subject", match=MatchValue(value=subject)))
             if grade:
-                filter_conditions.append({
-                    "key": "grade", 
-                    "match": {"value": grade}
-                })
+                filter_conditions.append(FieldCondition(key="grade", match=MatchValue(value=grade)))
             if teacher_id:
-                filter_conditions.append({
-                    "key": "teacher_id",
-                    "match": {"value": teacher_id}
-                })
+                filter_conditions.append(FieldCondition(key="teacher_id", match=MatchValue(value=teacher_id)))
             
             # Search
             search_result = self.qdrant_client.search(
                 collection_name=self.collection_name,
                 query_vector=query_embedding,
-                query_filter={
-                    "must": filter_conditions
-                } if filter_conditions else None,
+                query_filter=Filter(must=filter_conditions) if filter_conditions else None,
                 limit=limit
             )
             
             # Format results
             results = []
             for point in search_result:
+                # The payload is ours to keep; pop the text and reuse the rest as metadata
+                payload = point.payload or {}
                 results.append({
                     "id": point.id,
-                    "text": point.payload.get("text", ""),
-                    "metadata": {k: v for k, v in point.payload.items() if k != "text"},
+                    "text": payload.pop("text", ""),
+                    "metadata": payload,
                     "score": point.score
                 })
             
@@ -790,7 +790,12 @@ async def main():
         print("   Continuing with realistic contexts...")
     
     # Generate dataset
-    dataset = await generator.generate_comprehensive_dataset()
+    try:
+        dataset = await generator.generate_comprehensive_dataset()
+    finally:
+        # Close the pooled HTTP sessions while their event loop is still running
+        await generator.external_api_service.aclose()
+        await generator.rag_service.external_api_service.aclose()
     
     # Save to file
     output_file = "realistic_golden_dataset_ragas_evaluation_v3.json"
@@ -508,6 +508,7 @@ async def main():
     print("=" * 60)
     
     # Initialize evaluator with appropriate service
+    rag_service = None
     if ADVANCED_RETRIEVAL_AVAILABLE:
         try:
             # Try to use real RAG service
@@ -546,7 +547,12 @@ async def main():
     print(f"📋 Question types: {question_types}")
     
     # Evaluate strategies
-    results = await evaluator.evaluate_strategies(test_queries)
+    try:
+        results = await evaluator.evaluate_strategies(test_queries)
+    finally:
+        # Close the pooled HTTP session while its event loop is still running
+        if rag_service is not None:
+            await rag_service.external_api_service.aclose()
     
     # Create results table
     results_data = []
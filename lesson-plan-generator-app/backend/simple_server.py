@@ -2,7 +2,8 @@
 import asyncio
 import json
 import os
-from http.server import HTTPServer, BaseHTTPRequestHandler
+import queue
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
 from urllib.parse import urlparse, parse_qs
 import threading
 from datetime import datetime
@@ -11,6 +12,16 @@ from datetime import datetime
 from app.rag_service import RAGService
 from app.agent_service import EducationPlanningAgent
 
+# Every coroutine runs on one long-lived event loop. Async clients and their connection pools are
+# bound to the loop that created them, so this lets the OpenAI and API clients be reused across
+# requests instead of being torn down with a per-request loop.
+_event_loop = asyncio.new_event_loop()
+threading.Thread(target=_event_loop.run_forever, name="asyncio-loop", daemon=True).start()
+
+def run_async(coro):
+    """Run a coroutine on the shared event loop and wait for its result"""
+    return asyncio.run_coroutine_threadsafe(coro, _event_loop).result()
+
 class LessonPlanHandler(BaseHTTPRequestHandler):
     def __init__(self, *args, rag_service=None, agent_service=None, **kwargs):
         self.rag_service = rag_service
@@ -46,6 +57,8 @@ class LessonPlanHandler(BaseHTTPRequestHandler):
         
         if parsed_path.path == '/api/generate-lesson-plan':
             self.handle_generate_lesson_plan()
+        elif parsed_path.path == '/api/generate-lesson-plan/stream':
+            self.handle_generate_lesson_plan_stream()
         elif parsed_path.path == '/api/fetch-external-resources':
             self.handle_fetch_external_resources()
         elif parsed_path.path == '/api/search-documents':
@@ -91,6 +104,7 @@ class LessonPlanHandler(BaseHTTPRequestHandler):
                     <h2>Available API Endpoints:</h2>
                     <ul>
                         <li>POST /api/generate-lesson-plan - Generate lesson plans</li>
+                        <li>POST /api/generate-lesson-plan/stream - Generate lesson plans as server-sent events</li>
                         <li>POST /api/fetch-external-resources - Fetch external resources</li>
                         <li>POST /api/search-documents - Search documents</li>
                         <li>GET /api/collection-stats - Get collection statistics</li>
@@ -140,26 +154,52 @@ class LessonPlanHandler(BaseHTTPRequestHandler):
             post_data = self.rfile.read(content_length)
             data = json.loads(post_data.decode('utf-8'))
             
-            # Fix: Use asyncio.run instead of creating new event loop
-            # Get the current event loop or create a new one
-            try:
-                loop = asyncio.get_event_loop()
-                if loop.is_running():
-                    # If we're in a running loop, we need to use a different approach
-                    import concurrent.futures
-                    with concurrent.futures.ThreadPoolExecutor() as executor:
-                        future = executor.submit(asyncio.run, self.agent_service.generate_lesson_plan(data))
-                        lesson_plan = future.result()
-                else:
-                    lesson_plan = loop.run_until_complete(self.agent_service.generate_lesson_plan(data))
-            except RuntimeError:
-                # No event loop running, safe to use asyncio.run
-                lesson_plan = asyncio.run(self.agent_service.generate_lesson_plan(data))
+            lesson_plan = run_async(self.agent_service.generate_lesson_plan(data))
             
             self.send_json_response(lesson_plan)
         except Exception as e:
             self.send_error(500, f"Error generating lesson plan: {e}")
     
+    def handle_generate_lesson_plan_stream(self):
+        """Handle lesson plan generation as server-sent events, one event per finished step"""
+        try:
+            content_length = int(self.headers['Content-Length'])
+            post_data = self.rfile.read(content_length)
+            data = json.loads(post_data.decode('utf-8'))
+        except Exception as e:
+            self.send_error(400, f"Invalid request body: {e}")
+            return
+        
+        self.send_response(200)
+        self.send_header('Content-type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.end_headers()
+        
+        # The generation runs on the shared event loop and hands events to this thread, which does
+        # all the socket writes, so a slow client never blocks the loop
+        events = queue.Queue()
+        
+        async def stream_events():
+            try:
+                async for node, update in self.agent_service.stream_lesson_plan(data):
+                    events.put((node, update))
+                events.put(("done", {}))
+            except Exception as e:
+                # Headers are already sent, so report the failure in-band
+                events.put(("error", {"detail": f"Error generating lesson plan: {e}"}))
+        
+        generation = asyncio.run_coroutine_threadsafe(stream_events(), _event_loop)
+        try:
+            while True:
+                event, payload = events.get()
+                self.send_sse_event(event, payload)
+                if event in ("done", "error"):
+                    break
+        except (BrokenPipeError, ConnectionResetError):
+            # The client went away, so there is no one left to report to; stop generating for it
+            generation.cancel()
+    
     def handle_fetch_external_resources(self):
         """Handle external resource fetching including dynamic standards"""
         try: 
@@ -170,7 +210,7 @@ class LessonPlanHandler(BaseHTTPRequestHandler):
             resources = []
             
             if data.get('api_type') in ['ck12', 'all']:
-                ck12_resources = asyncio.run(
+                ck12_resources = run_async(
                     self.rag_service.external_api_service.fetch_ck12_resources(
                         data['subject'], data['topic']
                     )
@@ -178,7 +218,7 @@ class LessonPlanHandler(BaseHTTPRequestHandler):
                 resources.extend(ck12_resources)
             
             if data.get('api_type') in ['khan', 'all']:
-                khan_resources = asyncio.run(
+                khan_resources = run_async(
                     self.rag_service.external_api_service.fetch_khan_academy_resources(
                         data['subject'], data['topic']
                     )
@@ -186,7 +226,7 @@ class LessonPlanHandler(BaseHTTPRequestHandler):
                 resources.extend(khan_resources)
             
             if data.get('api_type') in ['wikipedia', 'all']:
-                wiki_resources = asyncio.run(
+                wiki_resources = run_async(
                     self.rag_service.external_api_service.fetch_wikipedia_resources(
                         data['subject'], data['topic']
                     )
@@ -195,7 +235,7 @@ class LessonPlanHandler(BaseHTTPRequestHandler):
             
             # Add CCSS standards
             if data.get('api_type') in ['ccss', 'all']:
-                ccss_standards = asyncio.run(
+                ccss_standards = run_async(
                     self.rag_service.external_api_service.fetch_common_core_standards(
                         data['subject'], data['grade_level']
                     )
@@ -204,7 +244,7 @@ class LessonPlanHandler(BaseHTTPRequestHandler):
             
             # Add NGSS standards
             if data.get('api_type') in ['ngss', 'all']:
-                ngss_standards = asyncio.run(
+                ngss_standards = run_async(
                     self.rag_service.external_api_service.fetch_ngss_standards(
                         data['subject'], data['grade_level']
                     )
@@ -239,8 +279,7 @@ class LessonPlanHandler(BaseHTTPRequestHandler):
                     self.send_error(400, "Missing required field: query")
                     return
                 
-                # Fix: Use asyncio.run
-                results = asyncio.run(
+                results = run_async(
                     self.rag_service.search_documents(query, subject, grade, teacher_id, limit)
                 )
                 
@@ -271,12 +310,9 @@ class LessonPlanHandler(BaseHTTPRequestHandler):
                     return
                 
                 # Cache standards
-                loop = asyncio.new_event_loop()
-                asyncio.set_event_loop(loop)
-                result = loop.run_until_complete(
+                result = run_async(
                     self.rag_service.cache_dynamic_standards(subject, grade)
                 )
-                loop.close()
                 
                 self.send_json_response(result)
             else:
@@ -292,8 +328,7 @@ class LessonPlanHandler(BaseHTTPRequestHandler):
                 subject = path_parts[3]
                 grade = path_parts[4] if len(path_parts) > 4 else ""
                 
-                # Fix: Use asyncio.run
-                standards = asyncio.run(
+                standards = run_async(
                     self.rag_service.retrieve_relevant_standards(
                         f"{subject} {grade} standards", subject, grade, n_results=10
                     )
@@ -312,8 +347,7 @@ class LessonPlanHandler(BaseHTTPRequestHandler):
     def handle_collection_stats(self):
         """Handle collection statistics"""
         try:
-            # Fix: Use asyncio.run
-            stats = asyncio.run(
+            stats = run_async(
                 self.rag_service.get_collection_stats()
             )
             
@@ -381,6 +415,11 @@ class LessonPlanHandler(BaseHTTPRequestHandler):
         self.end_headers()
         self.wfile.write(json.dumps(data).encode())
     
+    def send_sse_event(self, event, data):
+        """Write a single server-sent event and flush it to the client"""
+        self.wfile.write(f"event: {event}\ndata: {json.dumps(data)}\n\n".encode())
+        self.wfile.flush()
+    
     def log_message(self, format, *args):
         """Override to reduce log noise"""
         pass
@@ -391,19 +430,20 @@ def create_handler(rag_service, agent_service):
         return LessonPlanHandler(*args, rag_service=rag_service, agent_service=agent_service, **kwargs)
     return handler
 
-async def start_server():
+def start_server():
     """Start the HTTP server"""
     print("🚀 Starting Lesson Plan Generator Server...")
     
     # Initialize services
     rag_service = RAGService()
-    await rag_service.initialize_vectorstore()
+    run_async(rag_service.initialize_vectorstore())
     agent_service = EducationPlanningAgent(rag_service)
     
     print("✅ Server running on http://localhost:8001")
     print("📁 Serving React app from: ../frontend/dist")
     print("🔌 API endpoints:")
     print("   POST /api/generate-lesson-plan - Generate lesson plans")
+    print("   POST /api/generate-lesson-plan/stream - Stream lesson plan generation (SSE)")
     print("   POST /api/fetch-external-resources - Fetch external resources")
     print("   POST /api/search-documents - Search documents")
     print("   POST /api/cache-standards - Cache dynamic standards")
@@ -414,13 +454,17 @@ async def start_server():
     
     # Create server
     handler = create_handler(rag_service, agent_service)
-    server = HTTPServer(('localhost', 8001), handler)
+    # Requests are handled on their own threads and share the event loop, so concurrent
+    # generations overlap their LLM and API waits
+    server = ThreadingHTTPServer(('localhost', 8001), handler)
     
     try:
         server.serve_forever()
     except KeyboardInterrupt:
         print("\n🛑 Server stopped")
         server.shutdown()
+        run_async(rag_service.external_api_service.aclose())
+        run_async(agent_service.aclose())
 
 if __name__ == "__main__":
-    asyncio.run(start_server())
\ No newline at end of file
+    start_server()
\ No newline at end of file
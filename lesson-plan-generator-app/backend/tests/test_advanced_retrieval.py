@@ -0,0 +1,469 @@
+# backend/tests/test_advanced_retrieval.py
+import asyncio
+import os
+import tempfile
+import time
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+import numpy as np
+
+try:
+    import faiss
+except ImportError:
+    faiss = None
+
+try:
+    from rank_bm25 import BM25Okapi
+except ImportError:
+    BM25Okapi = None
+
+from app import advanced_retrieval
+from app.advanced_retrieval import AdvancedRetriever, EnhancedRAGService, ResultBatch, RetrievalResult, RetrievalStrategy
+
+
+def batch(*hits):
+    """ResultBatch of (content, score) pairs, each with its content as metadata"""
+    return ResultBatch.from_hits([(content, {"id": content}, score) for content, score in hits])
+
+
+class MergeResultsTest(unittest.TestCase):
+    def setUp(self):
+        # _merge_results needs no clients, so skip the constructor's model and index setup
+        self.retriever = AdvancedRetriever.__new__(AdvancedRetriever)
+
+    def merged(self, *rankings, **kwargs):
+        return [(content, score) for content, _, score in self.retriever._merge_results(*rankings, **kwargs)]
+
+    def test_keeps_first_occurrence_without_rrf(self):
+        merged = self.merged(batch(("a", 0.9), ("b", 0.5)), batch(("b", 0.8), ("c", 0.7)))
+
+        self.assertEqual(merged, [("a", 0.9), ("c", 0.7), ("b", 0.5)])
+
+    def test_reciprocal_rank_fusion_sums_ranks_across_rankings(self):
+        merged = dict(self.merged(batch(("a", 0.9), ("b", 0.5)), batch(("b", 80.0), ("c", 70.0)), rrf_k=60))
+
+        self.assertAlmostEqual(merged["b"], 1 / 62 + 1 / 61)
+        self.assertAlmostEqual(merged["a"], 1 / 61)
+        self.assertAlmostEqual(merged["c"], 1 / 62)
+        self.assertEqual(list(merged), ["b", "a", "c"])
+
+    def test_top_k_returns_best_in_descending_order(self):
+        merged = self.merged(batch(("a", 0.2), ("b", 0.9), ("c", 0.5), ("d", 0.7)), top_k=2)
+
+        self.assertEqual(merged, [("b", 0.9), ("d", 0.7)])
+
+    def test_ties_keep_input_order(self):
+        merged = self.merged(batch(("a", 0.5), ("b", 0.5)), batch(("c", 0.5)))
+
+        self.assertEqual([content for content, _ in merged], ["a", "b", "c"])
+
+    def test_empty_and_single_rankings(self):
+        self.assertEqual(self.merged(batch()), [])
+        self.assertEqual(self.merged(batch(("a", 0.3))), [("a", 0.3)])
+
+
+class FakeQdrantClient:
+    """In-memory stand-in for the Qdrant collection: payloads, vectors and a brute-force filtered search"""
+    
+    def __init__(self, points):
+        self.points = points
+        self.search_batch_calls = 0
+        self.scrolled_vectors = False
+    
+    def count(self, collection_name, exact=True):
+        return SimpleNamespace(count=len(self.points))
+    
+    def scroll(self, collection_name, limit, offset=None, with_payload=True, with_vectors=False):
+        start = offset or 0
+        self.scrolled_vectors |= with_vectors
+        page = [
+            SimpleNamespace(id=point.id, payload=dict(point.payload), vector=point.vector if with_vectors else None)
+            for point in self.points[start:start + limit]
+        ]
+        next_offset = start + limit if start + limit < len(self.points) else None
+        return page, next_offset
+    
+    def retrieve(self, collection_name, ids, with_payload=True, with_vectors=False):
+        by_id = {point.id: point for point in self.points}
+        return [SimpleNamespace(id=point_id, vector=by_id[point_id].vector) for point_id in ids]
+    
+    def search_batch(self, collection_name, requests):
+        self.search_batch_calls += 1
+        results = []
+        for request in requests:
+            conditions = {condition.key: condition.match.value for condition in (request.filter.must if request.filter else [])}
+            matching = [point for point in self.points if all(point.payload.get(k) == v for k, v in conditions.items())]
+            matching.sort(key=lambda point: -float(np.dot(point.vector, request.vector)))
+            results.append([
+                SimpleNamespace(payload=dict(point.payload), score=float(np.dot(point.vector, request.vector)))
+                for point in matching[:request.limit]
+            ])
+        return results
+
+
+class FakeEmbeddings:
+    """Fixed vectors per text; anything else (such as the warm-up queries) gets the first axis"""
+    
+    def __init__(self, vectors, dim=8):
+        self.vectors = vectors
+        self.default = np.eye(dim)[0].tolist()
+    
+    def embed_documents(self, texts):
+        return [self.vectors.get(text, self.default) for text in texts]
+
+
+def unit(vector):
+    vector = np.asarray(vector, dtype=np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+@unittest.skipIf(faiss is None, "faiss is not installed")
+class FaissSearchTest(unittest.TestCase):
+    dim = 8
+    
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        science_axis, math_axis = np.eye(self.dim)[0], np.eye(self.dim)[1]
+        # Many Science standards near the query, a few Math standards pointing elsewhere
+        points = [
+            SimpleNamespace(id=i, payload={"text": f"science {i}", "subject": "Science", "grade": "6th"},
+                            vector=unit(science_axis + 0.1 * rng.standard_normal(self.dim)).tolist())
+            for i in range(156)
+        ] + [
+            SimpleNamespace(id=156 + i, payload={"text": f"math {i}", "subject": "Math", "grade": "6th"},
+                            vector=unit(math_axis + 0.1 * rng.standard_normal(self.dim)).tolist())
+            for i in range(4)
+        ]
+        self.qdrant_client = FakeQdrantClient(points)
+        self.rag_service = rag_service = SimpleNamespace(
+            qdrant_client=self.qdrant_client, collection_name="lesson_standards", collection_version=0,
+            embeddings=FakeEmbeddings({"fractions": unit(science_axis + 0.2 * math_axis).tolist()})
+        )
+        
+        patcher = mock.patch.object(advanced_retrieval, "faiss", faiss, create=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        
+        index_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(index_dir.cleanup)
+        self.index_dir = index_dir.name
+        self.retriever = AdvancedRetriever(rag_service)
+        self.retriever.retrieval_config.update(
+            faiss_index_factory="IVF4,Flat", faiss_min_train_size=len(points), use_gpu_faiss=False,
+            faiss_index_path=os.path.join(index_dir.name, "lesson_standards.index")
+        )
+        self.retriever._build_faiss_index()
+    
+    def test_small_collection_is_not_scrolled(self):
+        small_client = FakeQdrantClient(self.qdrant_client.points[:10])
+        retriever = AdvancedRetriever(SimpleNamespace(qdrant_client=small_client, collection_name="small_standards", collection_version=0))
+        retriever.retrieval_config["faiss_index_path"] = os.path.join(self.index_dir, "small_standards.index")
+        
+        retriever._build_faiss_index()
+        
+        self.assertIsNone(retriever.faiss_index)
+        self.assertFalse(small_client.scrolled_vectors)
+    
+    def search(self, subject, grade, limit=3):
+        return self.retriever._vector_search_batch(["fractions"], subject, grade, [limit])[0]
+    
+    def test_filtered_search_only_returns_matching_rows(self):
+        self.assertIsNotNone(self.retriever.faiss_index)
+        
+        results = self.search("Math", "6th")
+        
+        # The Math rows are far from the query, so a whole-corpus top-k would miss them
+        self.assertEqual(len(results), 3)
+        self.assertTrue(all(metadata["subject"] == "Math" for metadata in results.metadatas))
+        self.assertEqual(self.qdrant_client.search_batch_calls, 0)
+    
+    def test_unfiltered_search_uses_faiss(self):
+        results = self.search("", "", limit=5)
+        
+        self.assertEqual(len(results), 5)
+        self.assertTrue(all(metadata["subject"] == "Science" for metadata in results.metadatas))
+        self.assertEqual(self.qdrant_client.search_batch_calls, 0)
+    
+    def ingest(self, point_id, text, subject, axis):
+        """Upsert a point the way RAGService._add_document_to_qdrant does"""
+        vector = unit(np.eye(self.dim)[axis] + 0.05 * np.ones(self.dim)).tolist()
+        point = SimpleNamespace(id=point_id, payload={"text": text, "subject": subject, "grade": "6th"}, vector=vector)
+        self.qdrant_client.points = [p for p in self.qdrant_client.points if p.id != point_id] + [point]
+        self.rag_service.collection_version += 1
+    
+    def test_ingested_documents_are_added_to_the_faiss_index(self):
+        self.ingest(500, "math new", "Math", axis=1)
+        
+        self.retriever.refresh_corpus()
+        results = self.search("Math", "6th", limit=5)
+        
+        self.assertEqual(self.retriever.faiss_index.ntotal, 161)
+        self.assertIn("math new", list(results.contents))
+        self.assertEqual(self.qdrant_client.search_batch_calls, 0)
+    
+    def test_retrieval_refreshes_a_stale_corpus(self):
+        self.ingest(500, "math new", "Math", axis=1)
+        
+        results = asyncio.run(self.retriever.advanced_retrieve("fractions", "Math", "6th", RetrievalStrategy.BASIC))
+        
+        self.assertIn("math new", [result.content for result in results])
+        self.assertEqual(self.retriever._corpus_version, self.rag_service.collection_version)
+    
+    def test_changed_documents_switch_back_to_qdrant(self):
+        self.ingest(0, "science rewritten", "Science", axis=0)
+        
+        self.retriever.refresh_corpus()
+        results = self.search("Science", "6th")
+        
+        self.assertIsNone(self.retriever.faiss_index)
+        self.assertFalse(os.path.exists(self.retriever.retrieval_config["faiss_index_path"]))
+        self.assertEqual(self.qdrant_client.search_batch_calls, 1)
+        self.assertEqual(len(results), 3)
+    
+    def test_short_faiss_results_fall_back_to_qdrant(self):
+        # Two lists whose centroids are the Science and Math axes; probing one list never reaches the Math rows
+        quantizer = faiss.IndexFlatIP(self.dim)
+        quantizer.add(np.eye(self.dim, dtype=np.float32)[:2])
+        index = faiss.IndexIVFFlat(quantizer, self.dim, 2, faiss.METRIC_INNER_PRODUCT)
+        index.add(np.asarray([point.vector for point in self.qdrant_client.points], dtype=np.float32))
+        self.retriever.faiss_index = index
+        self.retriever.retrieval_config["faiss_nprobe"] = 1
+        
+        results = self.search("Math", "6th")
+        
+        self.assertEqual(self.qdrant_client.search_batch_calls, 1)
+        self.assertEqual(len(results), 3)
+        self.assertTrue(all(metadata["subject"] == "Math" for metadata in results.metadatas))
+
+
+@unittest.skipIf(BM25Okapi is None, "rank-bm25 is not installed")
+class Bm25IndexTest(unittest.TestCase):
+    def setUp(self):
+        patcher = mock.patch.object(advanced_retrieval, "BM25Okapi", BM25Okapi, create=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        
+        self.corpus = [
+            self.point(1, "Add and subtract fractions with unlike denominators", "Math"),
+            self.point(2, "Multiply fractions by whole numbers", "Math"),
+            self.point(3, "Model the water cycle", "Science"),
+        ]
+        self.qdrant_client = FakeQdrantClient(list(self.corpus))
+        self.rag_service = SimpleNamespace(qdrant_client=self.qdrant_client, collection_name="lesson_standards", collection_version=0)
+        self.retriever = AdvancedRetriever(self.rag_service)
+        self.retriever._build_bm25_index()
+    
+    @staticmethod
+    def point(point_id, text, subject):
+        return SimpleNamespace(id=point_id, payload={"text": text, "subject": subject, "grade": "5th"}, vector=[0.0])
+    
+    def ingest(self, point):
+        self.qdrant_client.points = [p for p in self.qdrant_client.points if p.id != point.id] + [point]
+        self.rag_service.collection_version += 1
+    
+    def refresh(self):
+        with mock.patch.object(advanced_retrieval, "ADVANCED_RETRIEVAL_AVAILABLE", True):
+            self.retriever.refresh_corpus()
+    
+    def bm25_search(self, query, subject):
+        return list(asyncio.run(self.retriever._bm25_search(query, subject, "5th")).contents)
+    
+    def test_filters_on_subject_and_grade(self):
+        self.assertEqual(self.bm25_search("fractions", "Math")[0], "Multiply fractions by whole numbers")
+        self.assertEqual(self.bm25_search("fractions", "Science"), [])
+    
+    def test_refresh_indexes_ingested_documents(self):
+        self.ingest(self.point(4, "Compare fractions on a number line", "Math"))
+        
+        # Stale until refreshed, but still searchable
+        self.assertEqual(self.bm25_search("number line", "Math"), [])
+        self.refresh()
+        
+        self.assertEqual(self.bm25_search("number line", "Math"), ["Compare fractions on a number line"])
+    
+    def test_refresh_picks_up_rewritten_documents(self):
+        self.ingest(self.point(3, "Describe the rock cycle", "Science"))
+        
+        self.refresh()
+        
+        self.assertEqual(self.bm25_search("rock", "Science"), ["Describe the rock cycle"])
+        self.assertEqual(self.bm25_search("water", "Science"), [])
+    
+    def test_refresh_builds_index_for_collection_empty_at_startup(self):
+        self.qdrant_client.points = []
+        retriever = self.retriever = AdvancedRetriever(self.rag_service)
+        retriever._build_bm25_index()
+        self.assertIsNone(retriever.bm25_index)
+        
+        # BM25 idf is only positive for terms in fewer than half the documents
+        for point in self.corpus:
+            self.ingest(point)
+        self.refresh()
+        
+        self.assertEqual(self.bm25_search("denominators", "Math"), ["Add and subtract fractions with unlike denominators"])
+
+
+class FakeRetriever:
+    """Stands in for AdvancedRetriever, returning fixed results per strategy after an optional delay"""
+    
+    def __init__(self, results, delays=None, vectors=None):
+        self.results = results
+        self.delays = delays or {}
+        self.vectors = vectors or {}
+        self.calls = []
+        self.retrieval_config = {"final_top_k": 2}
+    
+    def _embed_queries(self, queries):
+        return np.stack([unit(self.vectors.get(query, np.eye(8)[0])) for query in queries])
+    
+    async def advanced_retrieve(self, query, subject, grade, strategy, student_group_info="", **kwargs):
+        self.calls.append((query, strategy))
+        await asyncio.sleep(self.delays.get(strategy, 0))
+        return list(self.results.get(strategy, []))
+
+
+def retrieval_result(content, score, method="basic"):
+    return RetrievalResult(
+        content=content, metadata={"standard_id": content}, score=score,
+        retrieval_method=method, relevance_explanation="test"
+    )
+
+
+def enhanced_rag_service(retriever):
+    rag_service = SimpleNamespace(
+        qdrant_client=FakeQdrantClient([]), collection_name="lesson_standards", collection_version=0,
+        embeddings=FakeEmbeddings({})
+    )
+    service = EnhancedRAGService(rag_service)
+    service.advanced_retriever = retriever
+    return service
+
+
+class ResultCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.retriever = FakeRetriever(
+            {RetrievalStrategy.HYBRID_SEARCH: [retrieval_result("Divide fractions", 0.9)]},
+            vectors={
+                "dividing fractions": np.eye(8)[1],
+                "how to divide fractions": np.eye(8)[1] + 0.1 * np.eye(8)[2],
+                "water cycle": np.eye(8)[3],
+            }
+        )
+        self.service = enhanced_rag_service(self.retriever)
+    
+    def retrieve(self, *queries):
+        async def run():
+            return [
+                await self.service.retrieve_relevant_standards_advanced(query, "Math", "5th", RetrievalStrategy.HYBRID_SEARCH)
+                for query in queries
+            ]
+        return asyncio.run(run())
+    
+    def test_repeated_and_paraphrased_queries_are_served_from_cache(self):
+        first, repeat, paraphrase = self.retrieve("dividing fractions", "Dividing  FRACTIONS", "how to divide fractions")
+        
+        self.assertEqual(len(self.retriever.calls), 1)
+        self.assertEqual(repeat, first)
+        self.assertEqual(paraphrase, first)
+    
+    def test_dissimilar_query_misses(self):
+        self.retrieve("dividing fractions", "water cycle")
+        
+        self.assertEqual(len(self.retriever.calls), 2)
+    
+    def test_cached_results_are_isolated_from_callers(self):
+        first, = self.retrieve("dividing fractions")
+        first[0]["description"] = "mutated"
+        
+        cached, = self.retrieve("dividing fractions")
+        
+        self.assertEqual(cached[0]["description"], "Divide fractions")
+    
+    def test_empty_results_are_not_cached(self):
+        self.retriever.results = {}
+        empty, = self.retrieve("dividing fractions")
+        self.retriever.results = {RetrievalStrategy.HYBRID_SEARCH: [retrieval_result("Divide fractions", 0.9)]}
+        
+        found, = self.retrieve("dividing fractions")
+        
+        self.assertEqual(empty, [])
+        self.assertEqual(found[0]["description"], "Divide fractions")
+        self.assertEqual(len(self.retriever.calls), 2)
+    
+    def test_ingest_clears_the_cache(self):
+        self.retrieve("dividing fractions")
+        self.service.original_rag_service.collection_version += 1
+        
+        self.retrieve("dividing fractions")
+        
+        self.assertEqual(len(self.retriever.calls), 2)
+
+
+class CompareStrategiesTest(unittest.TestCase):
+    confident = [retrieval_result("Divide fractions", 0.95), retrieval_result("Multiply fractions", 0.9)]
+    
+    def compare(self, retriever, early_exit_on_confidence=True):
+        service = enhanced_rag_service(retriever)
+        started = time.monotonic()
+        results = asyncio.run(service.compare_retrieval_strategies(
+            "dividing fractions", "Math", "5th", early_exit_on_confidence=early_exit_on_confidence
+        ))
+        return results, time.monotonic() - started
+    
+    def test_confident_cosine_strategy_cancels_the_rest(self):
+        retriever = FakeRetriever(
+            {RetrievalStrategy.MULTI_VECTOR: self.confident, RetrievalStrategy.RERANKING: self.confident},
+            delays={RetrievalStrategy.RERANKING: 5}
+        )
+        
+        results, elapsed = self.compare(retriever)
+        
+        self.assertLess(elapsed, 2)
+        self.assertEqual(len(results["multi_vector"]), 2)
+        self.assertNotIn("reranking", results)
+    
+    def test_fused_scores_do_not_trigger_early_exit(self):
+        # Hybrid scores are RRF sums, not cosines, however high they look
+        retriever = FakeRetriever(
+            {RetrievalStrategy.HYBRID_SEARCH: self.confident, RetrievalStrategy.RERANKING: self.confident},
+            delays={RetrievalStrategy.RERANKING: 0.05}
+        )
+        
+        results, _ = self.compare(retriever)
+        
+        self.assertEqual(len(results), 8)
+        self.assertEqual(len(results["reranking"]), 2)
+    
+    def test_too_few_or_weak_results_do_not_trigger_early_exit(self):
+        retriever = FakeRetriever(
+            {
+                RetrievalStrategy.MULTI_VECTOR: self.confident[:1],
+                RetrievalStrategy.METADATA_FILTERED: [retrieval_result("Divide fractions", 0.5)] * 2,
+                RetrievalStrategy.RERANKING: self.confident,
+            },
+            delays={RetrievalStrategy.RERANKING: 0.05}
+        )
+        
+        results, _ = self.compare(retriever)
+        
+        self.assertEqual(len(results["reranking"]), 2)
+    
+    def test_without_early_exit_every_strategy_runs(self):
+        retriever = FakeRetriever(
+            {RetrievalStrategy.MULTI_VECTOR: self.confident, RetrievalStrategy.RERANKING: self.confident},
+            delays={RetrievalStrategy.RERANKING: 0.05}
+        )
+        
+        results, _ = self.compare(retriever, early_exit_on_confidence=False)
+        
+        self.assertEqual(list(results), [
+            "hybrid_search", "multi_vector", "query_expansion", "reranking",
+            "hierarchical", "metadata_filtered", "student_group_aware", "external_resource_focused"
+        ])
+        self.assertEqual(len(results["reranking"]), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,171 @@
+# backend/tests/test_agent_service.py
+import asyncio
+import os
+import random
+import unittest
+from unittest import mock
+
+# ChatOpenAI needs a key to be constructed; no test makes an LLM call
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+
+from app import agent_service
+from app.agent_service import EducationPlanningAgent, LessonPlanState
+
+
+class FakeExternalAPIService:
+    def __init__(self, results):
+        self.results = list(results)
+        self.calls = 0
+
+    async def fetch_all_external_resources(self, subject, grade_level, topic):
+        self.calls += 1
+        return self.results.pop(0)
+
+
+class FakeRAGService:
+    def __init__(self, external_results=()):
+        self.external_api_service = FakeExternalAPIService(external_results)
+        self.standards_calls = 0
+
+    async def retrieve_relevant_standards(self, query, subject, grade_level):
+        self.standards_calls += 1
+        return [{"standard_id": "CCSS.MATH.CONTENT.6.NS.A.1", "description": "Divide fractions"}]
+
+
+class FakeGraph:
+    """Stands in for the compiled workflow, returning a fixed plan"""
+
+    def __init__(self):
+        self.calls = 0
+
+    async def ainvoke(self, state, config):
+        self.calls += 1
+        return {"final_lesson_plan": {
+            "title": f"{state.topic} - {state.grade_level} Grade {state.subject}",
+            "objectives": ["Students will divide fractions"],
+            "generated_at": state.generated_at,
+        }}
+
+
+class ExtractMaterialsTest(unittest.TestCase):
+    def setUp(self):
+        self.agent = EducationPlanningAgent(FakeRAGService())
+
+    def test_keywords_and_listed_materials(self):
+        materials = self.agent._extract_materials([
+            {"description": "Use the Whiteboard and markers, then glue paper cut-outs.", "materials": ["Fraction strips"]},
+            {"description": "Pairs share a calculator and Science equipment"},
+        ])
+
+        # "whiteboard" is matched as one term, so it does not also add "Board"
+        self.assertEqual(
+            materials, ("Calculator", "Fraction strips", "Glue", "Marker", "Paper", "Science Equipment", "Whiteboard")
+        )
+
+    def test_defaults_without_materials(self):
+        self.assertEqual(self.agent._extract_materials([]), ("Standard classroom materials",))
+        self.assertEqual(self.agent._extract_materials([{"description": ""}]), ("Standard classroom materials",))
+
+    @unittest.skipUnless(agent_service.NUMBA_AVAILABLE, "numba is not installed")
+    def test_compiled_and_pure_python_scans_agree(self):
+        words = [
+            "paper", "Pencil", "PEN", "markers", "whiteboard", "board", "chart", "worksheets", "textbook",
+            "notebook", "blocks", "dice", "Art supplies", "lab materials", "science  equipment", "digital",
+            "technology", "manipulatives", "screens", "speakers", "the", "students", "draw", "a", "and",
+            "“quoted”", "em—dash", "café", "Kelvin", "K", "penalty", "scissors,", "glue.", "tablets",
+        ]
+        rng = random.Random(0)
+        for _ in range(200):
+            activities = [
+                {"description": " ".join(rng.choice(words) for _ in range(rng.randint(0, 40)))}
+                for _ in range(rng.randint(1, 6))
+            ]
+            if sum(len(activity["description"]) for activity in activities) < agent_service._JIT_MATERIALS_MIN_CHARS:
+                activities.append({"description": " ".join(rng.choice(words) for _ in range(120))})
+
+            compiled = self.agent._extract_materials(activities)
+            with mock.patch.object(agent_service, "NUMBA_AVAILABLE", False):
+                pure_python = self.agent._extract_materials(activities)
+
+            self.assertEqual(compiled, pure_python, activities)
+
+
+class PlanCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.agent = EducationPlanningAgent(FakeRAGService())
+        self.graph = self.agent.graph = FakeGraph()
+
+    def test_repeated_request_is_served_from_cache(self):
+        request = {"subject": "Math", "grade_level": "6th", "topic": "Fractions", "generated_at": "t1"}
+        # Same lesson, differently typed, generated later
+        repeat = {"subject": " math", "grade_level": "6TH", "topic": "fractions ", "generated_at": "t2"}
+
+        async def run():
+            return await self.agent.generate_lesson_plan(request), await self.agent.generate_lesson_plan(repeat)
+
+        first, second = asyncio.run(run())
+
+        self.assertEqual(self.graph.calls, 1)
+        self.assertEqual(second["title"], first["title"])
+        self.assertEqual(second["generated_at"], "t2")
+
+    def test_cached_plan_is_isolated_from_callers(self):
+        request = {"subject": "Math", "grade_level": "6th", "topic": "Fractions"}
+
+        async def run():
+            first = await self.agent.generate_lesson_plan(request)
+            first["objectives"].append("mutated")
+            return await self.agent.generate_lesson_plan(request)
+
+        self.assertEqual(asyncio.run(run())["objectives"], ["Students will divide fractions"])
+
+    def test_disabled_plan_cache(self):
+        self.agent.cache_config["use_plan_cache"] = False
+        request = {"subject": "Math", "grade_level": "6th", "topic": "Fractions"}
+
+        async def run():
+            await self.agent.generate_lesson_plan(request)
+            await self.agent.generate_lesson_plan(request)
+
+        asyncio.run(run())
+        self.assertEqual(self.graph.calls, 2)
+
+
+class ContextCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.state = LessonPlanState(subject="Math", grade_level="6th", topic="Fractions")
+
+    def test_standards_are_cached_and_copied(self):
+        rag_service = FakeRAGService()
+        agent = EducationPlanningAgent(rag_service)
+
+        async def run():
+            first = await agent.retrieve_standards(self.state)
+            first["retrieved_standards"].clear()
+            return await agent.retrieve_standards(self.state)
+
+        second = asyncio.run(run())
+
+        self.assertEqual(rag_service.standards_calls, 1)
+        self.assertEqual(len(second["retrieved_standards"]), 1)
+
+    def test_empty_external_resources_are_not_cached(self):
+        rag_service = FakeRAGService(external_results=[[], [{"title": "Fractions", "source": "Wikipedia"}]])
+        agent = EducationPlanningAgent(rag_service)
+
+        async def run():
+            empty = await agent.fetch_external_resources(self.state)
+            fetched = await agent.fetch_external_resources(self.state)
+            fetched["external_resources"].clear()
+            cached = await agent.fetch_external_resources(self.state)
+            return empty, cached
+
+        empty, cached = asyncio.run(run())
+
+        self.assertEqual(empty["external_resources"], [])
+        self.assertEqual(cached["external_resources"], [{"title": "Fractions", "source": "Wikipedia"}])
+        self.assertEqual(rag_service.external_api_service.calls, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,121 @@
+# backend/tests/test_async_cache.py
+import asyncio
+import unittest
+
+from app.async_cache import ttl_cache
+
+
+class TtlCacheTest(unittest.TestCase):
+    def test_repeated_call_is_served_from_cache(self):
+        calls = []
+
+        @ttl_cache()
+        async def fetch(subject, topic=""):
+            calls.append((subject, topic))
+            return [{"subject": subject, "topic": topic}]
+
+        async def run():
+            first = await fetch("Math", topic="Fractions")
+            second = await fetch("Math", topic="Fractions")
+            other = await fetch("Science", topic="Fractions")
+            return first, second, other
+
+        first, second, other = asyncio.run(run())
+
+        self.assertEqual(first, second)
+        self.assertEqual(other, [{"subject": "Science", "topic": "Fractions"}])
+        self.assertEqual(calls, [("Math", "Fractions"), ("Science", "Fractions")])
+
+    def test_falsy_results_are_not_cached(self):
+        results = [[], [{"title": "Fractions"}]]
+
+        @ttl_cache()
+        async def fetch():
+            return results.pop(0)
+
+        async def run():
+            return await fetch(), await fetch(), await fetch()
+
+        self.assertEqual(asyncio.run(run()), ([], [{"title": "Fractions"}], [{"title": "Fractions"}]))
+
+    def test_should_cache_none_caches_everything(self):
+        calls = []
+
+        @ttl_cache(should_cache=None)
+        async def fetch():
+            calls.append(1)
+            return []
+
+        async def run():
+            await fetch()
+            await fetch()
+
+        asyncio.run(run())
+        self.assertEqual(len(calls), 1)
+
+    def test_callers_get_isolated_copies(self):
+        @ttl_cache()
+        async def fetch():
+            return [{"title": "Fractions", "tags": ["math"]}]
+
+        async def run():
+            first = await fetch()
+            first[0]["tags"].append("mutated")
+            first.append({"title": "extra"})
+            second = await fetch()
+            second[0]["title"] = "mutated"
+            return await fetch()
+
+        self.assertEqual(asyncio.run(run()), [{"title": "Fractions", "tags": ["math"]}])
+
+    def test_expired_entries_are_refetched(self):
+        calls = []
+
+        @ttl_cache(ttl=0)
+        async def fetch():
+            calls.append(1)
+            return [len(calls)]
+
+        async def run():
+            return await fetch(), await fetch()
+
+        self.assertEqual(asyncio.run(run()), ([1], [2]))
+
+    def test_least_recently_used_entry_is_evicted(self):
+        calls = []
+
+        @ttl_cache(maxsize=2)
+        async def fetch(key):
+            calls.append(key)
+            return [key]
+
+        async def run():
+            await fetch("a")
+            await fetch("b")
+            await fetch("a")  # "b" is now least recently used
+            await fetch("c")
+            await fetch("a")
+            await fetch("b")
+
+        asyncio.run(run())
+        self.assertEqual(calls, ["a", "b", "c", "b"])
+
+    def test_cache_clear(self):
+        calls = []
+
+        @ttl_cache()
+        async def fetch():
+            calls.append(1)
+            return [1]
+
+        async def run():
+            await fetch()
+            fetch.cache_clear()
+            await fetch()
+
+        asyncio.run(run())
+        self.assertEqual(len(calls), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,103 @@
+# backend/tests/test_simple_server.py
+import asyncio
+import http.client
+import json
+import socket
+import threading
+import unittest
+from http.server import ThreadingHTTPServer
+
+import simple_server
+
+
+class FakeAgent:
+    """Stands in for EducationPlanningAgent, streaming a fixed list of updates"""
+
+    def __init__(self, updates, error=None, endless=False):
+        self.updates = updates
+        self.error = error
+        self.endless = endless
+        self.finished = threading.Event()
+
+    async def stream_lesson_plan(self, user_input):
+        try:
+            for node, update in self.updates:
+                yield node, update
+            while self.endless:
+                await asyncio.sleep(0.01)
+                yield "generate_plan_bundle", {"padding": "x" * 4096}
+            if self.error is not None:
+                raise self.error
+        finally:
+            self.finished.set()
+
+
+def parse_events(body):
+    """(event, data) pairs from a text/event-stream body"""
+    events = []
+    for block in body.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((fields["event"], json.loads(fields["data"])))
+    return events
+
+
+class StreamLessonPlanTest(unittest.TestCase):
+    def start_server(self, agent):
+        server = ThreadingHTTPServer(("localhost", 0), simple_server.create_handler(None, agent))
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        return server.server_address[1]
+
+    def post_stream(self, port):
+        connection = http.client.HTTPConnection("localhost", port, timeout=10)
+        self.addCleanup(connection.close)
+        connection.request(
+            "POST", "/api/generate-lesson-plan/stream", json.dumps({"topic": "Fractions"}),
+            {"Content-Type": "application/json"}
+        )
+        return connection.getresponse()
+
+    def test_streams_each_update_then_done(self):
+        plan = {"title": "Fractions"}
+        port = self.start_server(FakeAgent([
+            ("retrieve_context", {"retrieved_standards": [{"standard_id": "A"}]}),
+            ("compile_lesson_plan", {"final_lesson_plan": plan}),
+        ]))
+
+        response = self.post_stream(port)
+
+        self.assertEqual(response.status, 200)
+        self.assertEqual(response.getheader("Content-type"), "text/event-stream")
+        self.assertEqual(parse_events(response.read().decode()), [
+            ("retrieve_context", {"retrieved_standards": [{"standard_id": "A"}]}),
+            ("compile_lesson_plan", {"final_lesson_plan": plan}),
+            ("done", {}),
+        ])
+
+    def test_reports_generation_error_in_band(self):
+        port = self.start_server(FakeAgent([("retrieve_context", {})], error=RuntimeError("LLM unavailable")))
+
+        events = parse_events(self.post_stream(port).read().decode())
+
+        self.assertEqual([event for event, _ in events], ["retrieve_context", "error"])
+        self.assertIn("LLM unavailable", events[-1][1]["detail"])
+
+    def test_client_disconnect_stops_generation(self):
+        agent = FakeAgent([("retrieve_context", {})], endless=True)
+        port = self.start_server(agent)
+
+        client = socket.create_connection(("localhost", port))
+        body = json.dumps({"topic": "Fractions"}).encode()
+        client.sendall(
+            b"POST /api/generate-lesson-plan/stream HTTP/1.1\r\nHost: localhost\r\n"
+            b"Content-Type: application/json\r\nContent-Length: " + str(len(body)).encode() + b"\r\n\r\n" + body
+        )
+        client.recv(1024)
+        client.close()
+
+        self.assertTrue(agent.finished.wait(10), "generation kept running after the client left")
+
+
+if __name__ == "__main__":
+    unittest.main()